@@ -0,0 +1,48 @@
+-- Migration 056: normalized per-class spell levels
+--
+-- spells.class stores the comma-split of PCGen's CLASSES tag, whose elements
+-- only jointly encode the per-class levels ({Bard=2|Cleric,Sorcerer,Wizard=3}),
+-- so building a spellbook meant an ILIKE over array_to_string() of every spell
+-- followed by parsing the levels in JS. spell_class_level holds one row per
+-- (spell, class) with its level; the (class, level) index turns "Wizard spells
+-- up to level N" into an index range scan.
+--
+-- utilities/lstspellsgrab.py fills this table (and spells.spelllevel) at
+-- ingest. The backfill below parses the existing class arrays the same way
+-- spellbookService.parseClassLevel does: split the rejoined array on '|', and
+-- the first "=N" in each group is the level of every class listed before it.
+-- A class listed in two groups keeps its lowest level.
+--
+-- IDEMPOTENT: CREATE ... IF NOT EXISTS, ON CONFLICT DO NOTHING, and the
+-- spelllevel backfill only touches rows where it is still NULL.
+
+CREATE TABLE IF NOT EXISTS spell_class_level (
+    spell_id INTEGER NOT NULL REFERENCES spells(id) ON DELETE CASCADE,
+    class VARCHAR(63) NOT NULL,
+    level SMALLINT NOT NULL,
+    PRIMARY KEY (spell_id, class)
+);
+
+CREATE INDEX IF NOT EXISTS idx_spell_class_level_class_level ON spell_class_level(class, level, spell_id);
+
+INSERT INTO spell_class_level (spell_id, class, level)
+SELECT s.id, btrim(class_name), MIN(substring(grp FROM '=(\d+)')::SMALLINT)
+FROM spells s
+CROSS JOIN LATERAL regexp_split_to_table(array_to_string(s.class, ','), '\|') AS grp
+CROSS JOIN LATERAL regexp_split_to_table(regexp_replace(grp, '=\d+.*$', ''), ',') AS class_name
+WHERE grp ~ '=\d+'
+  AND btrim(class_name) <> ''
+GROUP BY s.id, btrim(class_name)
+ON CONFLICT (spell_id, class) DO NOTHING;
+
+UPDATE spells s
+SET spelllevel = levels.min_level
+FROM (
+    SELECT spell_id, MIN(level) AS min_level
+    FROM spell_class_level
+    GROUP BY spell_id
+) levels
+WHERE levels.spell_id = s.id
+  AND s.spelllevel IS NULL;
+
+COMMENT ON TABLE spell_class_level IS 'Per-class spell level parsed from the PCGen CLASSES tag (one row per spell and class)';
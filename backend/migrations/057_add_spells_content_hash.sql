@@ -0,0 +1,16 @@
+-- Migration 057: row content hash for LST spell re-ingestion
+--
+-- utilities/lstspellsgrab.py upserts spells on (name, source). With
+-- content_hash (blake2b of the row's normalized values) a re-ingest compares
+-- one column per row and rewrites only the spells whose hash changed; spells
+-- that disappeared from a re-parsed file are deleted. Rows loaded before this
+-- migration have a NULL hash and are rewritten once on the next ingest.
+--
+-- The (source, name) index serves both the upsert match and the per-file
+-- deletes of incremental runs.
+--
+-- IDEMPOTENT: ADD COLUMN / CREATE INDEX IF NOT EXISTS.
+
+ALTER TABLE spells ADD COLUMN IF NOT EXISTS content_hash CHAR(32);
+
+CREATE INDEX IF NOT EXISTS idx_spells_source_name ON spells(source, name);
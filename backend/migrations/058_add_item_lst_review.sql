@@ -0,0 +1,33 @@
+-- Migration 058: review queue for LST item value/weight/caster level updates
+--
+-- utilities/itemsearch.py propose matches every item that is missing a value,
+-- weight or caster level against the PCGen LST data and stores each distinct
+-- change here as a 'pending' row, with the item's values at proposal time.
+-- review marks rows accepted or rejected; apply writes the accepted changes to
+-- item in one statement, or marks them stale when the item changed since.
+--
+-- The (status, item_id) index serves the per-status scans of all three steps.
+--
+-- IDEMPOTENT: CREATE ... IF NOT EXISTS.
+
+CREATE TABLE IF NOT EXISTS item_lst_review (
+    id SERIAL PRIMARY KEY,
+    item_id INTEGER NOT NULL REFERENCES item(id) ON DELETE CASCADE,
+    item_name VARCHAR(127) NOT NULL,
+    lst_name VARCHAR(255),
+    source_file VARCHAR(1023),
+    current_value NUMERIC,
+    current_weight DOUBLE PRECISION,
+    current_casterlevel INTEGER,
+    new_value NUMERIC,
+    new_weight DOUBLE PRECISION,
+    new_casterlevel INTEGER,
+    status VARCHAR(15) NOT NULL DEFAULT 'pending'
+        CHECK (status IN ('pending', 'accepted', 'rejected', 'applied', 'stale')),
+    proposed_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    reviewed_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_item_lst_review_status_item ON item_lst_review(status, item_id);
+
+COMMENT ON TABLE item_lst_review IS 'Proposed item value/weight/caster level changes from PCGen LST data, reviewed before they are applied';
@@ -0,0 +1,34 @@
+/**
+ * Unit tests for the spellbook catalog query (dbUtils mocked).
+ */
+jest.mock('../../../utils/dbUtils', () => ({
+  executeQuery: jest.fn(),
+}));
+
+const dbUtils = require('../../../utils/dbUtils');
+const catalog = require('../spellbookCatalog');
+
+beforeEach(() => jest.clearAllMocks());
+
+describe('getClassSpells', () => {
+  it('joins spell_class_level and bounds the class and level in the query', async () => {
+    const rows = [
+      { id: 1, name: 'Magic Missile', school: 'Evocation', subschool: null, class: ['Sorcerer', 'Wizard=1'], spelllevel: 1, source: 'core_rulebook' },
+    ];
+    dbUtils.executeQuery.mockResolvedValue({ rows });
+
+    const result = await catalog.getClassSpells('Wizard', 3);
+
+    expect(result).toBe(rows);
+    expect(dbUtils.executeQuery).toHaveBeenCalledTimes(1);
+    const [query, params] = dbUtils.executeQuery.mock.calls[0];
+    expect(query).toMatch(/FROM spell_class_level scl\s+JOIN spells s ON s\.id = scl\.spell_id/);
+    expect(query).toMatch(/WHERE scl\.class = \$1 AND scl\.level <= \$2/);
+    expect(params).toEqual(['Wizard', 3]);
+  });
+
+  it('returns an empty list when no spell matches', async () => {
+    dbUtils.executeQuery.mockResolvedValue({ rows: [] });
+    await expect(catalog.getClassSpells('Magus', 0)).resolves.toEqual([]);
+  });
+});
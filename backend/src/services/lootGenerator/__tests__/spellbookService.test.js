@@ -108,7 +108,7 @@ describe('generateSpellbook', () => {
   it('arcanist draws from the wizard list (Wizard tag)', async () => {
     catalog.getClassSpells.mockResolvedValue(many(5, 1, 'Evocation', 'w'));
     await service.generateSpellbook({ casterClass: 'arcanist', casterLevel: 3 });
-    expect(catalog.getClassSpells).toHaveBeenCalledWith('Wizard');
+    expect(catalog.getClassSpells).toHaveBeenCalledWith('Wizard', 2); // CL 3 arcanist
   });
 
   it('magus uses the Magus list and a 2/3 max spell level', async () => {
@@ -116,7 +116,7 @@ describe('generateSpellbook', () => {
       { id: 1, name: 'Shocking Grasp', school: 'Evocation', subschool: null, class: ['Magus=1'], spelllevel: 1, source: 'core_rulebook' },
     ]);
     const book = await service.generateSpellbook({ casterClass: 'magus', casterLevel: 4 });
-    expect(catalog.getClassSpells).toHaveBeenCalledWith('Magus');
+    expect(catalog.getClassSpells).toHaveBeenCalledWith('Magus', 2);
     expect(book.classLabel).toBe('Magus');
     expect(book.maxSpellLevel).toBe(2); // CL 4 magus
   });
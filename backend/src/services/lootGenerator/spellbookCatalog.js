@@ -4,21 +4,25 @@
 const dbUtils = require('../../utils/dbUtils');
 
 /**
- * Load every spell castable by the given class tag (e.g. 'Wizard', 'Magus',
- * 'Witch'). The `class` column is a Postgres array whose elements jointly encode
- * per-class levels (e.g. {Bard=2|Cleric,Sorcerer,Wizard=3}); we filter on the
- * rejoined string here and parse the exact per-class level in the service.
+ * Load every spell the given class tag (e.g. 'Wizard', 'Magus', 'Witch') can
+ * cast at or below maxLevel. Candidates come from spell_class_level (one row
+ * per spell and class, migration 056), so this is a range scan on its
+ * (class, level) index rather than an ILIKE over every spell's `class` array.
+ * The `class` array is still returned; the service parses the exact per-class
+ * level from it.
  *
  * @param {string} classTag
+ * @param {number} maxLevel - highest spell level to return
  * @returns {Promise<Array<{id:number,name:string,school:string,subschool:string,class:string[],spelllevel:number,source:string}>>}
  */
-const getClassSpells = async (classTag) => {
+const getClassSpells = async (classTag, maxLevel) => {
   const result = await dbUtils.executeQuery(
-    `SELECT id, name, school, subschool, class, spelllevel, source
-     FROM spells
-     WHERE array_to_string(class, ',') ILIKE $1
-     ORDER BY name`,
-    [`%${classTag}%`]
+    `SELECT s.id, s.name, s.school, s.subschool, s.class, s.spelllevel, s.source
+     FROM spell_class_level scl
+     JOIN spells s ON s.id = scl.spell_id
+     WHERE scl.class = $1 AND scl.level <= $2
+     ORDER BY s.name`,
+    [classTag, maxLevel]
   );
   return result.rows;
 };
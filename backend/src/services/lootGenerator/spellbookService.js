@@ -128,7 +128,7 @@ const generateSpellbook = async (opts = {}) => {
     ? opts.opposition.filter(s => SCHOOLS.includes(s) && s !== school)
     : [];
 
-  const rows = await catalog.getClassSpells(cfg.tag);
+  const rows = await catalog.getClassSpells(cfg.tag, maxLvl);
 
   // Bucket the class's spells by their parsed per-class level (≤ max), dropping
   // opposition-school spells for a specialist.
@@ -149,6 +149,28 @@ CREATE TABLE item (
 
 CREATE INDEX idx_item_campaign_id ON item(campaign_id) WHERE campaign_id IS NOT NULL;
 
+-- Proposed item updates from PCGen LST data (utilities/itemsearch.py
+-- propose/review/apply); see migration 058.
+CREATE TABLE item_lst_review (
+    id SERIAL PRIMARY KEY,
+    item_id INTEGER NOT NULL REFERENCES item(id) ON DELETE CASCADE,
+    item_name VARCHAR(127) NOT NULL,
+    lst_name VARCHAR(255),
+    source_file VARCHAR(1023),
+    current_value NUMERIC,
+    current_weight DOUBLE PRECISION,
+    current_casterlevel INTEGER,
+    new_value NUMERIC,
+    new_weight DOUBLE PRECISION,
+    new_casterlevel INTEGER,
+    status VARCHAR(15) NOT NULL DEFAULT 'pending'
+        CHECK (status IN ('pending', 'accepted', 'rejected', 'applied', 'stale')),
+    proposed_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    reviewed_at TIMESTAMP
+);
+
+CREATE INDEX idx_item_lst_review_status_item ON item_lst_review(status, item_id);
+
 CREATE TABLE mod (
     id SERIAL PRIMARY KEY,
     name VARCHAR(255),
@@ -276,9 +298,23 @@ CREATE TABLE spells (
     domain VARCHAR(255),
     spelllevel INTEGER,
     item VARCHAR[] DEFAULT ARRAY[]::VARCHAR[],
-    source VARCHAR(255)
+    source VARCHAR(255),
+    content_hash CHAR(32)
+);
+
+CREATE INDEX idx_spells_source_name ON spells(source, name);
+
+-- Per-class spell levels parsed from CLASSES (Bard=2|Cleric,Wizard=3), one row
+-- per spell and class; filled by utilities/lstspellsgrab.py and migration 056.
+CREATE TABLE spell_class_level (
+    spell_id INTEGER NOT NULL REFERENCES spells(id) ON DELETE CASCADE,
+    class VARCHAR(63) NOT NULL,
+    level SMALLINT NOT NULL,
+    PRIMARY KEY (spell_id, class)
 );
 
+CREATE INDEX idx_spell_class_level_class_level ON spell_class_level(class, level, spell_id);
+
 -- Generated spellbooks (loot generator). A spellbook is attached to a loot item;
 -- its spells are stored denormalized so the viewer needs no join.
 CREATE TABLE spellbook (
@@ -0,0 +1,204 @@
+"""
+Category prediction and a negative-result cache for AoN item lookups.
+
+The AoN scrapers find an item by probing category pages until one has data.
+They used to probe a fixed list in the same order for every item, so a plain
+longsword went through Wondrous, Artifacts, Rings, ... before reaching
+Equipment - Weapons, and every miss was found again on the next run.
+CategoryPredictor orders the probes for each item by
+
+1. hints in the name ("Ring of ...", "Staff of ...", "+1 ... Chainmail"),
+2. how often each category held items of the same type/subtype before,
+3. a fixed prior per type/subtype (weapons -> Equipment/Magic - Weapons, ...),
+4. how often each category held anything,
+
+and skips every (name, category) pair that was a miss less than `miss_ttl`
+ago. A miss is only recorded when the page positively has no such item: a
+404/410, or AoN's display page with its result container left empty. Any
+other page (an item page the parser could not read, a maintenance or
+throttling page) is unknown and never recorded, so a parser fix is not
+hidden behind a month of cached misses; --ignore-misses probes the stored
+misses again anyway. Hit counts and misses live in one JSON file
+(aon_lookup_stats.json by default), written by save() at the end of a run.
+
+    predictor = CategoryPredictor(urls)
+    info = await predictor.first_match(engine, name, item_type, subtype, parse)
+    predictor.save()
+"""
+
+import os
+import re
+import json
+import time
+import tempfile
+from collections import Counter, defaultdict
+from urllib.parse import quote
+
+DEFAULT_STATS_PATH = 'aon_lookup_stats.json'
+DEFAULT_MISS_TTL_DAYS = 30
+MISS_STATUSES = frozenset([404, 410])
+# AoN answers an unknown name with its normal display page and nothing in the result container
+AON_EMPTY_RESULT = re.compile(
+    r'<(\w+)[^>]*\bid="ctl00_MainContent_(?:DataListTypes|DetailedOutput)"[^>]*>\s*</\1\s*>', re.IGNORECASE)
+
+# Categories most likely to hold an item of a given (type, subtype); subtype None applies to every subtype
+CATEGORY_PRIORS = {
+    ('weapon', None): ['Equipment - Weapons', 'Magic - Weapons'],
+    ('armor', None): ['Equipment - Armor', 'Magic - Armor'],
+    ('magic', 'artifact'): ['Magic - Artifacts'],
+    ('magic', 'potion'): ['Magic - Potions'],
+    ('magic', 'ioun stone'): ['Magic - Wondrous'],
+    ('magic', None): ['Magic - Wondrous', 'Magic - Weapons', 'Magic - Armor', 'Magic - Rings', 'Magic - Rods',
+                      'Magic - Staves'],
+    ('gear', None): ['Equipment - Misc', 'Magic - Wondrous'],
+    ('trade good', None): ['Equipment - Misc'],
+    ('other', None): ['Equipment - Misc', 'Magic - Wondrous'],
+}
+
+NAME_HINTS = [
+    (re.compile(r'^ring\b|\bring of\b', re.IGNORECASE), 'Magic - Rings'),
+    (re.compile(r'^rod\b|\brod of\b', re.IGNORECASE), 'Magic - Rods'),
+    (re.compile(r'^staff\b|\bstaff of\b', re.IGNORECASE), 'Magic - Staves'),
+    (re.compile(r'^(potion|oil|elixir)\b', re.IGNORECASE), 'Magic - Potions'),
+    (re.compile(r'\baltar\b', re.IGNORECASE), 'Magic - Altars'),
+    (re.compile(r'^\+\d.*\b(armor|plate|mail|shirt|shield|breastplate|hide|leather)\b', re.IGNORECASE),
+     'Magic - Armor'),
+    (re.compile(r'^\+\d', re.IGNORECASE), 'Magic - Weapons'),
+]
+
+_ANY = '*'
+
+
+def normalize_lookup_name(name):
+    return ' '.join(name.casefold().split())
+
+
+def is_missing_page(result):
+    """True when the page positively has no such item; anything else is unknown."""
+    if result.error is not None:
+        return False
+    if result.status in MISS_STATUSES:
+        return True
+    return result.status == 200 and AON_EMPTY_RESULT.search(result.text or '') is not None
+
+
+def _type_key(item_type, subtype):
+    return f"{(item_type or '').lower()}/{(subtype or '').lower()}"
+
+
+class CategoryPredictor:
+    """Orders the (label, url prefix) categories per item and remembers hits and misses between runs."""
+
+    def __init__(self, categories, stats_path=DEFAULT_STATS_PATH, miss_ttl=DEFAULT_MISS_TTL_DAYS * 86400,
+                 ignore_misses=False):
+        self.categories = list(categories)
+        self.stats_path = stats_path
+        self.miss_ttl = miss_ttl
+        self.ignore_misses = ignore_misses
+        self.hits = defaultdict(Counter)
+        self.misses = {}
+        self.counters = Counter()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.stats_path, 'r', encoding='utf-8') as file:
+                stored = json.load(file)
+        except (OSError, ValueError):
+            return
+        for key, counts in stored.get('hits', {}).items():
+            self.hits[key].update(counts)
+        now = time.time()
+        # Expired misses are dropped here, so the file does not grow forever
+        self.misses = {key: checked_at for key, checked_at in stored.get('misses', {}).items()
+                       if now - checked_at < self.miss_ttl}
+
+    def save(self):
+        directory = os.path.dirname(os.path.abspath(self.stats_path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as file:
+                json.dump({'hits': self.hits, 'misses': self.misses}, file)
+            os.replace(temp_path, self.stats_path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def _miss_key(self, name, label):
+        return f"{label}\t{normalize_lookup_name(name)}"
+
+    def is_known_miss(self, name, label):
+        if self.ignore_misses:
+            return False
+        checked_at = self.misses.get(self._miss_key(name, label))
+        return checked_at is not None and time.time() - checked_at < self.miss_ttl
+
+    def probe_order(self, name, item_type=None, subtype=None):
+        """The categories to probe for name, most likely first, without the known misses."""
+        hinted = {label for pattern, label in NAME_HINTS if pattern.search(name)}
+        learned = self.hits.get(_type_key(item_type, subtype), Counter())
+        overall = self.hits.get(_ANY, Counter())
+        item_type = (item_type or '').lower()
+        prior = CATEGORY_PRIORS.get((item_type, (subtype or '').lower()), []) + \
+            CATEGORY_PRIORS.get((item_type, None), [])
+
+        def rank(entry):
+            position, (label, _) = entry
+            prior_position = prior.index(label) if label in prior else len(prior)
+            return label not in hinted, -learned[label], prior_position, -overall[label], position
+
+        ordered = [category for _, category in sorted(enumerate(self.categories), key=rank)]
+        probes = [(label, prefix) for label, prefix in ordered if not self.is_known_miss(name, label)]
+        self.counters['skipped_misses'] += len(ordered) - len(probes)
+        return probes
+
+    def record_hit(self, item_type, subtype, label):
+        self.hits[_type_key(item_type, subtype)][label] += 1
+        self.hits[_ANY][label] += 1
+
+    def record_miss(self, name, label):
+        self.misses[self._miss_key(name, label)] = time.time()
+
+    async def first_match(self, engine, name, item_type, subtype, parse, labels=None):
+        """engine.first_match over the predicted categories; parse(label, result) as for the plain list.
+
+        labels, when given, limits the probes to those categories. A page
+        that positively has no such item is remembered as a miss; errors and
+        pages the parser found nothing on are not, so they are retried on the
+        next run.
+        """
+        probes = {prefix + quote(name): label for label, prefix in self.probe_order(name, item_type, subtype)
+                  if labels is None or label in labels}
+        self.counters['lookups'] += 1
+
+        def check(result):
+            label = probes[result.url]
+            self.counters['probes'] += 1
+            parsed = parse(label, result)
+            if parsed is not None:
+                self.record_hit(item_type, subtype, label)
+            elif is_missing_page(result):
+                self.record_miss(name, label)
+            return parsed
+
+        return await engine.first_match(list(probes), check)
+
+    def summary(self):
+        lookups = self.counters['lookups']
+        per_lookup = self.counters['probes'] / lookups if lookups else 0.0
+        return (f"Category probes: {self.counters['probes']} for {lookups} lookups ({per_lookup:.1f} per lookup), "
+                f"{self.counters['skipped_misses']} skipped as known misses")
+
+
+def add_predictor_arguments(parser):
+    parser.add_argument("--lookup-stats", default=DEFAULT_STATS_PATH,
+                        help="JSON file of category hit counts and known misses")
+    parser.add_argument("--miss-ttl", type=float, default=DEFAULT_MISS_TTL_DAYS,
+                        help="Days a name that was not on a category page is not looked for there again")
+    parser.add_argument("--ignore-misses", action="store_true",
+                        help="Probe the stored misses again, e.g. after a parser fix (new misses are still recorded)")
+
+
+def predictor_from_args(categories, args):
+    return CategoryPredictor(categories, args.lookup_stats, miss_ttl=args.miss_ttl * 86400,
+                             ignore_misses=args.ignore_misses)
@@ -0,0 +1,268 @@
+"""
+Shared asyncio fetch engine for the AoN scrapers.
+
+The scrapers look an item up by trying up to ~19 category pages in order and
+taking the first one that has data. They used to do that one blocking
+request at a time with a 1-3 s sleep in between, so a single item could take
+a minute. FetchEngine keeps several items in flight at once under these
+politeness limits:
+
+- at most `host_limit` requests to one site at a time (aonprd.com and
+  www.aonprd.com count as one site),
+- at most `rate` requests per second across every site (the global budget),
+- retries with exponential backoff on connection errors and 429/5xx, each
+  retry going through the same limits.
+
+With an httpcache.HttpCache, pages still within the cache TTL are returned
+straight from disk without taking a site slot or any of the rate budget;
+older ones are revalidated with a conditional request.
+
+Requests still go through `requests` (already a dependency of the scrapers)
+on a small thread pool; asyncio only schedules them, and the limits above,
+not the number of sockets, decide the pace.
+
+search_items() runs the engine on a background thread and yields results on
+the calling thread, so the scripts keep their synchronous database and
+terminal code:
+
+    engine = FetchEngine()
+    for item, info, error in search_items(items, lambda item: get_item_info(engine, item[1]), engine):
+        ...
+"""
+
+import queue
+import random
+import asyncio
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+
+from httpcache import add_cache_arguments, cache_from_args
+
+# The scripts used to send one request at a time with a 1-3 s sleep in between
+# (about 0.4-0.5 requests/second); the defaults keep that pace. Items in flight
+# then only overlap parsing, cache hits and the user's prompts with the network.
+DEFAULT_HOST_LIMIT = 1
+DEFAULT_RATE = 0.5
+DEFAULT_ITEMS_IN_FLIGHT = 8
+DEFAULT_PROBE_WINDOW = 1  # probes are ordered most likely first, so one at a time per item wastes nothing
+DEFAULT_TIMEOUT = 30
+DEFAULT_RETRIES = 3
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+FetchResult = namedtuple('FetchResult', ['url', 'status', 'text', 'error'])
+
+_DONE = object()
+
+
+class RateBudget:
+    """Spaces request starts at least 1/rate seconds apart across all callers."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next_start = 0.0
+        self._lock = None
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            now = loop.time()
+            start = max(now, self._next_start)
+            self._next_start = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    def pause(self, seconds):
+        # A 429 with Retry-After holds back every request, not just the one that got it
+        self._next_start = max(self._next_start, asyncio.get_running_loop().time() + seconds)
+
+
+def site_of(url):
+    host = (urlsplit(url).hostname or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+
+class FetchEngine:
+    """Fetches pages concurrently within a per-site concurrency cap and a global request rate."""
+
+    def __init__(self, host_limit=DEFAULT_HOST_LIMIT, rate=DEFAULT_RATE, timeout=DEFAULT_TIMEOUT,
+                 retries=DEFAULT_RETRIES, backoff_factor=0.5, cache=None, probe_window=None):
+        self.host_limit = host_limit
+        self.probe_window = probe_window
+        self.cache = cache
+        self.budget = RateBudget(rate)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.requests_made = 0
+        self._site_slots = {}
+        self._sessions = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=max(host_limit * 2, 4), thread_name_prefix='aonfetch')
+
+    def _session(self):
+        # requests.Session is not thread-safe; one per pool thread keeps connections alive
+        session = getattr(self._sessions, 'session', None)
+        if session is None:
+            session = self._sessions.session = requests.Session()
+        return session
+
+    def _get(self, url):
+        try:
+            if self.cache:
+                page = self.cache.get(self._session(), url, timeout=self.timeout)
+                return FetchResult(url, page.status, page.text, None), page.headers.get('Retry-After')
+            response = self._session().get(url, timeout=self.timeout)
+            return FetchResult(url, response.status_code, response.text, None), response.headers.get('Retry-After')
+        except requests.RequestException as e:
+            return FetchResult(url, None, None, e), None
+
+    def _slot(self, url):
+        site = site_of(url)
+        if site not in self._site_slots:
+            self._site_slots[site] = asyncio.Semaphore(self.host_limit)
+        return self._site_slots[site]
+
+    async def _fetch_once(self, url):
+        loop = asyncio.get_running_loop()
+        async with self._slot(url):
+            await self.budget.acquire()
+            self.requests_made += 1
+            future = loop.run_in_executor(self._executor, self._get, url)
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # The thread cannot be interrupted; keep the site slot until the request really ends
+                await asyncio.wait([future])
+                raise
+
+    async def fetch(self, url):
+        """GET url within the limits, retrying errors and 429/5xx; returns a FetchResult."""
+        if self.cache:
+            page = self.cache.fresh(url)
+            if page is not None:
+                return FetchResult(url, page.status, page.text, None)
+        for attempt in range(self.retries + 1):
+            result, retry_after = await self._fetch_once(url)
+            if result.error is None and result.status not in RETRY_STATUSES:
+                return result
+            if attempt == self.retries:
+                return result
+            delay = self.backoff_factor * (2 ** attempt) * random.uniform(0.5, 1.5)
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, int(retry_after))
+                self.budget.pause(delay)
+            await asyncio.sleep(delay)
+
+    async def first_match(self, urls, parse, window=None):
+        """parse(result) of the first url, in list order, for which it is not None.
+
+        Up to `window` urls (the engine's probe_window, or all of them when
+        that is None) are in flight at once and go out as fast as the limits
+        allow; the next url is queued as each one misses. Once a match is
+        known, the later urls that have not been sent yet are dropped.
+        """
+        window = window or self.probe_window or len(urls)
+        tasks = []
+        try:
+            for position in range(len(urls)):
+                while len(tasks) < min(position + window, len(urls)):
+                    tasks.append(asyncio.ensure_future(self.fetch(urls[len(tasks)])))
+                parsed = parse(await tasks[position])
+                if parsed is not None:
+                    return parsed
+            return None
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+async def _search_all(items, search, items_in_flight, results, stop):
+    items = iter(items)
+
+    async def worker():
+        while not stop.is_set():
+            item = next(items, _DONE)
+            if item is _DONE:
+                return
+            try:
+                results.put((item, await search(item), None))
+            except Exception as e:
+                results.put((item, None, e))
+
+    await asyncio.gather(*(worker() for _ in range(items_in_flight)))
+
+
+def search_items(items, search, engine=None, items_in_flight=DEFAULT_ITEMS_IN_FLIGHT):
+    """Yield (item, result, error) as each `await search(item)` finishes, items_in_flight items at a time.
+
+    The event loop runs on a background thread; results come back on the
+    calling thread in completion order. error is the exception a search
+    raised (result is then None). Leaving the loop early, for instance on
+    Ctrl-C, cancels the searches still in flight.
+    """
+    results = queue.Queue()
+    stop = threading.Event()
+    failure = []
+    running = {}
+
+    async def main():
+        running['loop'] = asyncio.get_running_loop()
+        running['task'] = asyncio.current_task()
+        await _search_all(items, search, items_in_flight, results, stop)
+
+    def run():
+        try:
+            asyncio.run(main())
+        except BaseException as e:
+            failure.append(e)
+        finally:
+            results.put(_DONE)
+
+    thread = threading.Thread(target=run, name='aonfetch-loop', daemon=True)
+    thread.start()
+    try:
+        while True:
+            result = results.get()
+            if result is _DONE:
+                break
+            yield result
+        if failure:
+            raise failure[0]
+    finally:
+        stop.set()
+        if 'task' in running and thread.is_alive():
+            try:
+                running['loop'].call_soon_threadsafe(running['task'].cancel)
+            except RuntimeError:
+                pass  # the loop finished in the meantime
+        thread.join()
+        if engine:
+            engine.close()
+
+
+def add_fetch_arguments(parser):
+    add_cache_arguments(parser)
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE,
+                        help="Requests per second across all sites (the global politeness budget)")
+    parser.add_argument("--host-limit", type=int, default=DEFAULT_HOST_LIMIT,
+                        help="Requests to one site that may be in flight at once")
+    parser.add_argument("--items-in-flight", type=int, default=DEFAULT_ITEMS_IN_FLIGHT,
+                        help="Items searched concurrently")
+    parser.add_argument("--probe-window", type=int, default=DEFAULT_PROBE_WINDOW,
+                        help="Category pages of one item requested at once (0 = all of them)")
+
+
+def engine_from_args(args):
+    return FetchEngine(host_limit=args.host_limit, rate=args.rate, cache=cache_from_args(args),
+                       probe_window=args.probe_window or None)
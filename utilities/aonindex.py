@@ -0,0 +1,258 @@
+"""
+Local name -> detail page map of Archives of Nethys, built from its listings.
+
+Without it the scrapers guess `...Display.aspx?ItemName=<name>` on category
+after category, tens of thousands of blind probes for a full item table.
+build-index fetches each category's listing page once (and the sub-listings
+it links to, such as the Wondrous item slots), collects every link to a
+detail page and stores name -> (category, URL) in aon_index.json. The
+scrapers then make one request per item that is listed and none for an item
+that is not.
+
+    python aonindex.py build-index                  # ~20-40 listing fetches through the shared engine
+    python aonindex.py lookup "Ring of Protection +1"
+
+Keys are normalized (case, punctuation and spacing do not matter), and the
+detail URLs are written the same way the scrapers build them, so pages
+already in the HTTP cache are reused. A category whose listing could not be
+fetched is stored as failed; names are still probed there through the
+category predictor until a rebuild lists it.
+"""
+
+import os
+import re
+import sys
+import json
+import tempfile
+import asyncio
+import argparse
+from datetime import datetime
+from urllib.parse import urljoin, urlsplit, parse_qsl, quote
+
+from bs4 import BeautifulSoup
+
+from aonfetch import add_fetch_arguments, engine_from_args
+
+DEFAULT_AON_INDEX_PATH = 'aon_index.json'
+
+# Every category any of the scrapers probes, as (label, detail URL prefix)
+AON_CATEGORIES = [
+    ("Magic - Wondrous", "https://aonprd.com/MagicWondrousDisplay.aspx?FinalName="),
+    ("Magic - Artifacts", "https://aonprd.com/MagicArtifactsDisplay.aspx?ItemName="),
+    ("Magic - Weapons", "https://aonprd.com/MagicWeaponsDisplay.aspx?ItemName="),
+    ("Magic - Armor", "https://aonprd.com/MagicArmorDisplay.aspx?ItemName="),
+    ("Magic - Rings", "https://aonprd.com/MagicRingsDisplay.aspx?FinalName="),
+    ("Magic - Potions", "https://aonprd.com/MagicPotionsDisplay.aspx?ItemName="),
+    ("Magic - Cursed", "https://aonprd.com/MagicCursedDisplay.aspx?ItemName="),
+    ("Magic - Intelligent", "https://aonprd.com/MagicIntelligentDisplay.aspx?ItemName="),
+    ("Magic - Rods", "https://aonprd.com/MagicRodsDisplay.aspx?FinalName="),
+    ("Magic - Staves", "https://aonprd.com/MagicStavesDisplay.aspx?ItemName="),
+    ("Magic - Plants", "https://aonprd.com/MagicPlantsDisplay.aspx?FinalName="),
+    ("Magic - Altars", "https://aonprd.com/MagicAltarsDisplay.aspx?ItemName="),
+    ("Magic - Favors", "https://aonprd.com/MagicFavorsDisplay.aspx?ItemName="),
+    ("Equipment - Misc", "https://aonprd.com/EquipmentMiscDisplay.aspx?ItemName="),
+    ("Equipment - Weapons", "https://aonprd.com/EquipmentWeaponsDisplay.aspx?ItemName="),
+    ("Equipment - Armor", "https://aonprd.com/EquipmentArmorDisplay.aspx?ItemName="),
+    ("Spellbook", "https://aonprd.com/SpellbookDisplay.aspx?ItemName="),
+    ("Vehicles", "https://aonprd.com/Vehicles.aspx?ItemName="),
+    ("Relics", "https://aonprd.com/Relics.aspx?ItemName="),
+]
+
+
+def normalize_index_name(name):
+    # "Monk's Belt", "monks belt" and "Monk’s  Belt" are one key; "+1" keeps its plus
+    return ' '.join(re.sub(r"[^\w+]+", ' ', re.sub(r"['’]", '', name.casefold())).split())
+
+
+def listing_url(prefix):
+    # MagicWondrousDisplay.aspx?FinalName= lists its items at MagicWondrous.aspx
+    parts = urlsplit(prefix)
+    return f"{parts.scheme}://{parts.netloc}{parts.path.replace('Display.aspx', '.aspx')}"
+
+
+def _page_name(url):
+    return urlsplit(url).path.rsplit('/', 1)[-1].lower()
+
+
+def parse_listing(page_url, text, prefix):
+    """(detail links as {name: url}, sub-listing urls) found on one listing page."""
+    detail_page = _page_name(prefix)
+    detail_parameter = urlsplit(prefix).query.rstrip('=').lower()
+    listing_page = _page_name(page_url)
+    entries = {}
+    sub_listings = []
+
+    for link in BeautifulSoup(text, 'html.parser').find_all('a', href=True):
+        url = urljoin(page_url, link['href'])
+        page = _page_name(url)
+        query = dict((key.lower(), value) for key, value in parse_qsl(urlsplit(url).query))
+        if page == detail_page and query.get(detail_parameter):
+            name = query[detail_parameter].strip()
+            # The same form the scrapers probe, so cached pages and miss statistics line up
+            entries.setdefault(name, prefix + quote(name))
+        elif page == listing_page and query and url != page_url:
+            sub_listings.append(url)
+    return entries, list(dict.fromkeys(sub_listings))
+
+
+class AonIndex:
+    """Normalized name -> [(category label, detail URL), ...], in category order.
+
+    failed holds the labels of categories whose listing could not be crawled
+    completely; lookups fall back to the predictor for those.
+    """
+
+    def __init__(self, entries, built_at=None, failed=(), fallback=None):
+        self.entries = entries
+        self.built_at = built_at
+        self.failed = list(failed)
+        self.fallback = fallback
+        self.lookups = 0
+        self.listed = 0
+        self.probed = 0
+
+    @classmethod
+    def load(cls, index_path=DEFAULT_AON_INDEX_PATH):
+        with open(index_path, 'r', encoding='utf-8') as file:
+            stored = json.load(file)
+        return cls({key: [tuple(entry) for entry in entries] for key, entries in stored['entries'].items()},
+                   stored.get('built_at'), stored.get('failed', []))
+
+    def save(self, index_path=DEFAULT_AON_INDEX_PATH):
+        # Written beside the target and renamed, so an interrupted build never leaves half an index
+        directory = os.path.dirname(os.path.abspath(index_path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as file:
+                json.dump({'built_at': self.built_at, 'failed': self.failed, 'entries': self.entries},
+                          file, ensure_ascii=False)
+            os.replace(temp_path, index_path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def urls_for(self, name):
+        return self.entries.get(normalize_index_name(name), [])
+
+    async def first_match(self, engine, name, item_type, subtype, parse):
+        """Same contract as CategoryPredictor.first_match, but only the pages the listings link to.
+
+        Names not found that way are probed in the failed categories through
+        the fallback predictor, as without an index.
+        """
+        found = dict((url, label) for label, url in self.urls_for(name))
+        self.lookups += 1
+        self.listed += bool(found)
+        if found:
+            result = await engine.first_match(list(found), lambda result: parse(found[result.url], result))
+            if result is not None:
+                return result
+        unlisted = [label for label in self.failed if label not in found.values()]
+        if not unlisted or self.fallback is None:
+            return None
+        self.probed += 1
+        return await self.fallback.first_match(engine, name, item_type, subtype, parse, labels=unlisted)
+
+    def summary(self):
+        summary = f"AoN index: {self.listed} of {self.lookups} lookups listed"
+        if self.failed:
+            summary += f", {self.probed} probed in {len(self.failed)} unlisted categories"
+        return summary
+
+
+async def crawl_listings(engine, categories, max_sub_listings=50):
+    """({normalized name: [(label, url), ...]}, labels of the categories with a listing page that failed)."""
+    entries = {}
+    failed = []
+    for label, prefix in categories:
+        start = listing_url(prefix)
+        pending = [start]
+        seen = set()
+        names = {}
+        while pending and len(seen) <= max_sub_listings:
+            page_url = pending.pop(0)
+            if page_url in seen:
+                continue
+            seen.add(page_url)
+            result = await engine.fetch(page_url)
+            if result.error is not None or result.status != 200:
+                print(f"  {label}: could not fetch {page_url} ({result.error or result.status})")
+                if label not in failed:
+                    failed.append(label)
+                continue
+            page_entries, sub_listings = parse_listing(page_url, result.text, prefix)
+            names.update((name, url) for name, url in page_entries.items() if name not in names)
+            # Sub-listings are only followed from the category's top listing page
+            if page_url == start:
+                pending.extend(sub_listings)
+        print(f"  {label}: {len(names)} items from {len(seen)} listing pages")
+        for name, url in names.items():
+            entries.setdefault(normalize_index_name(name), []).append((label, url))
+    return entries, failed
+
+
+def build_index(engine, categories=AON_CATEGORIES):
+    try:
+        entries, failed = asyncio.run(crawl_listings(engine, categories))
+    finally:
+        engine.close()
+    return AonIndex(entries, datetime.now().isoformat(timespec='seconds'), failed)
+
+
+def add_index_arguments(parser):
+    parser.add_argument("--index", default=DEFAULT_AON_INDEX_PATH,
+                        help="AoN name index from 'aonindex.py build-index'; used when the file exists")
+    parser.add_argument("--no-index", action="store_true",
+                        help="Probe category pages even when an AoN name index exists")
+
+
+def index_from_args(args, predictor):
+    """The AoN index to look names up in, or None to fall back to probing categories.
+
+    predictor probes the categories the index could not list.
+    """
+    if args.no_index:
+        return None
+    try:
+        index = AonIndex.load(args.index)
+    except OSError:
+        return None
+    except (ValueError, KeyError) as e:
+        print(f"Ignoring unreadable AoN name index {args.index} ({e}); probing categories instead")
+        return None
+    index.fallback = predictor
+    print(f"Using AoN name index {args.index} ({len(index.entries)} names, built {index.built_at})")
+    if index.failed:
+        print(f"  Not listed, probed instead: {', '.join(index.failed)}")
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the local AoN name -> detail page index")
+    parser.add_argument("command", choices=["build-index", "lookup"])
+    parser.add_argument("names", nargs="*", help="Item names for lookup")
+    parser.add_argument("--index", default=DEFAULT_AON_INDEX_PATH, help="Index file to write or read")
+    add_fetch_arguments(parser)
+    args = parser.parse_args()
+
+    if args.command == "build-index":
+        engine = engine_from_args(args)
+        print(f"Crawling {len(AON_CATEGORIES)} AoN category listings...")
+        index = build_index(engine)
+        index.save(args.index)
+        print(f"Wrote {len(index.entries)} names to {args.index} ({engine.requests_made} requests)")
+        if index.failed:
+            print(f"Listings failed for {', '.join(index.failed)}; those categories are probed until a rebuild")
+        return
+
+    index = AonIndex.load(args.index)
+    missing = False
+    for name in args.names:
+        matches = index.urls_for(name)
+        missing = missing or not matches
+        print(f"{name}: " + (", ".join(f"{label} {url}" for label, url in matches) if matches else "not listed"))
+    sys.exit(1 if missing else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,16 @@
-import requests
 from bs4 import BeautifulSoup
 import psycopg2
 import re
 import time
-from urllib.parse import quote
+import argparse
 import math
 import threading
 import queue
 from blessed import Terminal
+from scrapetext import clean_number
+from aonfetch import add_fetch_arguments, engine_from_args, search_items
+from aoncategories import add_predictor_arguments, predictor_from_args
+from aonindex import add_index_arguments, index_from_args
 import logging
 import traceback
 import sys
@@ -80,6 +83,7 @@ item_queue = queue.Queue()
 update_queue = queue.Queue()
 current_search_item = None
 current_update_item = None
+# Item name -> {category: status} for every item in flight; the panel shows one of them
 checked_urls = {}
 total_items = 0
 processed_items = 0
@@ -87,23 +91,6 @@ processed_items = 0
 term = Terminal()
 
 
-def clean_number(number_str):
-    if number_str is None:
-        return None
-    number_str = number_str.strip()
-    if number_str in ['—', '-', '–', '']:
-        return None
-
-    number_str = re.sub(r'\s*(gp|lbs\.)\s*$', '', number_str, flags=re.IGNORECASE)
-    cleaned = re.sub(r'[^\d.,]', '', number_str)
-    cleaned = cleaned.replace(',', '')
-
-    try:
-        return float(cleaned)
-    except ValueError:
-        return None
-
-
 def clean_weight(weight_str):
     return clean_number(weight_str)
 
@@ -120,74 +107,78 @@ def float_eq(a, b, epsilon=1e-9):
     return math.isclose(float(a), float(b), rel_tol=epsilon)
 
 
-def get_item_info(item_name):
-    global current_search_item, checked_urls
-    current_search_item = item_name
-    checked_urls = {url: None for url in urls}
-
-    for i, url in enumerate(real_urls):
-        full_url = url + quote(item_name)
-        checked_urls[urls[i]] = 'Checking'
+def parse_item_page(checked, url_label, result):
+    if result.error is not None or result.status != 200:
+        checked[url_label] = 'Error'
         update_ui()
-        try:
-            response = requests.get(full_url)
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.text, 'html.parser')
-                content = soup.get_text()
-
-                price_match = re.search(r'Price[:\s]+([^;]+)', content)
-                cl_match = re.search(r'CL\s+(\d+)th', content)
-                weight_match = re.search(r'Weight[:\s]+([\d,.]+ lbs\.)', content)
-
-                if price_match or cl_match or weight_match:
-                    price = clean_number(price_match.group(1) if price_match else None)
-                    cl = cl_match.group(1) if cl_match else None
-                    weight = clean_number(weight_match.group(1) if weight_match else None)
-
-                    result = {
-                        'price': price,
-                        'cl': cl,
-                        'weight': weight,
-                        'source_url': full_url
-                    }
-
-                    logging.info(f"Item info found for {item_name}: {result}")
-
-                    checked_urls[urls[i]] = 'Found'
-                    update_ui()
-                    return result
+        return None
 
-                checked_urls[urls[i]] = 'Not Found'
-            else:
-                checked_urls[urls[i]] = 'Error'
-        except requests.RequestException:
-            checked_urls[urls[i]] = 'Error'
+    soup = BeautifulSoup(result.text, 'html.parser')
+    content = soup.get_text()
 
-        update_ui()
-        time.sleep(1)
+    price_match = re.search(r'Price[:\s]+([^;]+)', content)
+    cl_match = re.search(r'CL\s+(\d+)th', content)
+    weight_match = re.search(r'Weight[:\s]+([\d,.]+ lbs\.)', content)
 
-    logging.warning(f"No information found for item: {item_name}")
+    if price_match or cl_match or weight_match:
+        price = clean_number(price_match.group(1) if price_match else None)
+        cl = cl_match.group(1) if cl_match else None
+        weight = clean_number(weight_match.group(1) if weight_match else None)
+
+        checked[url_label] = 'Found'
+        update_ui()
+        return {
+            'price': price,
+            'cl': cl,
+            'weight': weight,
+            'source_url': result.url
+        }
+
+    checked[url_label] = 'Not Found'
+    update_ui()
     return None
 
 
-def process_items():
-    global processed_items, current_search_item, current_update_item
+async def get_item_info(engine, finder, item_name, item_type=None, subtype=None):
+    global current_search_item
+    current_search_item = item_name
+    checked = checked_urls[item_name] = {url: None for url in urls}
+    update_ui()
+
+    # The AoN index, or else the category predictor, decides which pages are probed and in what order
+    result = await finder.first_match(engine, item_name, item_type, subtype,
+                                      lambda url_label, page: parse_item_page(checked, url_label, page))
+    if result:
+        logging.info(f"Item info found for {item_name}: {result}")
+    else:
+        logging.warning(f"No information found for item: {item_name}")
+    return result
+
+
+def queued_items():
     while True:
         try:
-            item = item_queue.get(timeout=1)
+            yield item_queue.get_nowait()
         except queue.Empty:
-            break
+            return
 
-        try:
-            item_id, name, current_value, current_weight, current_caster_level = item
-            current_search_item = name
-            logging.info(f"Processing item: {name}")
-            update_ui()
 
-            info = get_item_info(name)
+def process_items(engine, finder, items_in_flight):
+    global processed_items, current_search_item, current_update_item
+
+    async def search(item):
+        logging.info(f"Processing item: {item[1]}")
+        return await get_item_info(engine, finder, item[1], item[5], item[6])
+
+    # Searches for the next items keep running while the user decides on this one
+    for item, info, error in search_items(queued_items(), search, engine, items_in_flight):
+        try:
+            item_id, name, current_value, current_weight, current_caster_level, item_type, subtype = item
+            if error:
+                raise error
             if not info:
-                logging.warning(f"No information found for item: {name}")
                 processed_items += 1
+                checked_urls.pop(name, None)
                 update_ui()
                 continue
 
@@ -217,14 +208,6 @@ def process_items():
                 while user_choice not in ['v', 'w', 'c', 'a', 'f']:
                     update_ui()
                     user_choice = get_user_input("Enter your choice for updates")
-                    if user_choice is None:
-                        # Process the next item in the queue while waiting for input
-                        try:
-                            next_item = item_queue.get_nowait()
-                            process_next_item(next_item)
-                        except queue.Empty:
-                            pass
-                        continue
 
                 if user_choice in ['v', 'w', 'c', 'a']:
                     update_queue.put(
@@ -236,31 +219,16 @@ def process_items():
                 logging.info(f"No updates needed for item {name}")
 
             processed_items += 1
+            checked_urls.pop(name, None)
             update_ui()
         except Exception as e:
-            logging.error(f"Error processing item {current_search_item}: {str(e)}", exc_info=True)
+            logging.error(f"Error processing item {item[1]}: {str(e)}", exc_info=True)
             processed_items += 1
             current_update_item = None
+            checked_urls.pop(item[1], None)
             update_ui()
 
 
-def process_next_item(item):
-    global current_search_item, processed_items
-    item_id, name, current_value, current_weight, current_caster_level = item
-    current_search_item = name
-    logging.info(f"Processing next item: {name}")
-    update_ui()
-
-    info = get_item_info(name)
-    if info:
-        logging.info(f"Information found for {name}: {info}")
-    else:
-        logging.warning(f"No information found for item: {name}")
-
-    processed_items += 1
-    update_ui()
-
-
 def update_ui():
     global term, processed_items, total_items, current_search_item, current_update_item, checked_urls
 
@@ -276,10 +244,12 @@ def update_ui():
             # Top progress bar
             progress = int((processed_items / total_items) * 80) if total_items > 0 else 0
             print(f"Checking #{processed_items:<5d} [{'#' * progress}{' ' * (80 - progress)}] Total {total_items:<5d}")
-            print(f"Checking Item: {current_search_item}")
+            # The item being confirmed, else the search started last
+            shown_item = current_update_item['name'] if current_update_item else current_search_item
+            print(f"Checking Item: {shown_item} ({len(checked_urls)} items in flight)")
 
             # URL Status
-            for url, status in checked_urls.items():
+            for url, status in list(checked_urls.get(shown_item, {}).items()):
                 status_str = "Not checked" if status is None else status
                 status_color = term.yellow if status is None else (term.green if status == 'Found' else term.red)
                 print(f"{url[:20]:<20} {status_color(status_str):<10}")
@@ -368,7 +338,7 @@ def get_user_input(prompt, timeout=0.1):
     return None
 
 
-def update_item_data(cursor, connection):
+def update_item_data(cursor, connection, engine, finder, items_in_flight):
     global current_update_item, total_items, processed_items, current_search_item
 
     try:
@@ -379,7 +349,7 @@ def update_item_data(cursor, connection):
         for item in items:
             item_queue.put(item)
 
-        processing_thread = threading.Thread(target=process_items)
+        processing_thread = threading.Thread(target=process_items, args=(engine, finder, items_in_flight))
         processing_thread.start()
 
         while processing_thread.is_alive() or not update_queue.empty():
@@ -394,7 +364,7 @@ def update_item_data(cursor, connection):
 
 def fetch_items_to_update(cursor):
     cursor.execute("""
-        SELECT id, name, value, weight, casterlevel
+        SELECT id, name, value, weight, casterlevel, type, subtype
         FROM item
         WHERE (value IS NULL OR weight IS NULL OR (casterlevel IS NULL and type = 'magic')) and type = 'magic'
         and (subtype not in ('wand','scroll','potion') or subtype is null)
@@ -547,12 +517,25 @@ def handle_critical_error(message, e):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Interactively fill in missing magic item data from AoN")
+    add_fetch_arguments(parser)
+    add_predictor_arguments(parser)
+    add_index_arguments(parser)
+    args = parser.parse_args()
+    predictor = predictor_from_args(zip(urls, real_urls), args)
+    # One request per listed item, none for the rest; without an index, probe the predicted categories
+    finder = index_from_args(args, predictor) or predictor
+
     try:
         connection = psycopg2.connect(**db_params)
         cursor = connection.cursor()
 
         with term.fullscreen(), term.hidden_cursor():
-            update_item_data(cursor, connection)
+            engine = engine_from_args(args)
+            update_item_data(cursor, connection, engine, finder, args.items_in_flight)
+            if engine.cache:
+                logging.info(engine.cache.summary())
+            logging.info(finder.summary())
 
         print(term.normal + term.clear + "Data update process completed. Press any key to exit.")
         term.inkey()
@@ -563,6 +546,7 @@ if __name__ == "__main__":
         logging.error(f"An error occurred: {str(e)}", exc_info=True)
         print(term.normal + term.clear + f"An error occurred: {e}")
     finally:
+        predictor.save()
         if 'connection' in locals():
             cursor.close()
             connection.close()
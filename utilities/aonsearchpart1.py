@@ -1,13 +1,12 @@
-import requests
 from bs4 import BeautifulSoup
 import psycopg2
 import re
-import time
-import random
+import argparse
 import logging
-from urllib.parse import quote
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from scrapetext import clean_currency_number as clean_number, clean_item_name
+from aonfetch import add_fetch_arguments, engine_from_args, search_items
+from aoncategories import add_predictor_arguments, predictor_from_args
+from aonindex import add_index_arguments, index_from_args
 import os
 import sys
 
@@ -54,141 +53,71 @@ urls = [
 ]
 
 
-def requests_retry_session(retries=3, backoff_factor=0.3, status_forcelist=(500, 502, 504)):
-    session = requests.Session()
-    retry = Retry(
-        total=retries,
-        read=retries,
-        connect=retries,
-        backoff_factor=backoff_factor,
-        status_forcelist=status_forcelist,
-    )
-    adapter = HTTPAdapter(max_retries=retry)
-    session.mount('http://', adapter)
-    session.mount('https://', adapter)
-    return session
-
-
-def clean_number(number_str):
-    if number_str is None or number_str.strip() in ['—', '-', '–', '']:
+def parse_item_page(url_name, result):
+    if result.error is not None:
+        print(f"Error fetching {result.url}: {str(result.error)}")
+        logging.error(f"Error fetching {result.url}: {str(result.error)}")
         return None
-
-    # Handle different currency types
-    currency_multipliers = {'cp': 0.01, 'sp': 0.1, 'gp': 1}
-    for currency, multiplier in currency_multipliers.items():
-        if currency in number_str.lower():
-            cleaned = re.sub(r'[^\d.,]', '', number_str)
-            cleaned = cleaned.replace(',', '')
-            try:
-                return float(cleaned) * multiplier
-            except ValueError:
-                return None
-
-    # If no currency specified, assume gp
-    cleaned = re.sub(r'[^\d.,]', '', number_str)
-    cleaned = cleaned.replace(',', '')
-    try:
-        return float(cleaned)
-    except ValueError:
+    if result.status != 200:
+        print(f"No results found at: {result.url}")
         return None
 
-
-def clean_item_name(name):
-    original_name = name
-
-    # Handle reversed names first
-    if ',' in name:
-        parts = name.split(',')
-        name = ' '.join(parts[::-1]).strip()
-
-    # Handle +X at the end of the name
-    name = re.sub(r'\s*\+(\d+)$', r'\1', name)
-
-    # Handle special cases for parentheses
-    if '(' in name:
-        base_name, extra = name.split('(', 1)
-        extra = extra.rstrip(')')
-
-        # Remove everything after '/' if it exists
-        if '/' in extra:
-            extra = extra.split('/', 1)[0]
-
-        # Combine base_name and extra
-        name = f"{base_name.strip()}{extra.strip()}"
-
-    return name, original_name
+    soup = BeautifulSoup(result.text, 'html.parser')
+    content = soup.get_text()
+
+    # Price
+    price_match = re.search(r'Price[:\s]+([^;]+)', content)
+    if price_match:
+        price_str = price_match.group(1)
+        # Check for multiple price points
+        price_points = re.findall(r'([\d,]+\s*(?:cp|sp|gp))', price_str)
+        if price_points:
+            # Use the first price point
+            price = clean_number(price_points[0])
+        else:
+            price = clean_number(price_str)
+    else:
+        price = None
+
+    # Weight
+    weight_match = re.search(r'Weight[:\s]+([\d,.]+ lbs\.|—)', content)
+    weight = clean_number(weight_match.group(1) if weight_match and weight_match.group(1) != '—' else None)
+
+    # Caster Level
+    cl_match = re.search(r'CL\s+(\d+)(?:st|nd|rd|th)', content)
+    if not cl_match:
+        cl_match = re.search(r'Caster Level[:\s]+(\d+)', content, re.IGNORECASE)
+    cl = int(cl_match.group(1)) if cl_match else None
+
+    if price is not None or weight is not None or cl is not None:
+        print(f"Found information at: {result.url}")
+        return {'price': price, 'cl': cl, 'weight': weight, 'source_url': result.url}
+    return None
 
 
-def get_item_info(item_name, try_simplified=True):
+async def get_item_info(engine, finder, item_name, item_type=None, subtype=None, try_simplified=True):
     cleaned_name, original_name = clean_item_name(item_name)
     print(f"Original name: {original_name}")
     print(f"Cleaned name: {cleaned_name}")
 
-    session = requests_retry_session()
-
-    for url_name, url in urls:
-        try:
-            # Properly URL-encode the entire cleaned name
-            encoded_name = quote(cleaned_name)
-            full_url = url + encoded_name
-            print(f"Checking URL: {full_url}")
-
-            response = session.get(full_url, timeout=30)
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.text, 'html.parser')
-                content = soup.get_text()
-
-                # Price
-                price_match = re.search(r'Price[:\s]+([^;]+)', content)
-                if price_match:
-                    price_str = price_match.group(1)
-                    # Check for multiple price points
-                    price_points = re.findall(r'([\d,]+\s*(?:cp|sp|gp))', price_str)
-                    if price_points:
-                        # Use the first price point
-                        price = clean_number(price_points[0])
-                    else:
-                        price = clean_number(price_str)
-                else:
-                    price = None
-
-                # Weight
-                weight_match = re.search(r'Weight[:\s]+([\d,.]+ lbs\.|—)', content)
-                weight = clean_number(weight_match.group(1) if weight_match and weight_match.group(1) != '—' else None)
-
-                # Caster Level
-                cl_match = re.search(r'CL\s+(\d+)(?:st|nd|rd|th)', content)
-                if not cl_match:
-                    cl_match = re.search(r'Caster Level[:\s]+(\d+)', content, re.IGNORECASE)
-                cl = int(cl_match.group(1)) if cl_match else None
-
-                if price is not None or weight is not None or cl is not None:
-                    print(f"Found information at: {full_url}")
-                    return {'price': price, 'cl': cl, 'weight': weight, 'source_url': full_url}
-            else:
-                print(f"No results found at: {full_url}")
-
-        except requests.RequestException as e:
-            print(f"Error fetching {full_url}: {str(e)}")
-            logging.error(f"Error fetching {full_url}: {str(e)}", exc_info=True)
-
-        # Random delay between 1 and 3 seconds before the next request
-        delay = random.uniform(1, 3)
-        time.sleep(delay)
+    # Probes come from the AoN index or the category predictor; the engine's rate budget replaces the old random sleep
+    info = await finder.first_match(engine, cleaned_name, item_type, subtype, parse_item_page)
+    if info:
+        return info
 
     # If no results found and we haven't tried the simplified name yet, try again with the number removed
     if try_simplified and re.search(r'\d+$', cleaned_name):
         simplified_name = re.sub(r'\s*\d+$', '', cleaned_name)
         print(f"No results found. Trying again with simplified name: {simplified_name}")
-        return get_item_info(simplified_name, try_simplified=False)  # Recursive call with simplified name
+        return await get_item_info(engine, finder, simplified_name, item_type, subtype, try_simplified=False)
 
     # If no results found and we've already tried the simplified name, try removing everything in parentheses
     elif try_simplified and '(' in original_name:
         simplified_name = original_name.split('(')[0].strip()
         print(f"No results found. Trying again with simplified name: {simplified_name}")
-        return get_item_info(simplified_name, try_simplified=False)  # Recursive call with simplified name
+        return await get_item_info(engine, finder, simplified_name, item_type, subtype, try_simplified=False)
 
-    print("No information found for this item.")
+    print(f"No information found for {item_name}.")
     return None
 
 
@@ -208,13 +137,23 @@ def insert_item_update(cursor, item_id, name, info):
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Search AoN for items missing a value, weight or caster level "
+                                                 "and record what was found in itemupdate")
+    add_fetch_arguments(parser)
+    add_predictor_arguments(parser)
+    add_index_arguments(parser)
+    args = parser.parse_args()
+    predictor = predictor_from_args(urls, args)
+    # One request per listed item, none for the rest; without an index, probe the predicted categories
+    finder = index_from_args(args, predictor) or predictor
+
     connection = None
     try:
         connection = psycopg2.connect(**db_params)
         cursor = connection.cursor()
 
         cursor.execute("""
-            SELECT i.id, i.name
+            SELECT i.id, i.name, i.type, i.subtype
             FROM item i
             WHERE (i.value IS NULL OR i.weight IS NULL OR (i.casterlevel IS NULL AND i.type = 'magic'))         
             AND (i.subtype NOT IN ('wand','scroll','potion') OR i.subtype IS NULL)
@@ -225,12 +164,17 @@ def main():
         """)
         items = cursor.fetchall()
 
+        engine = engine_from_args(args)
         total_items = len(items)
-        for index, item in enumerate(items, 1):
+        # Items are searched concurrently; results arrive in completion order
+        results = search_items(items, lambda item: get_item_info(engine, finder, *item[1:]), engine,
+                               args.items_in_flight)
+        for index, (item, info, error) in enumerate(results, 1):
             try:
-                item_id, item_name = item
-                print(f"Processing item {index}/{total_items}: {item_name}")
-                info = get_item_info(item_name)
+                item_id, item_name = item[:2]
+                print(f"Processed item {index}/{total_items}: {item_name}")
+                if error:
+                    raise error
                 if info:
                     insert_item_update(cursor, item_id, item_name, info)
                     connection.commit()
@@ -244,14 +188,18 @@ def main():
             print("-------------------------")  # Add a separator between items
 
         print("Search completed.")
+        if engine.cache:
+            print(engine.cache.summary())
+        print(finder.summary())
 
     except (Exception, psycopg2.Error) as error:
         logging.error(f"Error: {error}", exc_info=True)
     finally:
+        predictor.save()
         if connection:
             cursor.close()
             connection.close()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,13 +1,15 @@
-import requests
 from bs4 import BeautifulSoup
 import psycopg2
 import re
-import time
-from urllib.parse import quote
+import argparse
 import math
 import threading
 import queue
 from blessed import Terminal
+from scrapetext import clean_number
+from aonfetch import add_fetch_arguments, engine_from_args, search_items
+from aoncategories import add_predictor_arguments, predictor_from_args
+from aonindex import add_index_arguments, index_from_args
 import logging
 import traceback
 import sys
@@ -57,28 +59,14 @@ urls = [
 item_queue = queue.Queue()
 update_queue = queue.Queue()
 current_item = None
-checked_urls = {url[0]: None for url in urls}
+# Item name -> {category: status} for every item in flight; the panel shows the search started last
+checked_urls = {}
 total_items = 0
 processed_items = 0
 
 term = Terminal()
 
 
-def clean_number(number_str):
-    if number_str is None:
-        return None
-    number_str = number_str.strip()
-    if number_str in ['—', '-', '–', '']:
-        return None
-    number_str = re.sub(r'\s*(gp|lbs\.)\s*$', '', number_str, flags=re.IGNORECASE)
-    cleaned = re.sub(r'[^\d.,]', '', number_str)
-    cleaned = cleaned.replace(',', '')
-    try:
-        return float(cleaned)
-    except ValueError:
-        return None
-
-
 def float_eq(a, b, epsilon=1e-9):
     if a is None and b is None:
         return True
@@ -87,49 +75,60 @@ def float_eq(a, b, epsilon=1e-9):
     return math.isclose(float(a), float(b), rel_tol=epsilon)
 
 
-def get_item_info(item_name):
-    global checked_urls
-    for url_name, url in urls:
-        full_url = url + quote(item_name)
-        checked_urls[url_name] = 'Checking'
+def parse_item_page(checked, url_name, result):
+    if result.error is not None:
+        checked[url_name] = 'Error'
         update_ui()
-        try:
-            response = requests.get(full_url, timeout=10)
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.text, 'html.parser')
-                content = soup.get_text()
-
-                price_match = re.search(r'Price[:\s]+([^;]+)', content)
-                cl_match = re.search(r'CL\s+(\d+)th', content)
-                weight_match = re.search(r'Weight[:\s]+([\d,.]+ lbs\.)', content)
-
-                if price_match or cl_match or weight_match:
-                    price = clean_number(price_match.group(1) if price_match else None)
-                    cl = int(cl_match.group(1)) if cl_match else None
-                    weight = clean_number(weight_match.group(1) if weight_match else None)
-
-                    checked_urls[url_name] = 'Found'
-                    update_ui()
-                    return {'price': price, 'cl': cl, 'weight': weight, 'source_url': full_url}
-
-            checked_urls[url_name] = 'Not Found'
-        except requests.RequestException:
-            checked_urls[url_name] = 'Error'
-        update_ui()
-        time.sleep(1)
+        return None
+    if result.status == 200:
+        soup = BeautifulSoup(result.text, 'html.parser')
+        content = soup.get_text()
+
+        price_match = re.search(r'Price[:\s]+([^;]+)', content)
+        cl_match = re.search(r'CL\s+(\d+)th', content)
+        weight_match = re.search(r'Weight[:\s]+([\d,.]+ lbs\.)', content)
+
+        if price_match or cl_match or weight_match:
+            price = clean_number(price_match.group(1) if price_match else None)
+            cl = int(cl_match.group(1)) if cl_match else None
+            weight = clean_number(weight_match.group(1) if weight_match else None)
+
+            checked[url_name] = 'Found'
+            update_ui()
+            return {'price': price, 'cl': cl, 'weight': weight, 'source_url': result.url}
+
+    checked[url_name] = 'Not Found'
+    update_ui()
     return None
 
 
-def process_items():
-    global processed_items, current_item
+async def get_item_info(engine, finder, item_name, item_type=None, subtype=None):
+    # The AoN index, or else the category predictor, decides which pages are probed and in what order
+    checked = checked_urls[item_name] = {url[0]: None for url in urls}
+    update_ui()
+    return await finder.first_match(engine, item_name, item_type, subtype,
+                                    lambda url_name, page: parse_item_page(checked, url_name, page))
+
+
+def queued_items():
     while not item_queue.empty():
-        item = item_queue.get()
-        item_id, name, current_value, current_weight, current_caster_level = item
-        current_item = name
+        yield item_queue.get()
+
+
+def process_items(engine, finder, items_in_flight):
+    global processed_items, current_item
+
+    async def search(item):
+        global current_item
+        current_item = item[1]
         update_ui()
+        return await get_item_info(engine, finder, item[1], item[5], item[6])
 
-        info = get_item_info(name)
-        if info:
+    for item, info, error in search_items(queued_items(), search, engine, items_in_flight):
+        item_id, name, current_value, current_weight, current_caster_level, item_type, subtype = item
+        if error:
+            logging.error(f"Error searching for {name}: {error}")
+        elif info:
             updates = []
             if 'price' in info and info['price'] is not None and not float_eq(info['price'], current_value):
                 updates.append(('Value', current_value, info['price'], 'value'))
@@ -142,6 +141,7 @@ def process_items():
                 update_queue.put((item_id, name, updates, current_value, current_weight, current_caster_level, info))
 
         processed_items += 1
+        checked_urls.pop(name, None)
         update_ui()
 
 
@@ -150,9 +150,9 @@ def update_ui():
         print(term.clear())
         progress = int((processed_items / total_items) * 80) if total_items > 0 else 0
         print(f"Checking #{processed_items:<5d} [{'#' * progress}{' ' * (80 - progress)}] Total {total_items:<5d}")
-        print(f"Checking Item: {current_item}")
+        print(f"Checking Item: {current_item} ({len(checked_urls)} items in flight)")
 
-        for url_name, status in checked_urls.items():
+        for url_name, status in list(checked_urls.get(current_item, {}).items()):
             status_str = "Not checked" if status is None else status
             status_color = term.yellow if status is None else (term.green if status == 'Found' else term.red)
             print(f"{url_name[:20]:<20} {status_color(status_str):<10}")
@@ -171,11 +171,11 @@ def get_user_input(prompt):
         return key.lower()
 
 
-def update_item_data(cursor, connection):
+def update_item_data(cursor, connection, engine, finder, items_in_flight):
     global total_items, processed_items, current_item
 
     cursor.execute("""
-        SELECT id, name, value, weight, casterlevel
+        SELECT id, name, value, weight, casterlevel, type, subtype
         FROM item
         WHERE (value IS NULL OR weight IS NULL OR (casterlevel IS NULL and type = 'magic')) and type = 'magic'
         and (subtype not in ('wand','scroll','potion') or subtype is null)
@@ -187,7 +187,7 @@ def update_item_data(cursor, connection):
     for item in items:
         item_queue.put(item)
 
-    processing_thread = threading.Thread(target=process_items)
+    processing_thread = threading.Thread(target=process_items, args=(engine, finder, items_in_flight))
     processing_thread.start()
 
     while processing_thread.is_alive() or not update_queue.empty():
@@ -241,12 +241,25 @@ def update_item_data(cursor, connection):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill in missing magic item values, weights and caster levels from AoN")
+    add_fetch_arguments(parser)
+    add_predictor_arguments(parser)
+    add_index_arguments(parser)
+    args = parser.parse_args()
+    predictor = predictor_from_args(urls, args)
+    # One request per listed item, none for the rest; without an index, probe the predicted categories
+    finder = index_from_args(args, predictor) or predictor
+
     try:
         connection = psycopg2.connect(**db_params)
         cursor = connection.cursor()
 
         with term.fullscreen(), term.hidden_cursor():
-            update_item_data(cursor, connection)
+            engine = engine_from_args(args)
+            update_item_data(cursor, connection, engine, finder, args.items_in_flight)
+            if engine.cache:
+                logging.info(engine.cache.summary())
+            logging.info(finder.summary())
 
         print(term.normal + term.clear + "Data update process completed. Press any key to exit.")
         term.inkey()
@@ -257,6 +270,7 @@ if __name__ == "__main__":
         logging.error(f"An error occurred: {str(e)}", exc_info=True)
         print(term.normal + term.clear + f"An error occurred: {e}")
     finally:
+        predictor.save()
         if 'connection' in locals():
             cursor.close()
             connection.close()
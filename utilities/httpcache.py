@@ -0,0 +1,163 @@
+"""
+Persistent HTTP response cache shared by the scrapers.
+
+Every run of the AoN and d20pfsrd scrapers used to fetch the same pages again
+from scratch. HttpCache keeps the pages on disk, so a rerun after a parser fix
+or a crash is mostly served locally:
+
+- entries/ holds one small JSON file per URL (named by the hash of the URL)
+  with the status, the ETag/Last-Modified validators, when it was fetched and
+  the hash of the body;
+- bodies/ holds each distinct body once, gzip-compressed and named by the
+  hash of its content, so the thousands of identical "no such item" pages
+  take the space of one.
+
+An entry younger than the TTL is served without any request. An older one is
+revalidated with If-None-Match/If-Modified-Since; a 304 only refreshes the
+entry. Only 200/404/410 responses are stored; errors are never cached. Files
+are written to a temporary name and renamed, so an interrupted run leaves no
+half-written entry behind.
+
+    cache = HttpCache('http_cache', ttl=7 * 24 * 3600)
+    page = cache.get(session, url, timeout=10)
+    print(page.status, page.source)   # source: 'fresh', 'revalidated' or 'network'
+"""
+
+import os
+import gzip
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from collections import namedtuple, Counter
+
+DEFAULT_CACHE_DIR = 'http_cache'
+DEFAULT_TTL_HOURS = 7 * 24
+CACHEABLE_STATUSES = frozenset([200, 404, 410])
+
+CacheEntry = namedtuple('CacheEntry', ['url', 'status', 'etag', 'last_modified', 'fetched_at', 'body_hash'])
+CachedPage = namedtuple('CachedPage', ['url', 'status', 'text', 'source', 'headers'])
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class HttpCache:
+    """Content-addressed on-disk cache of GET responses, keyed by URL."""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL_HOURS * 3600):
+        self.directory = directory
+        self.ttl = ttl
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+    def _path(self, kind, key, suffix):
+        return os.path.join(self.directory, kind, key[:2], key + suffix)
+
+    def _write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def lookup(self, url):
+        try:
+            with open(self._path('entries', _digest(url.encode('utf-8')), '.json'), 'r', encoding='utf-8') as file:
+                entry = CacheEntry(**json.load(file))
+        except (OSError, ValueError, TypeError):
+            return None
+        # An entry whose body went missing (a partly deleted cache) counts as absent
+        return entry if os.path.exists(self._path('bodies', entry.body_hash, '.gz')) else None
+
+    def is_fresh(self, entry):
+        return time.time() - entry.fetched_at < self.ttl
+
+    def read_body(self, entry):
+        with gzip.open(self._path('bodies', entry.body_hash, '.gz'), 'rb') as file:
+            return file.read().decode('utf-8')
+
+    def _write_entry(self, entry):
+        data = json.dumps(entry._asdict()).encode('utf-8')
+        self._write(self._path('entries', _digest(entry.url.encode('utf-8')), '.json'), data)
+
+    def store(self, url, status, text, headers):
+        if status not in CACHEABLE_STATUSES:
+            return None
+        body = text.encode('utf-8')
+        body_hash = _digest(body)
+        body_path = self._path('bodies', body_hash, '.gz')
+        if not os.path.exists(body_path):
+            self._write(body_path, gzip.compress(body, compresslevel=6))
+        entry = CacheEntry(url, status, headers.get('ETag'), headers.get('Last-Modified'), time.time(), body_hash)
+        self._write_entry(entry)
+        return entry
+
+    def revalidated(self, entry, headers):
+        """Record a 304: the stored body is current again as of now."""
+        entry = entry._replace(etag=headers.get('ETag') or entry.etag,
+                               last_modified=headers.get('Last-Modified') or entry.last_modified,
+                               fetched_at=time.time())
+        self._write_entry(entry)
+        return entry
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def fresh(self, url):
+        """The cached page for url if it is within the TTL, else None; never touches the network."""
+        entry = self.lookup(url)
+        if entry is None or not self.is_fresh(entry):
+            return None
+        self._count('fresh')
+        return CachedPage(url, entry.status, self.read_body(entry), 'fresh', {})
+
+    def get(self, session, url, headers=None, **kwargs):
+        """GET url through the cache with a requests session; network errors are raised as usual."""
+        entry = self.lookup(url)
+        if entry is not None and self.is_fresh(entry):
+            self._count('fresh')
+            return CachedPage(url, entry.status, self.read_body(entry), 'fresh', {})
+
+        request_headers = dict(headers or {})
+        if entry is not None:
+            request_headers.update(self.conditional_headers(entry))
+        response = session.get(url, headers=request_headers, **kwargs)
+
+        if response.status_code == 304 and entry is not None:
+            self.revalidated(entry, response.headers)
+            self._count('revalidated')
+            return CachedPage(url, entry.status, self.read_body(entry), 'revalidated', response.headers)
+        self.store(url, response.status_code, response.text, response.headers)
+        self._count('network')
+        return CachedPage(url, response.status_code, response.text, 'network', response.headers)
+
+    def summary(self):
+        return (f"HTTP cache: {self.stats['fresh']} fresh, {self.stats['revalidated']} revalidated, "
+                f"{self.stats['network']} fetched")
+
+
+def add_cache_arguments(parser):
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Directory of the HTTP response cache")
+    parser.add_argument("--cache-ttl", type=float, default=DEFAULT_TTL_HOURS,
+                        help="Hours a cached page is used without asking the site again")
+    parser.add_argument("--no-cache", action="store_true", help="Always fetch pages and do not store them")
+
+
+def cache_from_args(args):
+    return None if args.no_cache else HttpCache(args.cache_dir, ttl=args.cache_ttl * 3600)
@@ -3,6 +3,18 @@ import re
 import psycopg2
 from psycopg2 import sql
 import sys
+import argparse
+from collections import namedtuple
+from itertools import groupby
+from psycopg2.extras import execute_values
+from lstcopy import CopyLoader
+from lsttokenizer import tokenize_line, find_caster_level
+from lstindex import LstNameIndex, DEFAULT_INDEX_PATH, collect_entries, normalize_key
+from lstmmap import find_lines_starting_with
+from lstwalk import find_lst_files
+
+REVIEW_COLUMNS = ('item_id', 'item_name', 'lst_name', 'source_file', 'current_value', 'current_weight',
+                  'current_casterlevel', 'new_value', 'new_weight', 'new_casterlevel')
 
 
 def is_relevant_file(filename):
@@ -11,30 +23,11 @@ def is_relevant_file(filename):
 
 
 def extract_item_info(line):
-    value = weight = caster_level = None
-    item_name = line.split('\t')[0].strip()
-
-    cost_match = re.search(r'COST:(\d+(?:\.\d+)?)', line)
-    if cost_match:
-        value = cost_match.group(1)
-
-    weight_match = re.search(r'WT:(\d+(?:\.\d+)?)', line)
-    if weight_match:
-        weight = weight_match.group(1)
-
-    cl_patterns = [
-        r'SPROP:[^|]*\|CL(\d+)',
-        r'CL=(\d+)',
-        r'CASTER LEVEL=(\d+)',
-        r'CASTERLEVEL=(\d+)',
-        r'\bCL\s+(\d+)',
-    ]
-
-    for pattern in cl_patterns:
-        cl_match = re.search(pattern, line, re.IGNORECASE)
-        if cl_match:
-            caster_level = cl_match.group(1)
-            break
+    record = tokenize_line(line.rstrip('\r\n'))
+    item_name = record.name
+    value = record.get_number('COST', decimal=True)
+    weight = record.get_number('WT', decimal=True)
+    caster_level = find_caster_level(record)
 
     return item_name, value, weight, caster_level
 
@@ -43,20 +36,17 @@ def create_search_pattern(item_name):
     return rf"^{re.escape(item_name)}($|\t)"
 
 
-def search_lst_files(item_name, lst_directory):
+def search_lst_files(item_name, file_paths):
     search_pattern = create_search_pattern(item_name)
     matches = []
-    for root, _, files in os.walk(lst_directory):
-        for file in files:
-            if file.endswith('.lst') and is_relevant_file(file):
-                file_path = os.path.join(root, file)
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    for line in f:
-                        if re.match(search_pattern, line, re.IGNORECASE):
-                            lst_item_name, value, weight, caster_level = extract_item_info(line)
-                            if value or weight or caster_level:
-                                matches.append(
-                                    (lst_item_name, value, weight, caster_level, os.path.basename(file_path)))
+    for file_path in file_paths:
+        # Byte-level prefilter on the mapped file, folding case per character; the regex confirms the match
+        for line in find_lines_starting_with(file_path, item_name):
+            if re.match(search_pattern, line, re.IGNORECASE):
+                lst_item_name, value, weight, caster_level = extract_item_info(line)
+                if value or weight or caster_level:
+                    matches.append(
+                        (lst_item_name, value, weight, caster_level, os.path.basename(file_path)))
     return matches
 
 
@@ -117,17 +107,14 @@ def confirm_update(attribute, current_value, new_value, source_item, source_file
     return input(f"Do you want to update {attribute}? (y/n): ").lower() == 'y'
 
 
-def update_item_data(cursor, connection, lst_directory):
-    cursor.execute("""
-        SELECT id, name, value, weight, casterlevel
-        FROM item
-        WHERE value IS NULL OR weight IS NULL OR casterlevel IS NULL
-    """)
-    items = cursor.fetchall()
+def update_item_data(cursor, connection, lst_directory, index=None):
+    items = fetch_candidate_items(cursor)
+    # Without an index the tree is still only walked once; each item searches the same file list
+    file_paths = None if index else list(find_lst_files(lst_directory, is_relevant_file))
 
     for item in items:
         item_id, name, current_value, current_weight, current_caster_level = item
-        matches = search_lst_files(name, lst_directory)
+        matches = index.lookup(name) if index else search_lst_files(name, file_paths)
 
         if not matches:
             continue
@@ -184,7 +171,273 @@ def update_item_data(cursor, connection, lst_directory):
             print("No updates made for this item.")
 
 
+# Batch mode: propose matches every item at once into item_lst_review, review
+# only records decisions there, and apply writes every accepted change in one
+# statement, so the prompts no longer pace the item updates.
+
+ReviewRow = namedtuple('ReviewRow', ['id', 'item_id', 'item_name', 'lst_name', 'source_file', 'current_value',
+                                     'current_weight', 'current_casterlevel', 'new_value', 'new_weight',
+                                     'new_casterlevel'])
+
+
+def check_review_table(cursor):
+    """item_lst_review comes from migration 058; refuse to run the batch commands without it."""
+    cursor.execute("SELECT to_regclass('item_lst_review')")
+    if cursor.fetchone()[0] is None:
+        raise ValueError("item_lst_review does not exist; run migration 058_add_item_lst_review.sql first")
+
+
+def fetch_candidate_items(cursor):
+    cursor.execute("""
+        SELECT id, name, value, weight, casterlevel
+        FROM item
+        WHERE value IS NULL OR weight IS NULL OR casterlevel IS NULL
+    """)
+    return cursor.fetchall()
+
+
+def match_all_items(items, lst_directory, index=None):
+    """{item id: LST matches} for every item: index lookups, or a single walk of the tree."""
+    if index:
+        return {item[0]: index.lookup(item[1]) for item in items}
+    entries = collect_entries(find_lst_files(lst_directory, is_relevant_file), extract_item_info)
+    return {item[0]: entries.get(normalize_key(item[1]), []) for item in items}
+
+
+def propose_changes(item, matches):
+    """One proposal per distinct change the matches would make; unchanged attributes stay None."""
+    item_id, name, current_value, current_weight, current_caster_level = item
+    proposals = {}
+    for lst_item_name, value, weight, caster_level, source_file in matches:
+        changes = tuple(new if new is not None and not values_are_equal(current, new) else None
+                        for current, new in ((current_value, value), (current_weight, weight),
+                                             (current_caster_level, caster_level)))
+        key = tuple(float(change) if change is not None else None for change in changes)
+        if any(change is not None for change in changes) and key not in proposals:
+            proposals[key] = (item_id, name, lst_item_name, source_file,
+                              current_value, current_weight, current_caster_level) + changes
+    return list(proposals.values())
+
+
+def propose_item_updates(cursor, lst_directory, index=None):
+    """Match every candidate item and replace the pending proposals; returns (items matched, proposals)."""
+    check_review_table(cursor)
+    items = fetch_candidate_items(cursor)
+    matches = match_all_items(items, lst_directory, index)
+
+    cursor.execute("""
+        DROP TABLE IF EXISTS item_lst_review_stage;
+        CREATE TEMP TABLE item_lst_review_stage AS
+        SELECT item_id, item_name, lst_name, source_file, current_value, current_weight, current_casterlevel,
+               new_value, new_weight, new_casterlevel
+        FROM item_lst_review WITH NO DATA;
+    """)
+    loader = CopyLoader(cursor, 'item_lst_review_stage', REVIEW_COLUMNS)
+    matched = 0
+    for item in items:
+        if matches[item[0]]:
+            matched += 1
+        for proposal in propose_changes(item, matches[item[0]]):
+            loader.add(proposal)
+    loader.flush()
+
+    # A change already rejected for the same item is not proposed again, and an
+    # item with an accepted change waits for apply: a partly accepted change
+    # would otherwise come back as a new proposal and end up accepted twice
+    cursor.execute("""
+        DELETE FROM item_lst_review WHERE status = 'pending';
+        INSERT INTO item_lst_review (item_id, item_name, lst_name, source_file, current_value, current_weight,
+                                     current_casterlevel, new_value, new_weight, new_casterlevel)
+        SELECT s.item_id, s.item_name, s.lst_name, s.source_file, s.current_value, s.current_weight,
+               s.current_casterlevel, s.new_value, s.new_weight, s.new_casterlevel
+        FROM item_lst_review_stage s
+        WHERE NOT EXISTS (
+            SELECT 1 FROM item_lst_review r
+            WHERE r.item_id = s.item_id
+              AND r.status = 'rejected'
+              AND ROW(r.new_value, r.new_weight, r.new_casterlevel)
+                  IS NOT DISTINCT FROM ROW(s.new_value, s.new_weight, s.new_casterlevel)
+        )
+          AND NOT EXISTS (
+            SELECT 1 FROM item_lst_review a
+            WHERE a.item_id = s.item_id AND a.status = 'accepted'
+        );
+    """)
+    return matched, cursor.rowcount
+
+
+def fetch_pending_reviews(cursor):
+    # Items with more than one accepted change are skipped by apply, so their
+    # accepted rows come back for review alongside the pending ones
+    cursor.execute("""
+        SELECT id, item_id, item_name, lst_name, source_file, current_value, current_weight, current_casterlevel,
+               new_value, new_weight, new_casterlevel
+        FROM item_lst_review r
+        WHERE status = 'pending'
+           OR (status = 'accepted'
+               AND EXISTS (SELECT 1 FROM item_lst_review o
+                           WHERE o.item_id = r.item_id AND o.status = 'accepted' AND o.id <> r.id))
+        ORDER BY item_name, item_id, id
+    """)
+    return [ReviewRow(*row) for row in cursor.fetchall()]
+
+
+def choose_proposal(rows):
+    """Pick one of several proposals for the same item; None rejects them all, 'skip' leaves them pending."""
+    first = rows[0]
+    print(f"\nMultiple matches found for '{first.item_name}'.")
+    print(f"Current database values - Value: {first.current_value}, Weight: {first.current_weight}, "
+          f"Caster Level: {first.current_casterlevel}")
+    for i, row in enumerate(rows, 1):
+        print(f"{i}. {row.lst_name} (File: {row.source_file}, Value: {row.new_value}, Weight: {row.new_weight}, "
+              f"CL: {row.new_casterlevel})")
+    print("0. Reject all")
+
+    while True:
+        choice = input(f"Enter the number of your choice (0-{len(rows)}, s to skip for now): ").strip().lower()
+        if choice == 's':
+            return 'skip'
+        if choice.isdigit() and 0 <= int(choice) <= len(rows):
+            return rows[int(choice) - 1] if int(choice) else None
+        print("Invalid choice. Please try again.")
+
+
+def confirm_proposal(row):
+    """Ask per attribute, as the interactive mode does; declined attributes are dropped from the change."""
+    print(f"\nProcessing item: {row.item_name}")
+    print(f"Matched LST item: {row.lst_name}")
+    changes = []
+    for attribute, current, new in (("Value", row.current_value, row.new_value),
+                                    ("Weight", row.current_weight, row.new_weight),
+                                    ("Caster Level", row.current_casterlevel, row.new_casterlevel)):
+        if new is not None and not confirm_update(attribute, current, new, row.lst_name, row.source_file):
+            new = None
+        changes.append(new)
+    return changes
+
+
+def review_item_proposals(rows):
+    """Decisions (review id, status, new value, new weight, new caster level) for one item's proposals.
+
+    When only some attributes of the chosen change are accepted, the declined
+    ones get a 'declined' decision of their own, so they are not proposed again.
+    """
+    chosen = rows[0] if len(rows) == 1 else choose_proposal(rows)
+    if chosen == 'skip':
+        return []
+    decisions = [(row.id, 'rejected', row.new_value, row.new_weight, row.new_casterlevel)
+                 for row in rows if row is not chosen]
+    if chosen is not None:
+        proposed = (chosen.new_value, chosen.new_weight, chosen.new_casterlevel)
+        changes = confirm_proposal(chosen)
+        if all(change is None for change in changes):
+            decisions.append((chosen.id, 'rejected', *proposed))
+        else:
+            decisions.append((chosen.id, 'accepted', *changes))
+            declined = [new if change is None else None for new, change in zip(proposed, changes)]
+            if any(value is not None for value in declined):
+                decisions.append((chosen.id, 'declined', *declined))
+    return decisions
+
+
+def save_review_decisions(cursor, decisions):
+    """Record the decisions with one UPDATE (plus one INSERT for declined attributes); returns rows decided."""
+    updates = [decision for decision in decisions if decision[1] != 'declined']
+    declined = [decision for decision in decisions if decision[1] == 'declined']
+    template = "(%s, %s, %s::NUMERIC, %s::DOUBLE PRECISION, %s::INTEGER)"
+    if not updates:
+        return 0
+    execute_values(cursor, """
+        UPDATE item_lst_review r
+        SET status = d.status, new_value = d.new_value, new_weight = d.new_weight,
+            new_casterlevel = d.new_casterlevel, reviewed_at = NOW()
+        FROM (VALUES %s) AS d(id, status, new_value, new_weight, new_casterlevel)
+        WHERE r.id = d.id AND r.status IN ('pending', 'accepted')
+    """, updates, template=template, page_size=len(updates))
+    decided = cursor.rowcount
+    if declined:
+        execute_values(cursor, """
+            INSERT INTO item_lst_review (item_id, item_name, lst_name, source_file, current_value, current_weight,
+                                         current_casterlevel, new_value, new_weight, new_casterlevel, status,
+                                         reviewed_at)
+            SELECT r.item_id, r.item_name, r.lst_name, r.source_file, r.current_value, r.current_weight,
+                   r.current_casterlevel, d.new_value, d.new_weight, d.new_casterlevel, 'rejected', NOW()
+            FROM (VALUES %s) AS d(id, status, new_value, new_weight, new_casterlevel)
+            JOIN item_lst_review r ON r.id = d.id
+        """, declined, template=template, page_size=len(declined))
+    return decided
+
+
+def review_item_updates(cursor):
+    """Prompt through the pending proposals; the decisions are written together at the end."""
+    check_review_table(cursor)
+    rows = fetch_pending_reviews(cursor)
+    decisions = []
+    try:
+        for _, item_rows in groupby(rows, key=lambda row: row.item_id):
+            decisions.extend(review_item_proposals(list(item_rows)))
+    except (EOFError, KeyboardInterrupt):
+        print("\nReview stopped; keeping the decisions made so far.")
+    return save_review_decisions(cursor, decisions)
+
+
+def apply_item_updates(cursor):
+    """Write every accepted change to item in one statement; returns (applied, stale, conflicting items).
+
+    An accepted change is applied only while the item still has the values it
+    was proposed against; otherwise it is marked stale. Items with more than
+    one accepted change are left for another review.
+    """
+    check_review_table(cursor)
+    cursor.execute("""
+        WITH accepted AS (
+            SELECT r.id, r.item_id, r.current_value, r.current_weight, r.current_casterlevel,
+                   r.new_value, r.new_weight, r.new_casterlevel
+            FROM item_lst_review r
+            WHERE r.status = 'accepted'
+              AND NOT EXISTS (SELECT 1 FROM item_lst_review o
+                              WHERE o.item_id = r.item_id AND o.status = 'accepted' AND o.id <> r.id)
+        ),
+        updated AS (
+            UPDATE item i
+            SET value = COALESCE(a.new_value, i.value),
+                weight = COALESCE(a.new_weight, i.weight),
+                casterlevel = COALESCE(a.new_casterlevel, i.casterlevel)
+            FROM accepted a
+            WHERE i.id = a.item_id
+              AND ROW(i.value, i.weight, i.casterlevel)
+                  IS NOT DISTINCT FROM ROW(a.current_value, a.current_weight, a.current_casterlevel)
+            RETURNING a.id
+        ),
+        marked AS (
+            UPDATE item_lst_review r
+            SET status = CASE WHEN r.id IN (SELECT id FROM updated) THEN 'applied' ELSE 'stale' END
+            FROM accepted a
+            WHERE r.id = a.id
+            RETURNING r.status
+        )
+        SELECT (SELECT COUNT(*) FROM marked WHERE status = 'applied'),
+               (SELECT COUNT(*) FROM marked WHERE status = 'stale'),
+               (SELECT COUNT(DISTINCT item_id) FROM item_lst_review
+                WHERE status = 'accepted' AND id NOT IN (SELECT id FROM accepted))
+    """)
+    return cursor.fetchone()
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill missing item value/weight/caster level from PCGen LST data")
+    parser.add_argument("command", nargs="?", default="update", choices=["update", "propose", "review", "apply"],
+                        help="update: match and prompt item by item, committing each update (default); "
+                             "propose: match every item at once and store the proposed changes in "
+                             "item_lst_review; review: accept or reject the pending proposals; "
+                             "apply: write all accepted changes to item in one statement")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH,
+                        help="Path of the persistent LST name index (rebuilt when the LST tree changes)")
+    parser.add_argument("--rebuild-index", action="store_true", help="Force a rebuild of the name index")
+    parser.add_argument("--no-index", action="store_true",
+                        help="Scan the LST tree for every item instead of using the name index")
+    args = parser.parse_args()
+
     lst_directory = "../../itemsnew"  # Replace with your actual directory path
 
     # Database connection parameters
@@ -201,15 +454,45 @@ if __name__ == "__main__":
         sys.exit(1)
 
     # Establish database connection
+    connection = None
     try:
         connection = psycopg2.connect(**db_params)
         print("Connected to the database successfully.")
 
         cursor = connection.cursor()
 
-        update_item_data(cursor, connection, lst_directory)
+        if args.command == "review":
+            decided = review_item_updates(cursor)
+            connection.commit()
+            print(f"\nRecorded {decided} review decisions. Run 'python itemsearch.py apply' to write them.")
+        elif args.command == "apply":
+            applied, stale, conflicting = apply_item_updates(cursor)
+            connection.commit()
+            print(f"Applied {applied} accepted changes; {stale} were stale (item changed since proposed).")
+            if conflicting:
+                print(f"{conflicting} items have more than one accepted change and were skipped; "
+                      f"run 'python itemsearch.py review' to pick one.")
+        else:
+            index = None
+            if not args.no_index:
+                index = LstNameIndex.open_or_build(lst_directory, is_relevant_file, extract_item_info,
+                                                   args.index, rebuild=args.rebuild_index)
+
+            if args.command == "propose":
+                matched, proposed = propose_item_updates(cursor, lst_directory, index)
+                connection.commit()
+                print(f"Matched {matched} items; {proposed} proposed changes are pending review in "
+                      f"item_lst_review.")
+            else:
+                update_item_data(cursor, connection, lst_directory, index)
+
+            if index:
+                index.close()
 
         print("\nData update process completed.")
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
     except psycopg2.Error as e:
         print(f"Unable to connect to the database: {e}")
     finally:
@@ -0,0 +1,333 @@
+"""
+End-to-end ingestion benchmark against a local Postgres.
+
+Runs the item ingest, dedup and spell ingest over an LST tree (typically one
+written by lstcorpus.py) with the same options as the real scripts and
+reports wall time per phase, lines/sec, rows/sec and peak RSS. It works on a
+dedicated benchmark database: the tables are created if missing and emptied
+before each run unless --keep is given (which measures a re-ingest instead).
+
+    python lstcorpus.py /tmp/lstbench --lines 1000000
+    python lstbench.py /tmp/lstbench --bulk --workers 4
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import contextlib
+import tempfile
+import psycopg2
+
+import lstreaderandinput as items
+import lstspellsgrab as spells
+from lstcopy import DEFAULT_BUFFER_SIZE
+from lstcorpus import generate_corpus
+from lstpipeline import DEFAULT_QUEUE_SIZE
+from lstrowsync import RowSync
+from lststats import RunStats
+
+BENCH_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS itemtesting (
+        id SERIAL PRIMARY KEY,
+        name VARCHAR(255),
+        type VARCHAR(31),
+        ogtype VARCHAR(255),
+        subtype VARCHAR(31),
+        ogsubtype VARCHAR(255),
+        value NUMERIC,
+        weight DOUBLE PRECISION,
+        casterlevel INTEGER,
+        lstsource VARCHAR(1023)
+    );
+    CREATE TABLE IF NOT EXISTS spells (
+        id SERIAL PRIMARY KEY,
+        name VARCHAR(255),
+        type VARCHAR(255),
+        school VARCHAR(255),
+        subschool VARCHAR(255),
+        class VARCHAR[] DEFAULT ARRAY[]::VARCHAR[],
+        domain VARCHAR(255),
+        spelllevel INTEGER,
+        item VARCHAR[] DEFAULT ARRAY[]::VARCHAR[],
+        source VARCHAR(255),
+        content_hash CHAR(32)
+    );
+    CREATE INDEX IF NOT EXISTS idx_spells_source_name ON spells(source, name);
+    CREATE TABLE IF NOT EXISTS spell_class_level (
+        spell_id INTEGER NOT NULL REFERENCES spells(id) ON DELETE CASCADE,
+        class VARCHAR(63) NOT NULL,
+        level SMALLINT NOT NULL,
+        PRIMARY KEY (spell_id, class)
+    );
+    CREATE INDEX IF NOT EXISTS idx_spell_class_level_class_level ON spell_class_level(class, level, spell_id);
+"""
+
+# Never empty the application database by accident
+PROTECTED_DATABASES = {'loot_tracking'}
+
+
+class PhaseTimer:
+    def __init__(self):
+        self.phases = {}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    @property
+    def total(self):
+        return sum(self.phases.values())
+
+
+def count_lines(file_paths):
+    lines = 0
+    for file_path in file_paths:
+        with open(file_path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                lines += block.count(b'\n')
+    return lines
+
+
+def quiet(verbose):
+    # The ingesters print a summary per file; keep it out of the timings' way
+    if verbose:
+        return contextlib.nullcontext()
+    return contextlib.redirect_stdout(open(os.devnull, 'w'))
+
+
+def peak_rss_mib():
+    # ru_maxrss is in KiB on Linux; parse workers are children of this process
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return own / 1024, children / 1024
+
+
+def parse_item_files(args, file_paths):
+    if args.resolve:
+        return items.parse_resolved_lst_files(file_paths, file_paths, args.workers)
+    if args.workers > 1:
+        return items.parse_lst_files_parallel(file_paths, args.workers)
+    if args.serial:
+        return ((file_path, items.parse_lst_file(file_path)) for file_path in file_paths)
+    return None
+
+
+def count_rows(batches, report):
+    for batch in batches:
+        report['item_rows'] += batch.row_count
+        yield batch
+
+
+def run_serial_items(timer, cursor, args, item_files, loader, sync):
+    # Parsing happens inside the iterator, so the time spent waiting for the
+    # next file's results is parse time and the rest is write time
+    item_rows = 0
+    results = iter(parse_item_files(args, item_files))
+    while True:
+        with timer.phase('item_parse'):
+            result = next(results, None)
+        if result is None:
+            break
+        file_path, (parsed, _, _) = result
+        item_rows += len(parsed)
+        with timer.phase('item_write'):
+            if sync:
+                sync.add_file(file_path, parsed)
+            else:
+                items.write_items(cursor, parsed, loader)
+    return item_rows
+
+
+def run_benchmark(cursor, args, lst_directory):
+    timer = PhaseTimer()
+    report = {}
+    # Items and spells share stage names (read, write), so each gets its own stats
+    stats = {'items': RunStats('lstbench items')}
+
+    with timer.phase('walk'):
+        item_files = list(items.find_lst_files(lst_directory))
+        spell_files = list(spells.find_lst_files(lst_directory))
+    report['item_lines'] = count_lines(item_files)
+    report['spell_lines'] = count_lines(spell_files)
+
+    sync = RowSync(cursor, 'itemtesting', items.ITEM_COLUMNS, 'lstsource', args.buffer_size) if args.sync else None
+    loader = items.create_item_loader(cursor, args.buffer_size) if args.bulk and not sync else None
+
+    if args.serial:
+        report['item_rows'] = run_serial_items(timer, cursor, args, item_files, loader, sync)
+        write_phase = 'item_write'
+    else:
+        # Parse and write overlap, so the pipeline is timed as one phase
+        report['item_rows'] = 0
+        write_phase = 'items'
+        with timer.phase('items'), quiet(args.verbose):
+            pipeline = items.build_item_pipeline(item_files, parse_item_files(args, item_files),
+                                                 args.buffer_size if loader else None, args.queue_size,
+                                                 stats['items'])
+            items.write_item_batches(cursor, count_rows(pipeline.run(), report), loader, sync, stats['items'])
+            stats['items'].add_pipeline(pipeline, consumer='write')
+    with timer.phase(write_phase):
+        if loader:
+            loader.flush()
+        if sync:
+            sync.apply()
+
+    if not args.skip_dedup:
+        with timer.phase('dedup'), quiet(args.verbose):
+            # Unresolved conflicts go to a throwaway decisions file instead of a prompt
+            report['dedup_removed'] = items.deduplicate_items(cursor, os.devnull, stats=stats['items'],
+                                                              changed_names=sync.changed_names if sync else None)
+
+    stats['items'].stop()
+
+    if not args.skip_spells:
+        with timer.phase('spells'), quiet(args.verbose):
+            spell_loader = spells.SpellLoader(cursor, args.batch_size, args.buffer_size)
+            if args.serial:
+                report['spell_rows'] = sum(spells.process_lst_file(file_path, spell_loader)
+                                           for file_path in spell_files)
+            else:
+                stats['spells'] = RunStats('lstbench spells')
+                pipeline = spells.build_spell_pipeline(spell_files, args.queue_size, stats['spells'])
+                report['spell_rows'] = sum(spells.load_spells(file_path, parsed, spell_loader, stats['spells'])
+                                           for file_path, parsed in pipeline.run())
+                stats['spells'].add_pipeline(pipeline, consumer='write')
+            spell_loader.finish()
+        if 'spells' in stats:
+            stats['spells'].stop()
+
+    return timer, report, stats
+
+
+def rate(count, seconds):
+    return f"{count / seconds:,.0f}/s" if seconds else "n/a"
+
+
+def print_report(timer, report):
+    phases = timer.phases
+    print("\nBenchmark Summary:")
+    for name, seconds in phases.items():
+        print(f"  {name:<12} {seconds:9.3f} s")
+    print(f"  {'total':<12} {timer.total:9.3f} s")
+
+    item_seconds = phases.get('items', 0) + phases.get('item_parse', 0) + phases.get('item_write', 0)
+    if 'items' in phases:
+        print(f"Item lines: {report['item_lines']:,} ({rate(report['item_lines'], item_seconds)} end to end)")
+        print(f"Item rows: {report['item_rows']:,} ({rate(report['item_rows'], item_seconds)} end to end)")
+    else:
+        print(f"Item lines: {report['item_lines']:,} "
+              f"({rate(report['item_lines'], phases.get('item_parse'))} parsed)")
+        print(f"Item rows: {report['item_rows']:,} ({rate(report['item_rows'], phases.get('item_write'))} written, "
+              f"{rate(report['item_rows'], item_seconds)} end to end)")
+    if 'dedup_removed' in report:
+        print(f"Dedup removed: {report['dedup_removed']:,} rows")
+    if 'spell_rows' in report:
+        print(f"Spell lines: {report['spell_lines']:,} ({rate(report['spell_lines'], phases.get('spells'))})")
+        print(f"Spell rows: {report['spell_rows']:,} ({rate(report['spell_rows'], phases.get('spells'))})")
+    total_lines = report['item_lines'] + report['spell_lines']
+    print(f"Overall: {rate(total_lines, timer.total)} lines, "
+          f"{rate(report['item_rows'] + report.get('spell_rows', 0), timer.total)} rows")
+    own, children = peak_rss_mib()
+    print(f"Peak RSS: {own:,.1f} MiB (parse workers: {children:,.1f} MiB)")
+
+
+def write_json_report(report_path, timer, report, stats):
+    run = {
+        'phases': {name: round(seconds, 3) for name, seconds in timer.phases.items()},
+        'totals': report,
+        'peak_rss_mib': round(peak_rss_mib()[0], 1),
+    }
+    for name, run_stats in stats.items():
+        if run_stats.stages:
+            run[name] = run_stats.report()
+    with open(report_path, 'w', encoding='utf-8') as file:
+        json.dump(run, file, indent=2)
+        file.write('\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark LST ingestion and dedup against a local Postgres")
+    parser.add_argument("lst_directory", nargs="?", help="LST tree to ingest (see lstcorpus.py)")
+    parser.add_argument("--generate", type=int, metavar="LINES",
+                        help="Write a synthetic tree of about LINES lines first (into lst_directory, "
+                             "or a temporary directory that is removed afterwards)")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for --generate")
+    parser.add_argument("--bulk", action="store_true", help="Stream items with COPY (as lstreaderandinput --bulk)")
+    parser.add_argument("--buffer-size", type=int, default=DEFAULT_BUFFER_SIZE,
+                        help="Bytes of COPY data to buffer before each flush")
+    parser.add_argument("--workers", type=int, default=1, help="Processes used to parse item files")
+    parser.add_argument("--resolve", action="store_true", help="Resolve .COPY/.MOD/.FORGET across the tree")
+    parser.add_argument("--sync", action="store_true", help="Write items through the row-level sync")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="Files (or COPY batches) each pipeline stage may run ahead of the next")
+    parser.add_argument("--serial", action="store_true",
+                        help="Parse and write one file after another instead of through the staged pipeline, "
+                             "timing parse and write separately")
+    parser.add_argument("--batch-size", type=int, default=spells.DEFAULT_BATCH_SIZE,
+                        help="Spells staged per upsert batch")
+    parser.add_argument("--skip-dedup", action="store_true", help="Do not run deduplication")
+    parser.add_argument("--skip-spells", action="store_true", help="Do not ingest spells")
+    parser.add_argument("--keep", action="store_true",
+                        help="Keep the rows of the previous run (measures a re-ingest, e.g. with --sync)")
+    parser.add_argument("--verbose", action="store_true", help="Show the ingesters' own output")
+    parser.add_argument("--report", help="Also write the phases and the per-stage reports as JSON to this path")
+    parser.add_argument("--dbname", default=os.getenv('BENCH_DB_NAME', 'loot_bench'),
+                        help="Benchmark database (emptied before each run)")
+    parser.add_argument("--host", default=os.getenv('DB_HOST', 'localhost'))
+    parser.add_argument("--port", type=int, default=int(os.getenv('DB_PORT', '5432')))
+    parser.add_argument("--user", default=os.getenv('DB_USER', 'loot_user'))
+    args = parser.parse_args()
+
+    if not args.lst_directory and not args.generate:
+        parser.error("give an LST directory or --generate LINES")
+    if args.dbname in PROTECTED_DATABASES:
+        print(f"Error: refusing to benchmark against {args.dbname}; use a dedicated database")
+        sys.exit(1)
+
+    lst_directory = args.lst_directory
+    temporary = None
+    if args.generate:
+        if not lst_directory:
+            temporary = tempfile.TemporaryDirectory(prefix='lstbench-')
+            lst_directory = temporary.name
+        start = time.perf_counter()
+        stats = generate_corpus(lst_directory, args.generate, seed=args.seed)
+        print(f"Generated {stats.lines:,} lines in {stats.files} files "
+              f"({time.perf_counter() - start:.1f} s)")
+
+    connection = None
+    try:
+        connection = psycopg2.connect(dbname=args.dbname, host=args.host, port=args.port, user=args.user,
+                                      password=os.getenv('DB_PASSWORD'))
+        cursor = connection.cursor()
+        cursor.execute(BENCH_SCHEMA)
+        if not args.keep:
+            cursor.execute("TRUNCATE itemtesting, spells RESTART IDENTITY CASCADE")
+            cursor.execute("DROP TABLE IF EXISTS itemtesting_removed")
+        connection.commit()
+
+        timer, report, stats = run_benchmark(cursor, args, lst_directory)
+        connection.commit()
+        print_report(timer, report)
+        if args.report:
+            write_json_report(args.report, timer, report, stats)
+            print(f"Wrote run report to {args.report}")
+    except (psycopg2.Error, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    finally:
+        if connection:
+            connection.close()
+        if temporary:
+            temporary.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Buffered COPY ... FROM STDIN loader shared by the LST ingestion scripts.
+
+Rows are serialized into PostgreSQL's text COPY format in memory and streamed
+to the server whenever the buffer grows past buffer_size, so a full PCGen tree
+is loaded in a handful of round trips instead of one INSERT per line.
+"""
+
+import io
+from psycopg2 import sql
+
+DEFAULT_BUFFER_SIZE = 8 * 1024 * 1024  # 8 MiB of COPY text per round trip
+# copy_expert reads its source in chunks of this size and takes the GIL back for
+# each one; psycopg2's 8 KiB default stalls on every chunk while other threads parse
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def escape_copy_text(text):
+    return (text.replace('\\', '\\\\')
+            .replace('\t', '\\t')
+            .replace('\n', '\\n')
+            .replace('\r', '\\r'))
+
+
+def format_array_element(value):
+    if value is None:
+        return 'NULL'
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def format_array_literal(values):
+    # Elements are always quoted, so commas, braces and spaces inside them are safe
+    return '{' + ','.join(format_array_element(value) for value in values) + '}'
+
+
+def format_copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, (list, tuple)):
+        return escape_copy_text(format_array_literal(value))
+    return escape_copy_text(str(value))
+
+
+def format_copy_row(row):
+    return '\t'.join(format_copy_value(value) for value in row) + '\n'
+
+
+class CopyLoader:
+    """Accumulates rows for one table and flushes them with COPY FROM STDIN."""
+
+    def __init__(self, cursor, table, columns, buffer_size=DEFAULT_BUFFER_SIZE):
+        self.cursor = cursor
+        self.table = table
+        self.columns = list(columns)
+        self.buffer_size = buffer_size
+        self.rows_written = 0
+        self.flushes = 0
+        self._buffer = io.StringIO()
+        self._buffered_rows = 0
+        self._buffered_size = 0
+        self._copy_query = sql.SQL("COPY {} ({}) FROM STDIN").format(
+            sql.Identifier(table),
+            sql.SQL(', ').join(sql.Identifier(column) for column in self.columns)
+        ).as_string(cursor)
+
+    def add(self, row):
+        line = format_copy_row(row)
+        self._buffer.write(line)
+        self._buffered_rows += 1
+        self._buffered_size += len(line)
+        if self._buffered_size >= self.buffer_size:
+            self.flush()
+
+    def add_many(self, rows):
+        for row in rows:
+            self.add(row)
+
+    def write_formatted(self, text, rows):
+        """Stream COPY text already formatted elsewhere, e.g. by a pipeline stage."""
+        self.flush()
+        self.cursor.copy_expert(self._copy_query, io.StringIO(text), size=COPY_CHUNK_SIZE)
+        self.rows_written += rows
+        self.flushes += 1
+
+    def flush(self):
+        if not self._buffered_rows:
+            return 0
+        self._buffer.seek(0)
+        self.cursor.copy_expert(self._copy_query, self._buffer, size=COPY_CHUNK_SIZE)
+        flushed = self._buffered_rows
+        self.rows_written += flushed
+        self.flushes += 1
+        self._buffer = io.StringIO()
+        self._buffered_rows = 0
+        self._buffered_size = 0
+        return flushed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+        return False
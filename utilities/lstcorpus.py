@@ -0,0 +1,229 @@
+"""
+Synthetic PCGen LST corpus for benchmarking the ingesters.
+
+The real LST tree is not part of the repo, so this writes a deterministic
+stand-in with the same shape: books spread over the publisher directories
+get_source_priority knows about, each with a .pcc file, an equipment file, a
+weapon proficiency file and a spell file. Equipment lines mix TYPE/COST/WT,
+SPROP caster levels, weapon and armor tags, .COPY= and .MOD lines, comments
+and header lines; a share of item and spell names is drawn from a pool shared
+by all books so dedup has real conflict groups to resolve.
+
+    python lstcorpus.py /tmp/lstbench --lines 1000000 --books 40
+"""
+
+import os
+import argparse
+import random
+from collections import namedtuple
+
+BOOK_KINDS = (
+    ('roleplaying_game', 'Core Rulebook'),
+    ('adventure_path', 'Adventure Path'),
+    ('campaign_setting', 'Campaign Setting'),
+    ('player_companion', 'Player Companion'),
+    ('modules', 'Module'),
+)
+
+ADJECTIVES = ('Adamantine', 'Blessed', 'Burning', 'Cold Iron', 'Darkwood', 'Elven', 'Frost', 'Gnomish',
+              'Holy', 'Ironwood', 'Mithral', 'Orcish', 'Runed', 'Shadow', 'Silver', 'Thundering')
+WEAPONS = ('Longsword', 'Dagger', 'Greataxe', 'Rapier', 'Longbow', 'Warhammer', 'Halberd', 'Scimitar',
+           'Crossbow', 'Spear', 'Flail', 'Kukri')
+ARMORS = ('Chain Shirt', 'Breastplate', 'Full Plate', 'Leather Armor', 'Heavy Steel Shield', 'Buckler')
+WONDROUS = ('Cloak', 'Ring', 'Amulet', 'Belt', 'Boots', 'Circlet', 'Gloves', 'Robe', 'Wand', 'Staff')
+GEAR = ('Rope', 'Lantern', 'Backpack', 'Bedroll', 'Caltrops', 'Chalk', 'Grappling Hook', 'Tent')
+POWERS = ('Resistance', 'Protection', 'Striding', 'Warding', 'the Magi', 'Flame', 'Shielding', 'Speed')
+AMMUNITION = ('Arrows', 'Bolts', 'Bullets', 'Darts')
+
+WEAPON_TYPES = ('Weapon.Melee.Martial.Standard.Slashing.Blade', 'Weapon.Melee.Simple.Standard.Piercing',
+                'Weapon.Melee.Martial.TwoHanded.Slashing', 'Weapon.Ranged.Martial.Standard.Piercing',
+                'Weapon.Ranged.Simple.Crossbow', 'Weapon.Melee.Exotic.Light.Slashing')
+ARMOR_TYPES = ('Armor.Light.Standard', 'Armor.Medium.Standard', 'Armor.Heavy.Standard', 'Shield.Heavy')
+MAGIC_TYPES = ('Magic.Wondrous', 'Magic.Ring', 'Magic.Potion', 'Magic.Wand', 'Magic.Staff', 'Magic.Scroll')
+
+SCHOOLS = ('Abjuration', 'Conjuration', 'Divination', 'Enchantment', 'Evocation', 'Illusion',
+           'Necromancy', 'Transmutation')
+SUBSCHOOLS = ('Healing', 'Summoning', 'Charm', 'Compulsion', 'Figment', 'Polymorph')
+CLASSES = ('Wizard', 'Sorcerer', 'Cleric', 'Druid', 'Bard', 'Ranger', 'Paladin', 'Witch', 'Magus',
+           'Inquisitor', 'Oracle', 'Alchemist')
+DOMAINS = ('Fire', 'Water', 'Death', 'Healing', 'Knowledge', 'Travel', 'War', 'Trickery')
+SPELL_WORDS = ('Fire', 'Ice', 'Shadow', 'Mind', 'Stone', 'Storm', 'Soul', 'Blood', 'Light', 'Void')
+SPELL_FORMS = ('Bolt', 'Ward', 'Ray', 'Shield', 'Touch', 'Burst', 'Chains', 'Sight', 'Step', 'Wall')
+
+ITEM_KINDS = ('weapon', 'armor', 'magic', 'magic', 'magic', 'ammunition', 'gear')
+
+CorpusStats = namedtuple('CorpusStats', ['books', 'files', 'lines', 'item_lines', 'spell_lines'])
+
+
+class NamePool:
+    """Per-book unique names plus a shared pool, so some names collide across books."""
+
+    def __init__(self, rng, collision_rate):
+        self.rng = rng
+        self.collision_rate = collision_rate
+        self.shared_items = [self._item_name() for _ in range(2000)]
+        self.shared_spells = [self._spell_name() for _ in range(1000)]
+        self.counter = 0
+
+    def _item_name(self):
+        rng = self.rng
+        kind = rng.choice(ITEM_KINDS)
+        if kind == 'weapon':
+            return kind, f"{rng.choice(ADJECTIVES)} {rng.choice(WEAPONS)}"
+        if kind == 'armor':
+            return kind, f"{rng.choice(ADJECTIVES)} {rng.choice(ARMORS)}"
+        if kind == 'magic':
+            return kind, f"{rng.choice(WONDROUS)} of {rng.choice(POWERS)} +{rng.randint(1, 5)}"
+        if kind == 'ammunition':
+            return kind, f"{rng.choice(AMMUNITION)} ({rng.choice((10, 20, 50))})"
+        return kind, f"{rng.choice(GEAR)} ({rng.choice(ADJECTIVES)})"
+
+    def _spell_name(self):
+        return f"{self.rng.choice(SPELL_WORDS)} {self.rng.choice(SPELL_FORMS)}"
+
+    def item(self):
+        """(kind, name) of the next item."""
+        if self.rng.random() < self.collision_rate:
+            return self.rng.choice(self.shared_items)
+        self.counter += 1
+        kind, name = self._item_name()
+        return kind, f"{name} {self.counter}"
+
+    def spell(self):
+        if self.rng.random() < self.collision_rate:
+            return self.rng.choice(self.shared_spells)
+        self.counter += 1
+        return f"{self._spell_name()} {self.counter}"
+
+
+def item_line(rng, kind, name):
+    if kind == 'weapon':
+        fields = [f"TYPE:{rng.choice(WEAPON_TYPES)}", f"PROFICIENCY:WEAPON|{rng.choice(WEAPONS)}",
+                  f"COST:{rng.randint(1, 400)}", f"WT:{rng.randint(1, 20)}",
+                  f"DAMAGE:1d{rng.choice((4, 6, 8, 10, 12))}", f"CRITMULT:x{rng.choice((2, 3, 4))}"]
+    elif kind == 'armor':
+        fields = [f"TYPE:{rng.choice(ARMOR_TYPES)}", f"COST:{rng.randint(5, 1500)}",
+                  f"WT:{rng.randint(5, 50)}", f"ACCHECK:-{rng.randint(0, 6)}",
+                  f"MAXDEX:{rng.randint(1, 6)}", f"SPELLFAILURE:{rng.choice((5, 10, 15, 20, 25, 35))}"]
+    elif kind == 'magic':
+        caster_level = rng.randint(1, 20)
+        sprop = rng.choice((f"SPROP:Aura {rng.choice(SCHOOLS).lower()}|CL{caster_level}",
+                            f"SPROP:CL={caster_level}", f"DESC:Crafted at caster level {caster_level}. CL {caster_level}"))
+        fields = [f"TYPE:{rng.choice(MAGIC_TYPES)}", f"COST:{rng.randint(50, 200000)}",
+                  f"WT:{rng.choice(('0', '1', '2', '0.5'))}", sprop]
+    elif kind == 'ammunition':
+        fields = ["TYPE:Weapon.Ammunition.Ranged", f"COST:{rng.randint(1, 20)}", f"WT:{rng.randint(0, 5)}"]
+    else:
+        fields = ["TYPE:Goods.General", f"COST:{rng.randint(1, 50)}", f"WT:{rng.randint(0, 10)}"]
+    if rng.random() < 0.2:
+        fields.append(f"OUTPUTNAME:{name} (display)")
+    return '\t'.join([name] + fields)
+
+
+def spell_line(rng, name):
+    groups = []
+    for level in sorted(rng.sample(range(0, 10), rng.randint(1, 3))):
+        groups.append(f"{','.join(rng.sample(CLASSES, rng.randint(1, 3)))}={level}")
+    fields = [name, f"TYPE:{rng.choice(('Arcane', 'Divine', 'Arcane.Divine'))}",
+              f"SCHOOL:{rng.choice(SCHOOLS)}", f"CLASSES:{'|'.join(groups)}"]
+    if rng.random() < 0.3:
+        fields.append(f"SUBSCHOOL:{rng.choice(SUBSCHOOLS)}")
+    if rng.random() < 0.3:
+        fields.append(f"DOMAINS:{rng.choice(DOMAINS)}={rng.randint(1, 9)}")
+    if rng.random() < 0.2:
+        fields.append(f"CASTERLEVEL:{rng.randint(1, 20)}")
+    if rng.random() < 0.1:
+        fields.append(f"ITEM:{rng.choice(('Potion', 'Scroll', 'Wand'))}")
+    fields += ["CASTTIME:1 standard action", "RANGE:Close", "DURATION:1 round/level", "SAVEINFO:None",
+               "SPELLRES:Yes"]
+    return '\t'.join(fields)
+
+
+def write_equipment_file(file, rng, names, line_count):
+    defined = []
+    for _ in range(line_count):
+        roll = rng.random()
+        if roll < 0.03:
+            file.write(f"# {rng.choice(GEAR)} section\n")
+        elif roll < 0.15 and defined:
+            file.write(f"{rng.choice(defined)}.COPY={names.item()[1]}\tCOST:{rng.randint(300, 50000)}\n")
+        elif roll < 0.2 and defined:
+            file.write(f"{rng.choice(defined)}.MOD\tCOST:{rng.randint(1, 500)}\n")
+        else:
+            kind, name = names.item()
+            defined.append(name)
+            file.write(item_line(rng, kind, name) + '\n')
+
+
+def write_profs_file(file, rng, names, line_count):
+    for _ in range(line_count):
+        weapon = rng.choice(WEAPONS)
+        file.write(f"{rng.choice(ADJECTIVES)} {weapon}\tTYPE:{rng.choice(('Simple', 'Martial', 'Exotic'))}\t"
+                   f"HANDS:{rng.choice((1, 2))}\n")
+
+
+def write_spell_file(file, rng, names, line_count):
+    defined = []
+    for _ in range(line_count):
+        if rng.random() < 0.05 and defined:
+            file.write(f"{rng.choice(defined)}.MOD\tCASTERLEVEL:{rng.randint(1, 20)}\n")
+        else:
+            name = names.spell()
+            defined.append(name)
+            file.write(spell_line(rng, name) + '\n')
+
+
+def generate_corpus(output_directory, lines, books=20, spell_share=0.35, collision_rate=0.2, seed=1):
+    rng = random.Random(seed)
+    names = NamePool(rng, collision_rate)
+    per_book = max(1, lines // books)
+    files = 0
+    item_lines = 0
+    spell_lines = 0
+
+    for book in range(books):
+        kind, booktype = BOOK_KINDS[book % len(BOOK_KINDS)]
+        slug = f"book{book:03d}"
+        book_directory = os.path.join(output_directory, 'pathfinder', 'paizo', kind, slug)
+        os.makedirs(book_directory, exist_ok=True)
+
+        spell_count = int(per_book * spell_share)
+        profs_count = per_book // 20
+        equip_count = per_book - spell_count - profs_count
+        header = f"SOURCELONG:Synthetic Book {book}\tSOURCESHORT:SB{book}\tSOURCEDATE:2024-01\n"
+
+        with open(os.path.join(book_directory, f"{slug}.pcc"), 'w', encoding='utf-8') as file:
+            file.write(f"CAMPAIGN:Synthetic Book {book}\nBOOKTYPE:{booktype}\nRANK:{book % 9 + 1}\n"
+                       f"EQUIPMENT:{slug}_equip.lst\nWEAPONPROF:{slug}_profs_weapon.lst\nSPELL:{slug}_spells.lst\n")
+        for suffix, writer, count in (('equip', write_equipment_file, equip_count),
+                                      ('profs_weapon', write_profs_file, profs_count),
+                                      ('spells', write_spell_file, spell_count)):
+            with open(os.path.join(book_directory, f"{slug}_{suffix}.lst"), 'w', encoding='utf-8') as file:
+                file.write(header)
+                writer(file, rng, names, count)
+            files += 1
+
+        item_lines += equip_count + profs_count
+        spell_lines += spell_count
+
+    return CorpusStats(books, files, item_lines + spell_lines + files, item_lines, spell_lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic PCGen LST tree for benchmarking")
+    parser.add_argument("output", help="Directory to write the tree into")
+    parser.add_argument("--lines", type=int, default=100000, help="Approximate number of LST lines to write")
+    parser.add_argument("--books", type=int, default=20, help="Number of source books (one .pcc each)")
+    parser.add_argument("--spell-share", type=float, default=0.35, help="Share of lines written to spell files")
+    parser.add_argument("--collision-rate", type=float, default=0.2,
+                        help="Share of names drawn from a pool shared by all books")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed; the same seed writes the same tree")
+    args = parser.parse_args()
+
+    stats = generate_corpus(args.output, args.lines, args.books, args.spell_share, args.collision_rate, args.seed)
+    print(f"Wrote {stats.files} LST files for {stats.books} books to {args.output}: "
+          f"{stats.lines} lines ({stats.item_lines} item, {stats.spell_lines} spell)")
+
+
+if __name__ == "__main__":
+    main()
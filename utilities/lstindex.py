@@ -0,0 +1,151 @@
+"""
+Persistent on-disk name index over the PCGen LST tree for itemsearch.
+
+The index maps case-folded item names to every parsed (name, COST, WT, CL,
+source file) match in the tree. It is stored as an open-addressing hash table
+that is read through mmap, so a lookup touches a couple of pages instead of
+rescanning every LST file. The file carries a fingerprint of the tree
+(relative path, size and mtime of every relevant file) and is rebuilt only
+when that fingerprint changes.
+
+File layout (little endian):
+    header  MAGIC(8) fingerprint(32) slot_count(u32) entry_count(u32)
+    slots   slot_count x (key_hash u64, offset u64, length u32, pad u32)
+    data    JSON entries {"key": ..., "matches": [...]} referenced by the slots
+"""
+
+import os
+import json
+import mmap
+import struct
+import hashlib
+
+from lstmmap import iter_candidate_lines
+from lstwalk import find_lst_files
+
+MAGIC = b'LSTIDX1\0'
+HEADER = struct.Struct('<8s32sII')
+SLOT = struct.Struct('<QQII')
+DEFAULT_INDEX_PATH = 'lst_name_index.bin'
+
+
+def normalize_key(name):
+    return name.strip().casefold()
+
+
+def key_hash(key):
+    # Stable across processes (unlike hash()); 0 is reserved for empty slots
+    value = int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+    return value or 1
+
+
+def tree_fingerprint(file_paths, lst_directory):
+    digest = hashlib.sha256()
+    for file_path in sorted(file_paths):
+        stat = os.stat(file_path)
+        relative_path = os.path.relpath(file_path, lst_directory)
+        digest.update(f"{relative_path}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode('utf-8'))
+    return digest.digest()
+
+
+def collect_entries(file_paths, extract_entry):
+    entries = {}
+    for file_path in file_paths:
+        add_file_entries(entries, file_path, iter_candidate_lines(file_path), extract_entry)
+    return entries
+
+
+def add_file_entries(entries, file_path, lines, extract_entry):
+    source_file = os.path.basename(file_path)
+    for line in lines:
+        lst_item_name, value, weight, caster_level = extract_entry(line)
+        if value or weight or caster_level:
+            entries.setdefault(normalize_key(lst_item_name), []).append(
+                (lst_item_name, value, weight, caster_level, source_file))
+
+
+def write_index(index_path, fingerprint, entries):
+    slot_count = 1
+    while slot_count < max(len(entries) * 2, 8):
+        slot_count *= 2
+
+    slots = [(0, 0, 0)] * slot_count
+    data = bytearray()
+    data_start = HEADER.size + SLOT.size * slot_count
+
+    for key, matches in entries.items():
+        payload = json.dumps({'key': key, 'matches': matches}, separators=(',', ':')).encode('utf-8')
+        hashed = key_hash(key)
+        slot = hashed & (slot_count - 1)
+        while slots[slot][0]:
+            slot = (slot + 1) & (slot_count - 1)
+        slots[slot] = (hashed, data_start + len(data), len(payload))
+        data += payload
+
+    temp_path = index_path + '.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, fingerprint, slot_count, len(entries)))
+        for hashed, offset, length in slots:
+            file.write(SLOT.pack(hashed, offset, length, 0))
+        file.write(data)
+    os.replace(temp_path, index_path)
+
+
+class LstNameIndex:
+    """Read-only view of an index file; lookups are O(1) hash probes into the mmap."""
+
+    def __init__(self, index_path):
+        self._file = open(index_path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.fingerprint, self.slot_count, self.entry_count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{index_path} is not an LST name index")
+
+    @classmethod
+    def open_or_build(cls, lst_directory, relevant_file, extract_entry, index_path=DEFAULT_INDEX_PATH, rebuild=False):
+        """extract_entry(line) -> (name, value, weight, caster_level), as itemsearch.extract_item_info."""
+        file_paths = list(find_lst_files(lst_directory, relevant_file))
+        fingerprint = tree_fingerprint(file_paths, lst_directory)
+
+        if not rebuild and os.path.exists(index_path):
+            try:
+                index = cls(index_path)
+                if index.fingerprint == fingerprint:
+                    return index
+                index.close()
+            except (ValueError, struct.error, OSError):
+                pass
+
+        print(f"Building LST name index from {len(file_paths)} files...")
+        entries = collect_entries(file_paths, extract_entry)
+        write_index(index_path, fingerprint, entries)
+        print(f"Indexed {len(entries)} item names into {index_path}")
+        return cls(index_path)
+
+    def lookup(self, name):
+        key = normalize_key(name)
+        hashed = key_hash(key)
+        mask = self.slot_count - 1
+        slot = hashed & mask
+        for _ in range(self.slot_count):
+            slot_hash, offset, length, _pad = SLOT.unpack_from(self._map, HEADER.size + SLOT.size * slot)
+            if not slot_hash:
+                return []
+            if slot_hash == hashed:
+                entry = json.loads(self._map[offset:offset + length])
+                if entry['key'] == key:
+                    return [tuple(match) for match in entry['matches']]
+            slot = (slot + 1) & mask
+        return []
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
@@ -0,0 +1,156 @@
+"""
+File manifest for incremental LST ingestion.
+
+The manifest records (path, size, mtime, content hash) for every LST file that
+has been ingested into a target table, in the same database and transaction as
+the rows themselves. On the next run only new or changed files are parsed.
+The manifest never deletes rows itself: changed files are re-synced row by row
+and deleted files are handed to the same loader as files without rows, so the
+loader's own rules (such as keeping spells a spellbook still references)
+decide what is removed.
+
+With .COPY/.MOD resolution a file's rows also depend on other files. The
+lst_dependency table keeps, per target, which files each file's resolved rows
+were built from, so a later run can re-emit the unchanged files that depended
+on a changed or deleted file even when the changed file no longer mentions
+them.
+"""
+
+import os
+import hashlib
+from collections import namedtuple
+
+FileState = namedtuple('FileState', ['path', 'size', 'mtime', 'content_hash'])
+ManifestChanges = namedtuple('ManifestChanges', ['changed', 'unchanged', 'deleted'])
+
+
+def ensure_manifest_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS lst_manifest (
+            target VARCHAR(63) NOT NULL,
+            path VARCHAR(1023) NOT NULL,
+            size BIGINT NOT NULL,
+            mtime DOUBLE PRECISION NOT NULL,
+            content_hash CHAR(64) NOT NULL,
+            ingested_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (target, path)
+        )
+    """)
+
+
+def ensure_dependency_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS lst_dependency (
+            target VARCHAR(63) NOT NULL,
+            path VARCHAR(1023) NOT NULL,
+            depends_on VARCHAR(1023) NOT NULL,
+            PRIMARY KEY (target, path, depends_on)
+        );
+        CREATE INDEX IF NOT EXISTS lst_dependency_depends_on_idx ON lst_dependency (target, depends_on);
+    """)
+
+
+def load_dependents(cursor, target, paths):
+    """Files whose rows were built from any of paths when they were last recorded."""
+    if not paths:
+        return set()
+    cursor.execute("""
+        SELECT DISTINCT path
+        FROM lst_dependency
+        WHERE target = %s AND depends_on = ANY(%s)
+    """, (target, list(paths)))
+    return {row[0] for row in cursor.fetchall()}
+
+
+def record_dependencies(cursor, target, dependencies, paths):
+    """Replace the recorded dependencies of paths with dependencies[path]."""
+    if not paths:
+        return
+    cursor.execute("DELETE FROM lst_dependency WHERE target = %s AND path = ANY(%s)", (target, list(paths)))
+    for path in paths:
+        for depends_on in sorted(dependencies.get(path, ())):
+            cursor.execute("""
+                INSERT INTO lst_dependency (target, path, depends_on)
+                VALUES (%s, %s, %s)
+            """, (target, path, depends_on))
+
+
+def load_manifest(cursor, target):
+    cursor.execute("""
+        SELECT path, size, mtime, content_hash
+        FROM lst_manifest
+        WHERE target = %s
+    """, (target,))
+    return {row[0]: FileState(*row) for row in cursor.fetchall()}
+
+
+def hash_file(file_path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def plan_changes(cursor, target, file_paths):
+    manifest = load_manifest(cursor, target)
+    changed = []
+    unchanged = []
+
+    for file_path in file_paths:
+        stat = os.stat(file_path)
+        previous = manifest.get(file_path)
+        # Same size and mtime: trust the manifest and skip hashing
+        if previous and previous.size == stat.st_size and previous.mtime == stat.st_mtime:
+            unchanged.append(file_path)
+            continue
+
+        state = FileState(file_path, stat.st_size, stat.st_mtime, hash_file(file_path))
+        if previous and previous.content_hash == state.content_hash:
+            # Touched but identical; refresh size/mtime so it is not rehashed next run
+            record_files(cursor, target, [state])
+            unchanged.append(file_path)
+        else:
+            changed.append(state)
+
+    seen = set(file_paths)
+    deleted = [path for path in manifest if path not in seen]
+    return ManifestChanges(changed, unchanged, deleted)
+
+
+def record_files(cursor, target, states):
+    for state in states:
+        cursor.execute("""
+            INSERT INTO lst_manifest (target, path, size, mtime, content_hash, ingested_at)
+            VALUES (%s, %s, %s, %s, %s, NOW())
+            ON CONFLICT (target, path) DO UPDATE
+            SET size = EXCLUDED.size,
+                mtime = EXCLUDED.mtime,
+                content_hash = EXCLUDED.content_hash,
+                ingested_at = EXCLUDED.ingested_at
+        """, (target, state.path, state.size, state.mtime, state.content_hash))
+
+
+def forget_files(cursor, target, paths):
+    if not paths:
+        return 0
+    cursor.execute(
+        "DELETE FROM lst_manifest WHERE target = %s AND path = ANY(%s)",
+        (target, list(paths))
+    )
+    return cursor.rowcount
+
+
+def prepare_incremental_run(cursor, target, file_paths):
+    """Return the manifest changes for file_paths; files gone from the tree are forgotten.
+
+    The caller syncs the changed files and passes every deleted file to its
+    loader with no rows, which removes that file's rows under the loader's rules.
+    """
+    ensure_manifest_table(cursor)
+    changes = plan_changes(cursor, target, file_paths)
+    forget_files(cursor, target, changes.deleted)
+
+    print(f"Manifest: {len(changes.changed)} new or changed, {len(changes.unchanged)} unchanged, "
+          f"{len(changes.deleted)} deleted files")
+    return changes
@@ -0,0 +1,99 @@
+"""
+Bytes-level LST reader for the LST scripts.
+
+Files are memory-mapped and split into lines as bytes. Blank lines, comment
+lines and lines without any of the requested byte needles are dropped before
+decoding, so only candidate lines ever become Python strings.
+"""
+
+import os
+import re
+import mmap
+from functools import lru_cache
+
+COMMENT = ord('#')
+
+
+@lru_cache(maxsize=None)
+def compile_needles(needles):
+    """One bytes alternation over the minimal needle set; needles is a frozenset of str."""
+    encoded = {needle.encode('utf-8') for needle in needles}
+    # A line containing 'ALTTYPE:' also contains 'TYPE:', so only the minimal needles are tested
+    minimal = sorted(needle for needle in encoded
+                     if not any(other != needle and other in needle for other in encoded))
+    return re.compile(b'|'.join(re.escape(needle) for needle in minimal))
+
+
+def open_mapped(file):
+    if os.fstat(file.fileno()).st_size == 0:
+        return None
+    return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def iter_candidate_lines(file_path, needles=None):
+    """Yield stripped, decoded lines that are not comments and contain any of needles."""
+    search = compile_needles(frozenset(needles)).search if needles else None
+    with open(file_path, 'rb') as file:
+        data = open_mapped(file)
+        if data is None:
+            return
+        with data:
+            for raw in iter_mapped_lines(data, search):
+                raw = raw.strip()
+                if raw and raw[0] != COMMENT:
+                    yield raw.decode('utf-8', errors='ignore')
+
+
+def iter_mapped_lines(data, search=None):
+    """Yield the lines of a mapped file as bytes, only those search() matches if given.
+
+    Lines are sliced straight out of the map, so the file is never copied as a
+    whole. With a search the needle scan jumps from match to match in C and
+    lines without a needle are never touched by Python code.
+    """
+    size = len(data)
+    pos = 0
+    while pos < size:
+        if search:
+            match = search(data, pos)
+            if match is None:
+                return
+            # rfind gives -1 when the match is on the line starting at pos
+            start = max(data.rfind(b'\n', pos, match.start()) + 1, pos)
+        else:
+            start = pos
+        stop = data.find(b'\n', start)
+        if stop == -1:
+            stop = size
+        yield data[start:stop]
+        pos = stop + 1
+
+
+def case_variants(char):
+    """Regex bytes matching char in any of its single-character case forms."""
+    if char.isascii():
+        return re.escape(char.encode('ascii'))
+    forms = sorted({form for form in (char, char.lower(), char.upper(), char.title()) if len(form) == 1})
+    return b'(?:' + b'|'.join(re.escape(form.encode('utf-8')) for form in forms) + b')'
+
+
+def find_lines_starting_with(file_path, name):
+    """Yield decoded lines whose first field is `name`, case-insensitively.
+
+    The search runs as one bytes regex over the whole mapped file; only the
+    matching lines are sliced out and decoded. Bytes patterns only fold ASCII
+    case, so every other character of name is spelled out in its lower, upper
+    and title case forms.
+    """
+    name_pattern = b''.join(case_variants(char) for char in name)
+    pattern = re.compile(rb'^' + name_pattern + rb'(?=\t|\r?$)', re.IGNORECASE | re.MULTILINE)
+    with open(file_path, 'rb') as file:
+        data = open_mapped(file)
+        if data is None:
+            return
+        with data:
+            for match in pattern.finditer(data):
+                stop = data.find(b'\n', match.start())
+                if stop == -1:
+                    stop = len(data)
+                yield data[match.start():stop].decode('utf-8', errors='ignore')
@@ -0,0 +1,164 @@
+"""
+PCGen .pcc source selection for the LST ingester.
+
+A .pcc file describes one source book: its CAMPAIGN name, BOOKTYPE and RANK,
+the .lst files it loads per object type (EQUIPMENT:, SPELL:, ...) and other
+.pcc files it pulls in (PCC:). A profile is a plain text file naming the
+sources a campaign uses, one CAMPAIGN name or .pcc file name per line. Only
+the .lst files referenced by those sources (and the sources they include) are
+parsed, and each file's dedup priority is looked up from its source's
+metadata instead of being guessed from its path.
+
+File references follow PCGen: "@/", "*/" and "&/" are relative to the data
+directory, anything else to the .pcc file's own directory. Per-file options
+such as "|(INCLUDE:...)" are ignored; the whole file is parsed.
+"""
+
+import os
+from collections import defaultdict, namedtuple
+
+from lstwalk import find_lst_files
+
+PccSource = namedtuple('PccSource', ['path', 'campaign', 'booktype', 'rank', 'files', 'includes'])
+
+ITEM_TAGS = ('EQUIPMENT', 'WEAPONPROF', 'ARMORPROF', 'SHIELDPROF')
+SPELL_TAGS = ('SPELL',)
+FILE_TAGS = ITEM_TAGS + SPELL_TAGS
+
+DATA_DIRECTORY_PREFIXES = ('@/', '*/', '&/')
+
+# Same order as the path-based get_source_priority: lower wins
+BOOKTYPE_PRIORITIES = (
+    ('core rulebook', 0),
+    ('roleplaying game', 0),
+    ('adventure path', 1),
+    ('campaign setting', 2),
+    ('player companion', 3),
+)
+DEFAULT_BOOKTYPE_PRIORITY = 4
+DEFAULT_RANK = 9
+
+
+def resolve_pcc_reference(reference, pcc_directory, data_directory):
+    for prefix in DATA_DIRECTORY_PREFIXES:
+        if reference.startswith(prefix):
+            return os.path.normpath(os.path.join(data_directory, reference[len(prefix):]))
+    return os.path.normpath(os.path.join(pcc_directory, reference))
+
+
+def parse_pcc_file(pcc_path, data_directory):
+    pcc_directory = os.path.dirname(pcc_path)
+    campaign = None
+    booktype = None
+    rank = DEFAULT_RANK
+    files = defaultdict(list)
+    includes = []
+
+    with open(pcc_path, 'r', encoding='utf-8', errors='replace') as file:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            for field in line.split('\t'):
+                tag, _, value = field.strip().partition(':')
+                if tag == 'CAMPAIGN':
+                    campaign = value.strip()
+                elif tag == 'BOOKTYPE':
+                    booktype = value.strip()
+                elif tag == 'RANK' and value.strip().isdigit():
+                    rank = int(value)
+                elif tag == 'PCC' or tag in FILE_TAGS:
+                    references = [part.strip() for part in value.split('|')
+                                  if part.strip() and not part.strip().startswith('(')]
+                    paths = [resolve_pcc_reference(reference, pcc_directory, data_directory)
+                             for reference in references]
+                    if tag == 'PCC':
+                        includes.extend(paths)
+                    else:
+                        files[tag].extend(paths)
+
+    return PccSource(os.path.normpath(pcc_path), campaign, booktype, rank, dict(files), includes)
+
+
+def load_pcc_sources(data_directory):
+    sources = {}
+    for root, _, files in os.walk(data_directory):
+        for file in files:
+            if file.lower().endswith('.pcc'):
+                source = parse_pcc_file(os.path.join(root, file), data_directory)
+                sources[source.path] = source
+    return sources
+
+
+def read_profile(profile_path):
+    with open(profile_path, 'r', encoding='utf-8') as file:
+        return [line.strip() for line in file if line.strip() and not line.strip().startswith('#')]
+
+
+def booktype_priority(booktype):
+    # BOOKTYPE may list several types ("Supplement|Campaign Setting"); the best one counts
+    best = DEFAULT_BOOKTYPE_PRIORITY
+    for part in (booktype or '').lower().split('|'):
+        for name, priority in BOOKTYPE_PRIORITIES:
+            if name in part:
+                best = min(best, priority)
+    return best
+
+
+def select_sources(sources, names):
+    """The sources named in a profile plus every source they include, in load order."""
+    lookup = {}
+    for source in sources.values():
+        file_name = os.path.basename(source.path).lower()
+        lookup[file_name] = source
+        lookup[file_name[:-len('.pcc')]] = source
+        if source.campaign:
+            lookup[source.campaign.lower()] = source
+
+    unknown = [name for name in names if name.lower() not in lookup]
+    if unknown:
+        raise ValueError(f"Unknown sources in profile: {', '.join(unknown)}")
+
+    selected = {}
+    pending = [lookup[name.lower()] for name in reversed(names)]
+    while pending:
+        source = pending.pop()
+        if source.path in selected:
+            continue
+        selected[source.path] = source
+        pending.extend(sources[path] for path in reversed(source.includes) if path in sources)
+    return list(selected.values())
+
+
+class SourceSelection:
+    """The .lst files enabled by a profile and the priority of each, from its source's metadata."""
+
+    def __init__(self, sources, fallback_priority):
+        self.sources = sources
+        self.fallback_priority = fallback_priority
+        self.files = defaultdict(set)
+        self.priorities = {}
+        for source in sources:
+            priority = (booktype_priority(source.booktype), source.rank)
+            for tag, paths in source.files.items():
+                for path in paths:
+                    self.files[tag].add(path)
+                    self.priorities[path] = min(priority, self.priorities.get(path, priority))
+
+    def lst_files(self, lst_directory, tags):
+        """Walked paths of the enabled files, so lstsource values match a full-tree run."""
+        wanted = set().union(*(self.files[tag] for tag in tags))
+        return [file_path for file_path in find_lst_files(lst_directory)
+                if os.path.normpath(file_path) in wanted]
+
+    def source_priority(self, lstsource):
+        priority = self.priorities.get(os.path.normpath(lstsource))
+        if priority is None:
+            # Rows left over from sources outside the profile
+            return (self.fallback_priority(lstsource), DEFAULT_RANK)
+        return priority
+
+
+def load_source_selection(profile_path, data_directory, fallback_priority):
+    sources = load_pcc_sources(data_directory)
+    return SourceSelection(select_sources(sources, read_profile(profile_path)), fallback_priority)
@@ -0,0 +1,147 @@
+"""
+Staged ingestion pipeline connected by bounded queues.
+
+Each stage is a generator function that takes the previous stage's output
+iterator and yields its own items; it runs on its own thread, and the last
+stage's output is consumed on the calling thread, which keeps the database
+cursor. Because every queue is bounded, a slow stage makes the stages before
+it block instead of piling up work, so memory stays flat however large the
+tree is, while file reads, parsing and database round trips (which release
+the GIL) overlap.
+
+    pipeline = Pipeline('walk', file_paths)
+    pipeline.add_stage('read', read_files)
+    pipeline.add_stage('parse', parse_files)
+    for result in pipeline.run():
+        write(result)
+
+An exception in any stage stops every other stage and is re-raised from run().
+After a run, pipeline.timings holds how long each stage was blocked on its
+input and output queues, so a stage that mostly waits can be told apart
+from the one everything else waits for.
+"""
+
+import time
+import queue
+import threading
+
+DEFAULT_QUEUE_SIZE = 2
+
+_DONE = object()
+_POLL_SECONDS = 0.1
+
+
+class _Failure:
+    def __init__(self, exception):
+        self.exception = exception
+
+
+class _UpstreamFailure(Exception):
+    def __init__(self, failure):
+        super().__init__()
+        self.failure = failure
+
+
+class StageTiming:
+    """Items one stage produced and the seconds it ran and spent blocked on its queues."""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.seconds = 0.0
+        self.input_wait = 0.0
+        self.output_wait = 0.0
+
+    @property
+    def busy(self):
+        return max(self.seconds - self.input_wait - self.output_wait, 0.0)
+
+
+class Pipeline:
+    """A source iterable followed by stages, each on its own thread behind a bounded queue."""
+
+    def __init__(self, source_name, source, queue_size=DEFAULT_QUEUE_SIZE):
+        self.stages = [(source_name, lambda _: iter(source))]
+        self.queue_size = queue_size
+        self.timings = {}
+        # Seconds the consumer of run() spent waiting for the last stage
+        self.consumer_wait = 0.0
+        self._stop = threading.Event()
+
+    def add_stage(self, name, function):
+        """function(items) -> iterator of results; items is the previous stage's output."""
+        self.stages.append((name, function))
+        return self
+
+    def _put(self, target, item, timing):
+        start = time.perf_counter()
+        try:
+            while not self._stop.is_set():
+                try:
+                    target.put(item, timeout=_POLL_SECONDS)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        finally:
+            timing.output_wait += time.perf_counter() - start
+
+    def _get(self, source):
+        while not self._stop.is_set():
+            try:
+                return source.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _drain(self, source, timing=None):
+        while True:
+            start = time.perf_counter()
+            item = self._get(source)
+            if timing:
+                timing.input_wait += time.perf_counter() - start
+            else:
+                self.consumer_wait += time.perf_counter() - start
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise _UpstreamFailure(item)
+            yield item
+
+    def _run_stage(self, timing, function, source, target):
+        start = time.perf_counter()
+        try:
+            for item in function(self._drain(source, timing) if source is not None else None):
+                timing.items += 1
+                if not self._put(target, item, timing):
+                    return
+            self._put(target, _DONE, timing)
+        except _UpstreamFailure as upstream:
+            self._put(target, upstream.failure, timing)
+        except BaseException as exception:
+            self._put(target, _Failure(exception), timing)
+        finally:
+            timing.seconds = time.perf_counter() - start
+
+    def run(self):
+        """Start every stage and yield the last stage's results on the calling thread."""
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        threads = []
+        for position, (name, function) in enumerate(self.stages):
+            source = queues[position - 1] if position else None
+            timing = self.timings[name] = StageTiming(name)
+            thread = threading.Thread(target=self._run_stage, args=(timing, function, source, queues[position]),
+                                      name=f"pipeline-{name}", daemon=True)
+            threads.append(thread)
+            thread.start()
+
+        try:
+            for item in self._drain(queues[-1]):
+                yield item
+        except _UpstreamFailure as upstream:
+            raise upstream.failure.exception
+        finally:
+            # Also reached when the consumer stops early or fails: unblock and end every stage
+            self._stop.set()
+            for thread in threads:
+                thread.join()
@@ -0,0 +1,64 @@
+"""
+Promote the deduplicated itemtesting rows into the live item catalog.
+
+Rows are matched to existing global items (campaign_id IS NULL) on (name,
+type). Matched items whose value, subtype, weight or caster level differ are
+updated in place, so their ids and every loot.itemid pointing at them are
+kept; unmatched rows are inserted with fresh ids. Items that no longer appear
+in itemtesting are left alone, since loot may still reference them.
+
+item has no unique constraint on (name, type) - campaign-specific items share
+the table - so instead of ON CONFLICT the update and the insert run as
+data-modifying CTEs of one statement, which also reports what each did.
+"""
+
+from collections import namedtuple
+
+PromoteResult = namedtuple('PromoteResult', ['inserted', 'updated', 'unchanged'])
+
+
+def promote_items(cursor):
+    # Keep concurrent writers from inserting a (name, type) between the match
+    # and the insert; reads of item are not blocked
+    cursor.execute("LOCK TABLE item IN SHARE ROW EXCLUSIVE MODE")
+    cursor.execute("""
+        WITH source AS (
+            SELECT DISTINCT ON (name, type) name, type, value, subtype, weight, casterlevel
+            FROM itemtesting
+            WHERE name IS NOT NULL AND type IS NOT NULL
+            ORDER BY name, type, id
+        ),
+        matched AS (
+            SELECT s.*
+            FROM source s
+            WHERE EXISTS (
+                SELECT 1 FROM item i
+                WHERE i.name = s.name AND i.type = s.type AND i.campaign_id IS NULL
+            )
+        ),
+        updated AS (
+            UPDATE item i
+            SET value = m.value,
+                subtype = m.subtype,
+                weight = m.weight,
+                casterlevel = m.casterlevel
+            FROM matched m
+            WHERE i.name = m.name AND i.type = m.type AND i.campaign_id IS NULL
+              AND ROW(i.value, i.subtype, i.weight, i.casterlevel)
+                  IS DISTINCT FROM ROW(m.value, m.subtype, m.weight, m.casterlevel)
+            RETURNING i.name, i.type
+        ),
+        inserted AS (
+            INSERT INTO item (name, type, value, subtype, weight, casterlevel)
+            SELECT s.name, s.type, s.value, s.subtype, s.weight, s.casterlevel
+            FROM source s
+            WHERE NOT EXISTS (SELECT 1 FROM matched m WHERE m.name = s.name AND m.type = s.type)
+            ORDER BY s.name, s.type
+            RETURNING id
+        )
+        SELECT
+            (SELECT COUNT(*) FROM inserted),
+            (SELECT COUNT(DISTINCT (name, type)) FROM updated),
+            (SELECT COUNT(*) FROM matched) - (SELECT COUNT(DISTINCT (name, type)) FROM updated)
+    """)
+    return PromoteResult(*cursor.fetchone())
@@ -1,8 +1,31 @@
 import os
 import re
+import time
+import argparse
+import json
+from datetime import datetime
+from collections import Counter, defaultdict, namedtuple
+from functools import lru_cache
+from itertools import groupby
+from concurrent.futures import ProcessPoolExecutor
 import psycopg2
 from psycopg2 import sql
 import sys
+from lstcopy import CopyLoader, DEFAULT_BUFFER_SIZE, format_copy_row
+from lsttokenizer import tokenize_line, find_caster_level, find_caster_level_match, IndicatorMatcher, \
+    SPROP_CASTER_LEVEL
+from lstmanifest import prepare_incremental_run, record_files, ensure_dependency_table, load_dependents, \
+    record_dependencies
+from lstpromote import promote_items
+from lstpcc import ITEM_TAGS, load_source_selection
+from lstresolve import LstResolver
+from lstrowsync import RowSync, ensure_removed_table, remove_rows, restore_removed_rows
+from lstmmap import iter_candidate_lines
+from lstwalk import find_lst_files as walk_lst_files
+from lstpipeline import Pipeline, DEFAULT_QUEUE_SIZE
+from lststats import RunStats
+
+ITEM_COLUMNS = ('name', 'type', 'ogtype', 'subtype', 'ogsubtype', 'value', 'weight', 'casterlevel', 'lstsource')
 
 
 def get_priority(lstsource):
@@ -18,146 +41,277 @@ def get_priority(lstsource):
     return 4  # Lower priority for any other path
 
 
-def deduplicate_items(cursor):
-    # Remove exact duplicates (keep this part as it is)
-    cursor.execute("""
-        DELETE FROM itemtesting
-        WHERE id IN (
-            SELECT id
-            FROM (
-                SELECT id,
-                       ROW_NUMBER() OVER (PARTITION BY name, type, subtype, value, weight, casterlevel
-                                          ORDER BY id) as row_num
-                FROM itemtesting
-            ) t
-            WHERE t.row_num > 1
-        )
-    """)
-    exact_duplicates_removed = cursor.rowcount
-    print(f"Removed {exact_duplicates_removed} exact duplicates.")
+ITEM_ID, ITEM_NAME, ITEM_TYPE, ITEM_SUBTYPE, ITEM_VALUE, ITEM_WEIGHT, ITEM_CASTERLEVEL, ITEM_LSTSOURCE = range(8)
+
 
-    # Find all conflicts
+def fetch_name_groups(cursor):
     cursor.execute("""
-        SELECT t1.id as id1, t2.id as id2, t1.name, 
-               t1.type as type1, t1.subtype as subtype1, t1.value as value1, t1.weight as weight1, t1.casterlevel as casterlevel1, t1.lstsource as lstsource1,
-               t2.type as type2, t2.subtype as subtype2, t2.value as value2, t2.weight as weight2, t2.casterlevel as casterlevel2, t2.lstsource as lstsource2
-        FROM itemtesting t1
-        JOIN itemtesting t2 ON t1.name = t2.name AND t1.id < t2.id
-        WHERE t1.type != t2.type 
-           OR t1.subtype != t2.subtype 
-           OR t1.value != t2.value 
-           OR t1.weight != t2.weight 
-           OR t1.casterlevel != t2.casterlevel
+        SELECT id, name, type, subtype, value, weight, casterlevel, lstsource
+        FROM itemtesting
+        WHERE name IN (SELECT name FROM itemtesting GROUP BY name HAVING COUNT(*) > 1)
+        ORDER BY name, id
     """)
+    for name, rows in groupby(cursor.fetchall(), key=lambda row: row[ITEM_NAME]):
+        yield name, list(rows)
 
-    conflicts = cursor.fetchall()
-    items_to_remove = set()
 
-    # Handle conflicts
-    for conflict in conflicts:
-        # Skip if either item has already been marked for removal
-        if conflict[0] in items_to_remove or conflict[1] in items_to_remove:
-            continue
+def keep_best(rows, priority):
+    best = min(priority(row) for row in rows)
+    return [row for row in rows if priority(row) == best]
+
+
+def subtype_priority_of(row):
+    return get_subtype_priority(row[ITEM_SUBTYPE])
+
+
+def resolve_name_group(rows, source_priority=None):
+    """Rank one group of same-named rows; returns (kept rows, {rule: removed ids})."""
+    source_priority = source_priority or get_source_priority
+    removed = {'profs': [], 'subtype': [], 'source': []}
+
+    def source_priority_of(row):
+        return source_priority(row[ITEM_LSTSOURCE] or '')
+
+    # 'profs' rows lose to any row from another source
+    kept = [row for row in rows if 'profs' not in (row[ITEM_LSTSOURCE] or '').lower()]
+    if kept and len(kept) < len(rows):
+        removed['profs'] = [row[ITEM_ID] for row in rows if row not in kept]
+    else:
+        kept = rows
+
+    # Rows that differ only by subtype: best subtype wins, then best source
+    variants_by_attributes = defaultdict(list)
+    for row in kept:
+        attributes = (row[ITEM_TYPE], row[ITEM_VALUE], row[ITEM_WEIGHT], row[ITEM_CASTERLEVEL])
+        variants_by_attributes[attributes].append(row)
+
+    kept = []
+    for variants in variants_by_attributes.values():
+        winners = keep_best(keep_best(variants, subtype_priority_of), source_priority_of)
+        removed['subtype'] += [row[ITEM_ID] for row in variants if row not in winners]
+        kept += winners
+
+    # Rows whose other attributes differ: best source wins, ties are kept
+    winners = keep_best(kept, source_priority_of)
+    removed['source'] += [row[ITEM_ID] for row in kept if row not in winners]
+
+    return winners, removed
+
+
+def describe_item_row(row):
+    return (f"ID {row[ITEM_ID]}: Type: {row[ITEM_TYPE]}, Subtype: {row[ITEM_SUBTYPE]}, Value: {row[ITEM_VALUE]}, "
+            f"Weight: {row[ITEM_WEIGHT]}, CasterLevel: {row[ITEM_CASTERLEVEL]}, Source: {row[ITEM_LSTSOURCE]}")
+
+
+def prompt_group_choice(name, rows):
+    print(f"\nConflict for item '{name}':")
+    for index, row in enumerate(rows, 1):
+        print(f"{index}. {describe_item_row(row)}")
+    print("0. Remove all")
 
-        # First, handle 'profs' conflicts
-        if 'profs' in conflict[8].lower():  # lstsource1
-            items_to_remove.add(conflict[0])
+    while True:
+        choice = input(f"Enter the number(s) to keep, comma separated (0-{len(rows)}): ")
+        try:
+            picks = {int(part) for part in choice.split(',') if part.strip()}
+        except ValueError:
+            picks = set()
+        if picks and all(0 <= pick <= len(rows) for pick in picks) and not (0 in picks and len(picks) > 1):
+            break
+        print(f"Invalid choice. Please enter 0, or numbers between 1 and {len(rows)}.")
+
+    return [row[ITEM_ID] for index, row in enumerate(rows, 1) if index not in picks]
+
+
+def write_decisions_file(decisions_file, unresolved):
+    conflicts = []
+    for name, rows in unresolved:
+        conflicts.append({
+            'name': name,
+            'keep': None,
+            'rows': [
+                {
+                    'id': row[ITEM_ID],
+                    'type': row[ITEM_TYPE],
+                    'subtype': row[ITEM_SUBTYPE],
+                    'value': row[ITEM_VALUE],
+                    'weight': row[ITEM_WEIGHT],
+                    'casterlevel': row[ITEM_CASTERLEVEL],
+                    'lstsource': row[ITEM_LSTSOURCE],
+                }
+                for row in rows
+            ],
+        })
+
+    with open(decisions_file, 'w', encoding='utf-8') as file:
+        json.dump({
+            'generated_at': datetime.now().isoformat(timespec='seconds'),
+            'instructions': "Set 'keep' to the list of ids to keep for each conflict ([] removes all rows). "
+                            "Conflicts left as null are skipped by apply-decisions.",
+            'conflicts': conflicts,
+        }, file, indent=2, default=str)
+
+
+def read_decisions_file(decisions_file):
+    """Return the decided conflicts as (name, reviewed rows, ids to keep) and the skipped/invalid counts."""
+    with open(decisions_file, 'r', encoding='utf-8') as file:
+        data = json.load(file)
+
+    decided = []
+    skipped = invalid = 0
+    for conflict in data.get('conflicts', []):
+        keep = conflict.get('keep')
+        rows = conflict.get('rows', [])
+        row_ids = [row['id'] for row in rows]
+        if keep is None:
+            skipped += 1
             continue
-        elif 'profs' in conflict[14].lower():  # lstsource2
-            items_to_remove.add(conflict[1])
+        if not isinstance(keep, list) or any(item_id not in row_ids for item_id in keep):
+            print(f"Invalid 'keep' for '{conflict.get('name')}': {keep!r}. Skipping.")
+            invalid += 1
             continue
+        decided.append((conflict.get('name'), rows, keep))
+
+    return decided, skipped, invalid
+
+
+DECISION_FIELDS = ('type', 'subtype', 'value', 'weight', 'casterlevel', 'lstsource')
+
 
-        # Check if everything except subtype matches
-        if (conflict[3] == conflict[9] and  # type
-                conflict[5] == conflict[11] and  # value
-                conflict[6] == conflict[12] and  # weight
-                conflict[7] == conflict[13]):  # casterlevel
-
-            # Prioritize based on subtype
-            priority1 = get_subtype_priority(conflict[4])  # subtype1
-            priority2 = get_subtype_priority(conflict[10])  # subtype2
-
-            if priority1 < priority2:
-                items_to_remove.add(conflict[1])
-            elif priority1 > priority2:
-                items_to_remove.add(conflict[0])
-            else:
-                # If subtypes have the same priority, use source priority
-                source_priority1 = get_source_priority(conflict[8])  # lstsource1
-                source_priority2 = get_source_priority(conflict[14])  # lstsource2
-
-                if source_priority1 < source_priority2:
-                    items_to_remove.add(conflict[1])
-                elif source_priority1 > source_priority2:
-                    items_to_remove.add(conflict[0])
-                # If source priorities are also the same, keep both (do nothing)
+def reviewed_values(name, row):
+    return dict(name=name, **{field: row.get(field) for field in DECISION_FIELDS})
+
+
+def decision_snapshot(name, row):
+    # The reviewed values as the decisions file stores them (numbers through
+    # default=str), so rows read back from the table compare like for like
+    return json.loads(json.dumps({
+        'name': name,
+        'type': row[ITEM_TYPE],
+        'subtype': row[ITEM_SUBTYPE],
+        'value': row[ITEM_VALUE],
+        'weight': row[ITEM_WEIGHT],
+        'casterlevel': row[ITEM_CASTERLEVEL],
+        'lstsource': row[ITEM_LSTSOURCE],
+    }, default=str))
+
+
+def fetch_current_rows(cursor, ids):
+    cursor.execute("""
+        SELECT id, name, type, subtype, value, weight, casterlevel, lstsource
+        FROM itemtesting
+        WHERE id = ANY(%s)
+        FOR UPDATE
+    """, (list(ids),))
+    return {row[ITEM_ID]: decision_snapshot(row[ITEM_NAME], row) for row in cursor.fetchall()}
+
+
+def apply_decisions(cursor, decisions_file):
+    decided, skipped, invalid = read_decisions_file(decisions_file)
+    current = fetch_current_rows(cursor, [row['id'] for _, rows, _ in decided for row in rows])
+
+    # A decision only holds while every row it was made on still has the reviewed
+    # name, source and values; ids are reused by re-ingests and syncs
+    to_remove = []
+    stale = []
+    for name, rows, keep in decided:
+        if all(current.get(row['id']) == reviewed_values(name, row) for row in rows):
+            to_remove.extend(row['id'] for row in rows if row['id'] not in keep)
         else:
-            # If other attributes don't match, use source priority
-            source_priority1 = get_source_priority(conflict[8])  # lstsource1
-            source_priority2 = get_source_priority(conflict[14])  # lstsource2
-
-            if source_priority1 < source_priority2:
-                items_to_remove.add(conflict[1])
-            elif source_priority1 > source_priority2:
-                items_to_remove.add(conflict[0])
-            # If source priorities are the same, keep both (do nothing)
-
-    # Remove items
-    if items_to_remove:
-        cursor.execute("""
-            DELETE FROM itemtesting
-            WHERE id = ANY(%s)
-        """, (list(items_to_remove),))
-        removed_count = cursor.rowcount
-        print(f"Removed {removed_count} items based on prioritization rules.")
-
-    # Find remaining conflicts
+            stale.append(name)
+
+    ensure_removed_table(cursor, 'itemtesting', ITEM_COLUMNS, 'lstsource')
+    removed = remove_item_ids(cursor, to_remove, 'manual')
+    print(f"Decisions applied: {len(decided) - len(stale)} conflicts, {skipped} undecided, {invalid} invalid, "
+          f"{len(stale)} stale.")
+    for name in stale:
+        print(f"Stale: the rows of '{name}' changed since the decisions file was written. Skipped.")
+    print(f"Removed {removed} items.")
+    return removed
+
+
+def remove_item_ids(cursor, ids, reason):
+    # Synced rows are recorded in itemtesting_removed so the next sync of their
+    # file does not insert them again
+    return remove_rows(cursor, 'itemtesting', ITEM_COLUMNS, 'lstsource', ids, reason)
+
+
+def deduplicate_items(cursor, decisions_file=None, source_priority=None, stats=None, changed_names=None):
+    """Remove duplicate rows; changed_names are the names a row sync touched.
+
+    The rows dedup removed earlier from those name groups are restored first,
+    so the groups are ranked again as a full ingest would rank them.
+    """
+    ensure_removed_table(cursor, 'itemtesting', ITEM_COLUMNS, 'lstsource')
+    if changed_names:
+        restored = restore_removed_rows(cursor, 'itemtesting', ITEM_COLUMNS, changed_names)
+        print(f"Restored {restored} previously removed rows of {len(changed_names)} changed names.")
+
+    # Remove exact duplicates (keep this part as it is)
     cursor.execute("""
-        SELECT t1.id, t2.id, t1.name, 
-               t1.type, t1.subtype, t1.value, t1.weight, t1.casterlevel, t1.lstsource,
-               t2.type, t2.subtype, t2.value, t2.weight, t2.casterlevel, t2.lstsource
-        FROM itemtesting t1
-        JOIN itemtesting t2 ON t1.name = t2.name AND t1.id < t2.id
-        WHERE t1.type != t2.type 
-           OR t1.subtype != t2.subtype 
-           OR t1.value != t2.value 
-           OR t1.weight != t2.weight 
-           OR t1.casterlevel != t2.casterlevel
+        SELECT id
+        FROM (
+            SELECT id,
+                   ROW_NUMBER() OVER (PARTITION BY name, type, subtype, value, weight, casterlevel
+                                      ORDER BY id) as row_num
+            FROM itemtesting
+        ) t
+        WHERE t.row_num > 1
     """)
+    exact_duplicates_removed = remove_item_ids(cursor, [row[0] for row in cursor.fetchall()], 'exact')
+    print(f"Removed {exact_duplicates_removed} exact duplicates.")
 
-    remaining_conflicts = cursor.fetchall()
-    manual_removed = 0
+    # Every remaining row in a name group now differs from the others in type, subtype,
+    # value, weight or casterlevel (NULLs included), so each group is one conflict set.
+    groups = 0
+    resolved_groups = 0
+    removed_by_rule = {'profs': 0, 'subtype': 0, 'source': 0}
+    items_by_rule = defaultdict(list)
+    unresolved = []
+
+    for name, rows in fetch_name_groups(cursor):
+        groups += 1
+        winners, removed = resolve_name_group(rows, source_priority)
+        for rule, ids in removed.items():
+            removed_by_rule[rule] += len(ids)
+            items_by_rule[rule].extend(ids)
+        if len(winners) == 1:
+            resolved_groups += 1
+        else:
+            unresolved.append((name, winners))
+
+    removed_count = sum(remove_item_ids(cursor, ids, rule) for rule, ids in items_by_rule.items())
+    conflicts = len(unresolved)
+    print(f"Conflict groups: {groups} ({resolved_groups} resolved automatically, {conflicts} need review)")
+    print(f"Removed {removed_count} items based on prioritization rules "
+          f"(profs: {removed_by_rule['profs']}, subtype: {removed_by_rule['subtype']}, "
+          f"source: {removed_by_rule['source']}).")
+
+    if decisions_file:
+        # Always rewritten, so a file from an earlier run is never applied to this run's ids
+        write_decisions_file(decisions_file, unresolved)
+        if unresolved:
+            print(f"Wrote {len(unresolved)} unresolved conflicts to {decisions_file}.")
+            print(f"Edit it, then run: python lstreaderandinput.py apply-decisions --decisions-file {decisions_file}")
+        else:
+            print(f"No unresolved conflicts; cleared {decisions_file}.")
+        unresolved = []
 
-    if remaining_conflicts:
+    manual_to_remove = []
+    if unresolved:
         print("\nManual conflict resolution:")
-        for conflict in remaining_conflicts:
-            print(f"\nConflict for item '{conflict[2]}':")
-            print(
-                f"1. ID {conflict[0]}: Type: {conflict[3]}, Subtype: {conflict[4]}, Value: {conflict[5]}, Weight: {conflict[6]}, CasterLevel: {conflict[7]}, Source: {conflict[8]}")
-            print(
-                f"2. ID {conflict[1]}: Type: {conflict[9]}, Subtype: {conflict[10]}, Value: {conflict[11]}, Weight: {conflict[12]}, CasterLevel: {conflict[13]}, Source: {conflict[14]}")
-            print("3. Remove both")
-
-            while True:
-                choice = input("Enter your choice (1, 2, or 3): ")
-                if choice in ['1', '2', '3']:
-                    break
-                print("Invalid choice. Please enter 1, 2, or 3.")
-
-            if choice == '1':
-                cursor.execute("DELETE FROM itemtesting WHERE id = %s", (conflict[1],))
-                manual_removed += 1
-            elif choice == '2':
-                cursor.execute("DELETE FROM itemtesting WHERE id = %s", (conflict[0],))
-                manual_removed += 1
-            elif choice == '3':
-                cursor.execute("DELETE FROM itemtesting WHERE id IN (%s, %s)", (conflict[0], conflict[1]))
-                manual_removed += 2
+        for name, rows in unresolved:
+            manual_to_remove.extend(prompt_group_choice(name, rows))
 
+    manual_removed = remove_item_ids(cursor, manual_to_remove, 'manual')
     print(f"\nManually removed {manual_removed} items.")
     total_removed = exact_duplicates_removed + removed_count + manual_removed
     print(f"Total entries removed: {total_removed}")
 
+    if stats:
+        stats.count(dedup_exact_duplicates=exact_duplicates_removed, dedup_groups=groups,
+                    dedup_resolved=resolved_groups, dedup_conflicts=conflicts,
+                    dedup_removed_by_rules=removed_count, dedup_removed_manually=manual_removed)
+
     return total_removed
 
 
@@ -166,40 +320,57 @@ def is_relevant_file(filename):
     return any(keyword in filename.lower() for keyword in relevant_keywords) and 'equipmod' not in filename.lower()
 
 
+ITEM_INDICATORS = frozenset([
+    'TYPE:', 'COST:', 'WT:', 'PROFICIENCY:', 'EQMOD:', 'SPROP:', 'SIZE:',
+    'RANGE:', 'DAMAGE:', 'CRITMULT:', 'CRITRANGE:', 'WIELD:', 'CONTAINS:',
+    'BASEITEM:', 'SPELLFAILURE:', 'ACCHECK:', 'MAXDEX:', 'MODS:', 'SLOTS:',
+    'ALTDAMAGE:', 'ALTEQMOD:', 'ALTCRITMULT:', 'ALTTYPE:', 'ALTCRITRANGE:'])
+
+SPELL_INDICATORS = frozenset([
+    'CLASSES:', 'SCHOOL:', 'SUBSCHOOL:', 'DESCRIPTOR:', 'COMPS:',
+    'CASTTIME:', 'RANGE:', 'TARGETAREA:', 'DURATION:', 'SAVEINFO:', 'SPELLRES:'])
+
+ABILITY_INDICATORS = frozenset(['CATEGORY:Special Ability', 'TYPE:SkillSpecialization', 'ABILITY:'])
+
+WEAPON_OR_ARMOR_INDICATORS = frozenset(['TYPE:Weapon', 'TYPE:Armor'])
+
+# Every line is_item_record accepts contains one of the item indicators, so they
+# double as the byte filter applied before a line is decoded
+RESOLVE_LINE_NEEDLES = ITEM_INDICATORS | {'.COPY=', '.MOD', '.FORGET'}
+
+LINE_MATCHER = IndicatorMatcher(ITEM_INDICATORS | SPELL_INDICATORS | ABILITY_INDICATORS |
+                                WEAPON_OR_ARMOR_INDICATORS | {'TYPE:Service'})
+
+
 def is_item_line(line, filename):
+    return is_item_record(tokenize_line(line), filename)
+
+
+def is_item_record(record, filename):
     if "abilities" in filename.lower():
         return False
-    if '.MOD' in line or 'TYPE:Service' in line:
+    line = record.line
+    if '.MOD' in line:
         return False
-    item_indicators = ['TYPE:', 'COST:', 'WT:', 'PROFICIENCY:', 'EQMOD:', 'SPROP:', 'SIZE:',
-                       'RANGE:', 'DAMAGE:', 'CRITMULT:', 'CRITRANGE:', 'WIELD:', 'CONTAINS:',
-                       'BASEITEM:', 'SPELLFAILURE:', 'ACCHECK:', 'MAXDEX:', 'MODS:', 'SLOTS:',
-                       'ALTDAMAGE:', 'ALTEQMOD:', 'ALTCRITMULT:', 'ALTTYPE:', 'ALTCRITRANGE:']
-
-    spell_indicators = ['CLASSES:', 'SCHOOL:', 'SUBSCHOOL:', 'DESCRIPTOR:', 'COMPS:',
-                        'CASTTIME:', 'RANGE:', 'TARGETAREA:', 'DURATION:', 'SAVEINFO:', 'SPELLRES:']
-
-    ability_indicators = ['CATEGORY:Special Ability', 'TYPE:SkillSpecialization', 'ABILITY:']
-    has_item_indicator = any(indicator in line for indicator in item_indicators)
-    has_spell_indicator = any(indicator in line for indicator in spell_indicators)
-    has_ability_indicator = any(indicator in line for indicator in ability_indicators)
-    if has_ability_indicator:
+    found = LINE_MATCHER.find_all(record)
+    if 'TYPE:Service' in found or not found.isdisjoint(ABILITY_INDICATORS):
         return False
-    is_weapon_or_armor = 'TYPE:Weapon' in line or 'TYPE:Armor' in line
+    has_item_indicator = not found.isdisjoint(ITEM_INDICATORS)
+    has_spell_indicator = not found.isdisjoint(SPELL_INDICATORS)
+    is_weapon_or_armor = not found.isdisjoint(WEAPON_OR_ARMOR_INDICATORS)
     starts_with_name_and_type = not line.startswith('#') and '\tTYPE:' in line
     return (has_item_indicator and not has_spell_indicator) or is_weapon_or_armor or starts_with_name_and_type
 
 
-def get_item_name(line):
-    original_name = line.split('\t')[0].strip()
+def get_item_name(record):
+    original_name = record.name
 
-    copy_match = re.search(r'\.COPY=(.+?)(\t|$)', line)
-    if copy_match:
-        return copy_match.group(1).strip()
+    if record.copy_name:
+        return record.copy_name
 
-    output_name_match = re.search(r'OUTPUTNAME:([^\t]+)', line)
-    if output_name_match:
-        output_name = output_name_match.group(1).strip()
+    output_name = record.get('OUTPUTNAME')
+    if output_name:
+        output_name = output_name.strip()
 
         # Check for [NAME] in OUTPUTNAME
         if '[NAME]' in output_name:
@@ -294,36 +465,28 @@ def map_item_subtype(main_type, type_str):
 
 
 def extract_item_info(line, lstsource):
-    name = get_item_name(line)
-    type_match = re.search(r'TYPE:([^\t]+)', line)
-    type_str = type_match.group(1) if type_match else ''
+    return extract_record_info(tokenize_line(line), lstsource)
+
+
+@lru_cache(maxsize=4096)
+def classify_type_string(type_str):
+    # The same few hundred TYPE strings repeat across the whole tree
     type_parts = type_str.split('.')
     item_type = type_parts[0] if type_parts else ''
     og_subtype = '.'.join(type_parts[1:]) if len(type_parts) > 1 else ''
 
     mapped_type = map_item_type(type_str)
     mapped_subtype = map_item_subtype(mapped_type, type_str) if mapped_type else None
+    return mapped_type, item_type, mapped_subtype, og_subtype
 
-    cost_match = re.search(r'COST:(\d+)', line)
-    value = cost_match.group(1) if cost_match else None
-
-    weight_match = re.search(r'WT:(\d+(?:\.\d+)?)', line)
-    weight = weight_match.group(1) if weight_match else None
-
-    caster_level = None
-    cl_patterns = [
-        r'SPROP:[^|]*\|CL(\d+)',
-        r'CL=(\d+)',
-        r'CASTER LEVEL=(\d+)',
-        r'CASTERLEVEL=(\d+)',
-        r'\bCL\s+(\d+)',
-    ]
-
-    for pattern in cl_patterns:
-        cl_match = re.search(pattern, line, re.IGNORECASE)
-        if cl_match:
-            caster_level = cl_match.group(1)
-            break
+
+def extract_record_info(record, lstsource):
+    name = get_item_name(record)
+    mapped_type, item_type, mapped_subtype, og_subtype = classify_type_string(record.get('TYPE', ''))
+
+    value = record.get_number('COST')
+    weight = record.get_number('WT', decimal=True)
+    caster_level = find_caster_level(record)
 
     return (name, mapped_type, item_type, mapped_subtype, og_subtype, value, weight, caster_level, lstsource)
 
@@ -336,6 +499,11 @@ def insert_item(cursor, item_info):
     cursor.execute(insert_query, item_info)
 
 
+def create_item_loader(cursor, buffer_size=DEFAULT_BUFFER_SIZE):
+    # Same column layout as insert_item, streamed with COPY instead of one INSERT per row
+    return CopyLoader(cursor, 'itemtesting', ITEM_COLUMNS, buffer_size)
+
+
 def get_subtype_priority(subtype):
     priorities = {
         'ammunition': 1,
@@ -363,33 +531,377 @@ def get_source_priority(lstsource):
     return 4  # Lower priority for any other path
 
 
-def process_lst_file(file_path, cursor):
-    items_with_cl = 0
-    total_items = 0
+def parse_lst_file(file_path):
+    return parse_lst_lines(file_path, iter_candidate_lines(file_path, ITEM_INDICATORS))
+
+
+def parse_lst_lines(file_path, lines):
+    return classify_records(file_path, (tokenize_line(line) for line in lines))
+
+
+def classify_records(file_path, records, counts=None):
+    """Item rows of one file's records; counts, if given, gets the caster levels found in free text."""
+    file_counts = ([], 0, 0)
     lstsource = file_path  # Extract filename without path
 
-    with open(file_path, 'r', encoding='utf-8', errors='ignore') as file:
-        for line in file:
-            line = line.strip()
-            if line and not line.startswith('#'):
-                if is_item_line(line, file_path):
-                    total_items += 1
-                    item_info = extract_item_info(line, lstsource)
-                    if item_info[0] and '.MOD' not in item_info[0]:
-                        if item_info[7]:  # Check if caster level is not None
-                            items_with_cl += 1
-                        insert_item(cursor, item_info)
+    for record in records:
+        if is_item_record(record, file_path):
+            item_info = extract_record_info(record, lstsource)
+            if counts is not None and item_info[7] is not None \
+                    and find_caster_level_match(record)[1] != SPROP_CASTER_LEVEL:
+                counts['regex_fallbacks'] += 1
+            file_counts = add_item_counts(file_counts, item_info)
+
+    return file_counts
+
+
+def add_item_counts(file_counts, item_info):
+    items, total_items, items_with_cl = file_counts
+    total_items += 1
+    if item_info[0] and '.MOD' not in item_info[0]:
+        if item_info[7]:  # Check if caster level is not None
+            items_with_cl += 1
+        items.append(item_info)
+    return items, total_items, items_with_cl
+
+
+def collect_lst_records(file_path):
+    # Item lines plus every .COPY/.MOD/.FORGET line; derived lines are only
+    # classified once their inherited fields are known.
+    records = []
+    for line in iter_candidate_lines(file_path, RESOLVE_LINE_NEEDLES):
+        record = tokenize_line(line)
+        if record.operation or is_item_record(record, file_path):
+            records.append(record)
+    return records
+
+
+def resolve_lst_files(all_file_paths, workers=1, source_priority=None):
+    """Resolve .COPY/.MOD across the whole tree; returns the resolver and every file's results."""
+    resolver = LstResolver(source_priority or get_source_priority)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for file_path, records in zip(all_file_paths,
+                                          executor.map(collect_lst_records, all_file_paths, chunksize=4)):
+                for record in records:
+                    resolver.add(record, file_path)
+    else:
+        for file_path in all_file_paths:
+            for record in collect_lst_records(file_path):
+                resolver.add(record, file_path)
+
+    results = {file_path: ([], 0, 0) for file_path in all_file_paths}
+    for record, lstsource in resolver.resolve():
+        if lstsource in results and is_item_record(record, lstsource):
+            results[lstsource] = add_item_counts(results[lstsource], extract_record_info(record, lstsource))
+
+    if resolver.unresolved_copies:
+        print(f"Skipped {resolver.unresolved_copies} .COPY lines whose base item was not found.")
+    return resolver, results
+
+
+def parse_resolved_lst_files(all_file_paths, file_paths, workers=1, source_priority=None):
+    """Resolve .COPY/.MOD across the whole tree; yield per-file results for file_paths only."""
+    _, results = resolve_lst_files(all_file_paths, workers, source_priority)
+    for file_path in file_paths:
+        yield file_path, results[file_path]
+
+
+def affected_lst_files(cursor, resolver, all_file_paths, changes):
+    """Changed files plus the unchanged files whose resolved rows depend on a changed or deleted file.
+
+    The recorded graph catches dependencies the changed files no longer state
+    (a removed .MOD or base item), the resolver's graph the ones they now add.
+    """
+    changed = [state.path for state in changes.changed]
+    stale = changed + changes.deleted
+    affected = set(changed) | load_dependents(cursor, 'itemtesting', stale) | resolver.dependents(stale)
+    return [file_path for file_path in all_file_paths if file_path in affected]
+
+
+def write_items(cursor, items, loader=None):
+    for item_info in items:
+        if loader:
+            loader.add(item_info)
+        else:
+            insert_item(cursor, item_info)
+
+
+# One unit of the write stage: the per-file summaries it completes plus either
+# the item rows (INSERT/sync) or COPY text formatted by the batch stage (--bulk)
+ItemBatch = namedtuple('ItemBatch', ['files', 'rows', 'copy_text', 'row_count'])
+
+
+def read_item_files(file_paths, stats):
+    for file_path in file_paths:
+        start = time.perf_counter()
+        lines = list(iter_candidate_lines(file_path, ITEM_INDICATORS))
+        stats.add_file('read', file_path, time.perf_counter() - start,
+                       bytes_read=os.path.getsize(file_path), lines_scanned=len(lines))
+        yield file_path, lines
+
+
+def tokenize_item_files(files, stats):
+    for file_path, lines in files:
+        start = time.perf_counter()
+        records = [tokenize_line(line) for line in lines]
+        stats.add_file('tokenize', file_path, time.perf_counter() - start)
+        yield file_path, records
+
+
+def classify_item_files(files, stats):
+    for file_path, records in files:
+        start = time.perf_counter()
+        counts = Counter()
+        file_counts = classify_records(file_path, records, counts)
+        stats.add_file('classify', file_path, time.perf_counter() - start,
+                       lines_rejected=len(records) - file_counts[1], regex_fallbacks=counts['regex_fallbacks'])
+        yield file_path, file_counts
+
+
+def batch_item_files(files, stats, copy_buffer_size=None):
+    """One batch per file, or with copy_buffer_size COPY text of about that many bytes across files."""
+    summaries, lines, size, rows = [], [], 0, 0
+    for file_path, (items, total_items, items_with_cl) in files:
+        start = time.perf_counter()
+        if copy_buffer_size:
+            for item_info in items:
+                line = format_copy_row(item_info)
+                lines.append(line)
+                size += len(line)
+        # .MOD lines and lines without a name are counted as items but never written
+        stats.add_file('batch', file_path, time.perf_counter() - start, lines_items=total_items,
+                       items_dropped=total_items - len(items), items_with_cl=items_with_cl)
+        if not copy_buffer_size:
+            yield ItemBatch([(file_path, total_items, items_with_cl)], items, None, len(items))
+            continue
 
+        rows += len(items)
+        summaries.append((file_path, total_items, items_with_cl))
+        if size >= copy_buffer_size:
+            yield ItemBatch(summaries, None, ''.join(lines), rows)
+            summaries, lines, size, rows = [], [], 0, 0
+    if summaries:
+        yield ItemBatch(summaries, None, ''.join(lines), rows)
+
+
+def build_item_pipeline(file_paths, results=None, copy_buffer_size=None, queue_size=DEFAULT_QUEUE_SIZE,
+                        stats=None):
+    """walk -> read -> tokenize -> classify -> batch, each stage on its own thread.
+
+    `results` replaces the first four stages with already parsed (file_path,
+    file_counts) pairs, as produced by the process pool or the .COPY resolver.
+    Every stage adds its per-file timings and counters to stats.
+    """
+    stats = stats or RunStats('items')
+    if results is not None:
+        pipeline = Pipeline('parse', results, queue_size)
+    else:
+        pipeline = Pipeline('walk', file_paths, queue_size)
+        pipeline.add_stage('read', lambda files: read_item_files(files, stats))
+        pipeline.add_stage('tokenize', lambda files: tokenize_item_files(files, stats))
+        pipeline.add_stage('classify', lambda files: classify_item_files(files, stats))
+    return pipeline.add_stage('batch', lambda files: batch_item_files(files, stats, copy_buffer_size))
+
+
+def write_item_batches(cursor, batches, loader=None, sync=None, stats=None):
+    """Write stage, on the thread that owns the cursor; returns (items processed, items with caster level)."""
+    stats = stats or RunStats('items')
+    total_items_processed = 0
+    total_items_with_cl = 0
+    for batch in batches:
+        start = time.perf_counter()
+        if batch.copy_text is not None:
+            loader.write_formatted(batch.copy_text, batch.row_count)
+        elif sync:
+            sync.add_file(batch.files[0][0], batch.rows)
+        else:
+            write_items(cursor, batch.rows, loader)
+        seconds = time.perf_counter() - start
+
+        # A COPY batch spans several files; its time is shared out by their item counts
+        batch_items = sum(items_processed for _, items_processed, _ in batch.files)
+        for file_path, items_processed, _ in batch.files:
+            share = items_processed / batch_items if batch_items else 1 / len(batch.files)
+            stats.add_file('write', file_path, seconds * share)
+        stats.count(rows_written=batch.row_count)
+        for file_path, items_processed, items_with_cl in batch.files:
+            print_file_summary(file_path, items_processed, items_with_cl)
+            total_items_processed += items_processed
+            total_items_with_cl += items_with_cl
+    return total_items_processed, total_items_with_cl
+
+
+def print_file_summary(file_path, total_items, items_with_cl):
     print(f"File: {file_path}")
     print(f"Total items processed: {total_items}")
     print(f"Items with caster level: {items_with_cl}")
     print("--------------------")
 
+
+def process_lst_file(file_path, cursor, loader=None):
+    return ingest_lst_lines(file_path, iter_candidate_lines(file_path, ITEM_INDICATORS), cursor, loader)
+
+
+def ingest_lst_lines(file_path, lines, cursor, loader=None):
+    """Parse and write one file's lines; the item consumer of the shared walk in lstrefresh."""
+    items, total_items, items_with_cl = parse_lst_lines(file_path, lines)
+    write_items(cursor, items, loader)
+    print_file_summary(file_path, total_items, items_with_cl)
+
     return total_items, items_with_cl
 
-if __name__ == "__main__":
+
+def find_lst_files(lst_directory):
+    return walk_lst_files(lst_directory, is_relevant_file)
+
+
+def parse_lst_files_parallel(file_paths, workers):
+    # Parsing is CPU-bound regex work, so files are spread across processes and
+    # the parsed batches come back here to be written by the single DB connection.
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(parse_lst_file, file_paths, chunksize=4)
+        for file_path, result in zip(file_paths, results):
+            yield file_path, result
+
+def run_ingest(cursor, args, lst_directory, selection=None):
+    stats = RunStats('lstreaderandinput ingest')
+    # Re-ingesting changed files always goes through the row-level sync
+    sync = RowSync(cursor, 'itemtesting', ITEM_COLUMNS, 'lstsource', args.buffer_size) \
+        if args.sync or args.incremental else None
+    loader = create_item_loader(cursor, args.buffer_size) if args.bulk and not sync else None
+    if selection:
+        # Only the files the profile's sources load; .COPY resolution stays within them too
+        all_file_paths = file_paths = selection.lst_files(lst_directory, ITEM_TAGS)
+        print(f"Profile enables {len(selection.sources)} sources with {len(file_paths)} item LST files.")
+    else:
+        all_file_paths = file_paths = list(find_lst_files(lst_directory))
+    source_priority = selection.source_priority if selection else None
+
+    changes = None
+    if args.incremental:
+        # The manifest is checked against the whole tree, so files outside the
+        # profile are not taken for deleted; only the profile's files are parsed
+        tree_paths = list(find_lst_files(lst_directory)) if selection else all_file_paths
+        walked = set(tree_paths)
+        tree_paths += [path for path in all_file_paths if path not in walked]
+        in_scope = set(all_file_paths)
+        with stats.phase('manifest'):
+            changes = prepare_incremental_run(cursor, 'itemtesting', tree_paths)
+        # Changed files outside the profile stay unrecorded until a run parses them
+        changes = changes._replace(changed=[state for state in changes.changed if state.path in in_scope])
+        file_paths = [state.path for state in changes.changed]
+        # Syncing a deleted file against no rows removes all of its rows
+        for file_path in changes.deleted:
+            sync.add_file(file_path, [])
+
+    results = None
+    resolver = None
+    if args.resolve:
+        with stats.phase('resolve'):
+            resolver, resolved = resolve_lst_files(all_file_paths, args.workers, source_priority)
+        if changes:
+            with stats.phase('manifest'):
+                ensure_dependency_table(cursor)
+                file_paths = affected_lst_files(cursor, resolver, all_file_paths, changes)
+            print(f"Re-emitting {len(file_paths) - len(changes.changed)} unchanged files that depend on "
+                  f"changed files.")
+        results = ((file_path, resolved[file_path]) for file_path in file_paths)
+    elif args.workers > 1:
+        results = parse_lst_files_parallel(file_paths, args.workers)
+
+    pipeline = build_item_pipeline(file_paths, results, args.buffer_size if loader else None, args.queue_size, stats)
+    total_items_processed, total_items_with_cl = write_item_batches(cursor, pipeline.run(), loader, sync, stats)
+    stats.add_pipeline(pipeline, consumer='write')
+
+    with stats.phase('flush'):
+        if loader:
+            loader.flush()
+        if sync:
+            sync.apply()
+            stats.count(sync_inserted=sync.inserted, sync_updated=sync.updated, sync_deleted=sync.deleted,
+                        sync_unchanged=sync.unchanged, sync_suppressed=sync.suppressed)
+    if changes:
+        with stats.phase('manifest'):
+            record_files(cursor, 'itemtesting', changes.changed)
+            if resolver:
+                record_dependencies(cursor, 'itemtesting', resolver.dependencies, file_paths + changes.deleted)
+
+    print("\nProcessing Summary:")
+    print(f"Total items processed: {total_items_processed}")
+    print(f"Total items with caster level: {total_items_with_cl}")
+    if loader:
+        print(f"Rows copied: {loader.rows_written} in {loader.flushes} COPY batches")
+    if sync:
+        print(f"Row sync: {sync.inserted} inserted, {sync.updated} updated, "
+              f"{sync.deleted} deleted, {sync.unchanged} unchanged, {sync.suppressed} kept out by dedup")
+
+    # Perform deduplication
+    print("\nPerforming deduplication...")
+    with stats.phase('dedup'):
+        deduplicated_count = deduplicate_items(cursor, args.decisions_file, source_priority, stats,
+                                               sync.changed_names if sync else None)
+    print(f"Deduplication complete. {deduplicated_count} duplicate rows removed.")
+
+    stats.print_summary()
+    if args.report:
+        stats.write_report(args.report)
+        print(f"Wrote run report to {args.report}")
+
+
+def run_promote(cursor):
+    result = promote_items(cursor)
+    print(f"Promoted itemtesting into item: {result.inserted} inserted, "
+          f"{result.updated} updated, {result.unchanged} unchanged")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse PCGen LST files into the itemtesting table")
+    parser.add_argument("command", nargs="?", default="ingest", choices=["ingest", "apply-decisions", "promote"],
+                        help="ingest: parse, load and deduplicate (default); "
+                             "apply-decisions: apply an edited --decisions-file; "
+                             "promote: merge the deduplicated itemtesting rows into item, keeping item ids")
+    parser.add_argument("--bulk", action="store_true",
+                        help="Stream items with COPY FROM STDIN instead of one INSERT per item")
+    parser.add_argument("--buffer-size", type=int, default=DEFAULT_BUFFER_SIZE,
+                        help="Bytes of COPY data to buffer before each flush (with --bulk)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of processes used to parse LST files in parallel")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="Files (or COPY batches) each pipeline stage may run ahead of the next")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only parse files that changed since the last run (tracked in lst_manifest)")
+    parser.add_argument("--sync", action="store_true",
+                        help="Compare per-row content hashes with the rows already stored for each parsed file "
+                             "and only insert, update or delete the rows that changed (implied by --incremental)")
+    parser.add_argument("--resolve", action="store_true",
+                        help="Resolve .COPY/.MOD/.FORGET lines across the whole tree so derived items "
+                             "inherit COST/WT/TYPE from their base items")
+    parser.add_argument("--decisions-file",
+                        help="Write unresolved dedup conflicts to this JSON file instead of prompting "
+                             "(and read it back with apply-decisions)")
+    parser.add_argument("--report",
+                        help="Write a JSON report of per-stage timings, counters, throughput and the slowest "
+                             "files to this path")
+    parser.add_argument("--profile",
+                        help="File listing the PCGen sources to ingest (CAMPAIGN names or .pcc file names, "
+                             "one per line); only the item LST files their .pcc files reference are parsed "
+                             "and dedup priority comes from their BOOKTYPE/RANK")
+    args = parser.parse_args()
+
+    if args.command == "apply-decisions" and not args.decisions_file:
+        parser.error("apply-decisions requires --decisions-file")
+
     lst_directory = "../../itemsnew"  # Replace with your actual directory path
 
+    selection = None
+    if args.profile and args.command == "ingest":
+        try:
+            selection = load_source_selection(args.profile, lst_directory, get_source_priority)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+
     # Database connection parameters
     db_params = {
         'dbname': 'loot_tracking',
@@ -397,46 +909,42 @@ if __name__ == "__main__":
         'password': os.getenv('DB_PASSWORD'),
         'host': 'localhost'
     }
-    
+
     # Validate required environment variables
     if not db_params['password']:
         print("Error: DB_PASSWORD environment variable is not set")
         sys.exit(1)
 
     # Establish database connection
+    connection = None
     try:
         connection = psycopg2.connect(**db_params)
         print("Connected to the database successfully.")
 
-        # Process the directory and insert data
         cursor = connection.cursor()
-        total_items_processed = 0
-        total_items_with_cl = 0
-
-        for root, _, files in os.walk(lst_directory):
-            for file in files:
-                if file.endswith('.lst') and is_relevant_file(file):
-                    file_path = os.path.join(root, file)
-                    items_processed, items_with_cl = process_lst_file(file_path, cursor)
-                    total_items_processed += items_processed
-                    total_items_with_cl += items_with_cl
-
-        print("\nProcessing Summary:")
-        print(f"Total items processed: {total_items_processed}")
-        print(f"Total items with caster level: {total_items_with_cl}")
-
-        # Perform deduplication
-        print("\nPerforming deduplication...")
-        deduplicated_count = deduplicate_items(cursor)
-        print(f"Deduplication complete. {deduplicated_count} duplicate rows removed.")
+        if args.command == "apply-decisions":
+            apply_decisions(cursor, args.decisions_file)
+        elif args.command == "promote":
+            run_promote(cursor)
+        else:
+            run_ingest(cursor, args, lst_directory, selection)
 
         connection.commit()
         cursor.close()
 
-        print("Data processing, insertion, and deduplication completed.")
+        if args.command == "apply-decisions":
+            print("Conflict decisions applied.")
+        elif args.command == "promote":
+            print("Item catalog promoted.")
+        else:
+            print("Data processing, insertion, and deduplication completed.")
     except psycopg2.Error as e:
         print(f"Unable to connect to the database: {e}")
     finally:
         if connection:
             connection.close()
-            print("Database connection closed.")
\ No newline at end of file
+            print("Database connection closed.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import os
+import sys
+import argparse
+import psycopg2
+
+import lstreaderandinput as items
+import lstspellsgrab as spells
+import itemsearch
+from lstcopy import DEFAULT_BUFFER_SIZE
+from lstindex import DEFAULT_INDEX_PATH, add_file_entries, tree_fingerprint, write_index
+from lstrowsync import RowSync
+from lststats import RunStats
+from lstwalk import LstWalker
+
+
+def run_refresh(cursor, args, lst_directory):
+    # One walk of the tree: item files feed the item ingester and the name
+    # index, spell files feed the spell ingester; each file is read once.
+    stats = RunStats('lstrefresh')
+    walker = LstWalker(lst_directory, stats=stats)
+    totals = {'items': 0, 'items_with_cl': 0, 'spells': 0}
+    index_entries = {}
+    sync = RowSync(cursor, 'itemtesting', items.ITEM_COLUMNS, 'lstsource', args.buffer_size) if args.sync else None
+    loader = items.create_item_loader(cursor, args.buffer_size) if args.bulk and not sync else None
+    spell_loader = spells.SpellLoader(cursor, buffer_size=args.buffer_size)
+
+    def consume_items(file_path, lines):
+        if sync:
+            parsed, items_processed, items_with_cl = items.parse_lst_lines(file_path, lines)
+            sync.add_file(file_path, parsed)
+            items.print_file_summary(file_path, items_processed, items_with_cl)
+        else:
+            items_processed, items_with_cl = items.ingest_lst_lines(file_path, lines, cursor, loader)
+        totals['items'] += items_processed
+        totals['items_with_cl'] += items_with_cl
+        stats.count(lines_items=items_processed, items_with_cl=items_with_cl)
+
+    def consume_spells(file_path, lines):
+        spells_processed = spells.process_spell_lines(file_path, lines, spell_loader)
+        totals['spells'] += spells_processed
+        stats.count(lines_spells=spells_processed)
+
+    def consume_index(file_path, lines):
+        add_file_entries(index_entries, file_path, lines, itemsearch.extract_item_info)
+
+    def finish_index():
+        fingerprint = tree_fingerprint(walker.file_paths['index'], lst_directory)
+        write_index(args.index, fingerprint, index_entries)
+        print(f"Indexed {len(index_entries)} item names into {args.index}")
+
+    finish_items = sync.apply if sync else loader.flush if loader else None
+    walker.register('items', items.is_relevant_file, consume_items, finish=finish_items)
+    walker.register('spells', spells.is_relevant_file, consume_spells, finish=spell_loader.finish)
+    if not args.no_index:
+        walker.register('index', itemsearch.is_relevant_file, consume_index, finish=finish_index)
+
+    walker.run()
+
+    print("\nRefresh Summary:")
+    print(f"LST files read: {walker.files_read}")
+    print(f"Total items processed: {totals['items']}")
+    print(f"Total items with caster level: {totals['items_with_cl']}")
+    print(f"Total spells processed: {totals['spells']}")
+    print(f"Spells inserted: {spell_loader.inserted}, updated: {spell_loader.updated}, "
+          f"deleted: {spell_loader.deleted}")
+    if loader:
+        print(f"Rows copied: {loader.rows_written} in {loader.flushes} COPY batches")
+    if sync:
+        print(f"Row sync: {sync.inserted} inserted, {sync.updated} updated, "
+              f"{sync.deleted} deleted, {sync.unchanged} unchanged, {sync.suppressed} kept out by dedup")
+
+    print("\nPerforming deduplication...")
+    with stats.phase('dedup'):
+        deduplicated_count = items.deduplicate_items(cursor, args.decisions_file, stats=stats,
+                                                     changed_names=sync.changed_names if sync else None)
+    print(f"Deduplication complete. {deduplicated_count} duplicate rows removed.")
+
+    if loader:
+        stats.count(rows_written=loader.rows_written)
+    if sync:
+        stats.count(sync_inserted=sync.inserted, sync_updated=sync.updated, sync_deleted=sync.deleted,
+                    sync_unchanged=sync.unchanged, sync_suppressed=sync.suppressed)
+    stats.count(spells_inserted=spell_loader.inserted, spells_updated=spell_loader.updated,
+                spells_deleted=spell_loader.deleted)
+    stats.print_summary()
+    if args.report:
+        stats.write_report(args.report)
+        print(f"Wrote run report to {args.report}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Full LST refresh: items, spells and the itemsearch name index from one walk of the tree")
+    parser.add_argument("--bulk", action="store_true",
+                        help="Stream items with COPY FROM STDIN instead of one INSERT per item")
+    parser.add_argument("--buffer-size", type=int, default=DEFAULT_BUFFER_SIZE,
+                        help="Bytes of COPY data to buffer before each flush (with --bulk)")
+    parser.add_argument("--sync", action="store_true",
+                        help="Only insert, update or delete the item rows whose content hash changed")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH,
+                        help="Path of the itemsearch name index to rebuild")
+    parser.add_argument("--no-index", action="store_true", help="Do not rebuild the name index")
+    parser.add_argument("--decisions-file",
+                        help="Write unresolved dedup conflicts to this JSON file instead of prompting")
+    parser.add_argument("--report",
+                        help="Write a JSON report of per-stage timings, counters, throughput and the slowest "
+                             "files to this path")
+    args = parser.parse_args()
+
+    lst_directory = "../../itemsnew"  # Replace with your actual directory path
+
+    # Database connection parameters
+    db_params = {
+        'dbname': 'loot_tracking',
+        'user': 'loot_user',
+        'password': os.getenv('DB_PASSWORD'),
+        'host': 'localhost'
+    }
+
+    # Validate required environment variables
+    if not db_params['password']:
+        print("Error: DB_PASSWORD environment variable is not set")
+        sys.exit(1)
+
+    # Establish database connection
+    connection = None
+    try:
+        connection = psycopg2.connect(**db_params)
+        print("Connected to the database successfully.")
+
+        cursor = connection.cursor()
+        run_refresh(cursor, args, lst_directory)
+
+        connection.commit()
+        cursor.close()
+
+        print("LST refresh completed.")
+    except ValueError as e:
+        # Schema check failed before anything was parsed
+        print(f"Error: {e}")
+    except psycopg2.Error as e:
+        print(f"Unable to connect to the database: {e}")
+    finally:
+        if connection:
+            connection.close()
+            print("Database connection closed.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Row-level sync for re-ingesting LST data.
+
+Every synced row carries its provenance and a content hash:
+
+    line_key      the row's name within its source file, "Name#2" for the
+                  second row of that name in the same file
+    content_hash  blake2b of the row's normalized column values
+
+A re-ingest stages the freshly parsed rows with COPY and compares them with
+the rows already stored for the same source files: rows whose (source,
+line_key) is new are inserted, rows whose hash differs are updated, rows that
+no longer appear are deleted and everything else is left untouched, so an
+unchanged row costs no write (and no WAL) at all.
+
+Rows that deduplication removes are moved to `<table>_removed` with their key
+and hash. A staged row whose (source, line_key, content_hash) is recorded
+there is not inserted again; once the row changes or leaves its file the
+record is dropped and the row is synced like any other. Because a removal
+depends on the rest of its name group, the sync reports the names it touched
+and restore_removed_rows brings their removed rows back for dedup to rank
+again, as a full ingest would.
+"""
+
+import hashlib
+from psycopg2 import sql
+
+from lstcopy import CopyLoader, DEFAULT_BUFFER_SIZE, format_copy_row
+
+
+def content_hash(values):
+    # The COPY text form is the normalization: None, numbers and arrays
+    # hash exactly as they are written to the table
+    return hashlib.blake2b(format_copy_row(values).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def assign_line_keys(names):
+    seen = {}
+    for name in names:
+        seen[name] = seen.get(name, 0) + 1
+        yield name if seen[name] == 1 else f"{name}#{seen[name]}"
+
+
+def ensure_row_key_columns(cursor, table, source_column):
+    cursor.execute(sql.SQL("""
+        ALTER TABLE {table}
+            ADD COLUMN IF NOT EXISTS line_key VARCHAR(512),
+            ADD COLUMN IF NOT EXISTS content_hash CHAR(32);
+        CREATE INDEX IF NOT EXISTS {index} ON {table} ({source}, line_key);
+    """).format(table=sql.Identifier(table),
+                index=sql.Identifier(f"{table}_{source_column}_line_key_idx"),
+                source=sql.Identifier(source_column)))
+
+
+def removed_table(table):
+    return f"{table}_removed"
+
+
+def ensure_removed_table(cursor, table, columns, source_column):
+    ensure_row_key_columns(cursor, table, source_column)
+    removed = removed_table(table)
+    cursor.execute(sql.SQL("""
+        CREATE TABLE IF NOT EXISTS {removed} AS
+            SELECT {columns}, line_key, content_hash FROM {table} WITH NO DATA;
+        ALTER TABLE {removed}
+            ADD COLUMN IF NOT EXISTS reason VARCHAR(15),
+            ADD COLUMN IF NOT EXISTS removed_at TIMESTAMP NOT NULL DEFAULT NOW();
+        CREATE UNIQUE INDEX IF NOT EXISTS {index} ON {removed} ({source}, line_key, content_hash);
+    """).format(removed=sql.Identifier(removed), table=sql.Identifier(table),
+                index=sql.Identifier(f"{removed}_key_idx"), source=sql.Identifier(source_column),
+                columns=sql.SQL(', ').join(sql.Identifier(column) for column in columns)))
+
+
+def remove_rows(cursor, table, columns, source_column, ids, reason):
+    """Delete rows by id, recording the keyed ones in <table>_removed; returns the rows deleted."""
+    if not ids:
+        return 0
+    columns = sql.SQL(', ').join(sql.Identifier(column) for column in columns)
+    cursor.execute(sql.SQL("""
+        WITH removed AS (
+            DELETE FROM {table} WHERE id = ANY(%s)
+            RETURNING {columns}, line_key, content_hash
+        ),
+        recorded AS (
+            INSERT INTO {removed} ({columns}, line_key, content_hash, reason)
+            SELECT {columns}, line_key, content_hash, %s FROM removed
+            WHERE line_key IS NOT NULL AND content_hash IS NOT NULL
+            ON CONFLICT ({source}, line_key, content_hash) DO UPDATE
+            SET reason = EXCLUDED.reason, removed_at = NOW()
+        )
+        SELECT COUNT(*) FROM removed
+    """).format(table=sql.Identifier(table), removed=sql.Identifier(removed_table(table)),
+                source=sql.Identifier(source_column), columns=columns), (list(ids), reason))
+    return cursor.fetchone()[0]
+
+
+def restore_removed_rows(cursor, table, columns, names):
+    """Move the removed rows of the given names (first column) back into table; returns the rows restored."""
+    if not names:
+        return 0
+    columns_sql = sql.SQL(', ').join(sql.Identifier(column) for column in columns)
+    cursor.execute(sql.SQL("""
+        WITH restored AS (
+            DELETE FROM {removed} WHERE {name} = ANY(%s)
+            RETURNING {columns}, line_key, content_hash
+        )
+        INSERT INTO {table} ({columns}, line_key, content_hash)
+        SELECT {columns}, line_key, content_hash FROM restored
+    """).format(table=sql.Identifier(table), removed=sql.Identifier(removed_table(table)),
+                name=sql.Identifier(columns[0]), columns=columns_sql), (list(names),))
+    return cursor.rowcount
+
+
+class RowSync:
+    """Stages parsed rows per source file and applies only the differences to `table`."""
+
+    def __init__(self, cursor, table, columns, source_column, buffer_size=DEFAULT_BUFFER_SIZE):
+        self.cursor = cursor
+        self.table = table
+        self.columns = tuple(columns)
+        self.source_column = source_column
+        self.inserted = 0
+        self.updated = 0
+        self.deleted = 0
+        self.unchanged = 0
+        self.suppressed = 0
+        # Names of rows inserted, updated or deleted, or whose removal record was dropped
+        self.changed_names = set()
+        self._source_position = self.columns.index(source_column)
+        self._sources = []
+        self._staged = 0
+
+        ensure_removed_table(cursor, table, self.columns, source_column)
+        self._stage = f"{table}_sync_stage"
+        cursor.execute(sql.SQL("""
+            DROP TABLE IF EXISTS {stage};
+            CREATE TEMP TABLE {stage} AS
+                SELECT {columns}, line_key, content_hash FROM {table} WITH NO DATA;
+        """).format(stage=sql.Identifier(self._stage), table=sql.Identifier(table),
+                    columns=sql.SQL(', ').join(sql.Identifier(column) for column in self.columns)))
+        self.loader = CopyLoader(cursor, self._stage, self.columns + ('line_key', 'content_hash'), buffer_size)
+
+    def add_file(self, source, rows):
+        """Stage every row parsed from one source; the source's stored rows are synced against them."""
+        self._sources.append(source)
+        rows = list(rows)
+        names = (row[0] for row in rows)
+        for row, line_key in zip(rows, assign_line_keys(names)):
+            values = tuple(value for position, value in enumerate(row) if position != self._source_position)
+            self.loader.add(tuple(row) + (line_key, content_hash(values)))
+            self._staged += 1
+
+    def apply(self):
+        self.loader.flush()
+        if not self._sources:
+            return
+
+        table = sql.Identifier(self.table)
+        removed = sql.Identifier(removed_table(self.table))
+        stage = sql.Identifier(self._stage)
+        source = sql.Identifier(self.source_column)
+        columns = sql.SQL(', ').join(sql.Identifier(column) for column in self.columns)
+        values = [column for column in self.columns if column != self.source_column]
+        name = sql.Identifier(self.columns[0])
+        match = sql.SQL("s.{source} = t.{source} AND s.line_key = t.line_key").format(source=source)
+
+        self.deleted += self._write(sql.SQL("""
+            DELETE FROM {table} t
+            WHERE t.{source} = ANY(%s)
+              AND NOT EXISTS (SELECT 1 FROM {stage} s WHERE {match})
+            RETURNING t.{name}
+        """).format(table=table, stage=stage, source=source, match=match, name=name), (self._sources,))
+        written = 0
+
+        # Removal records only hold while their row is still in the file unchanged
+        self._write(sql.SQL("""
+            DELETE FROM {removed} r
+            WHERE r.{source} = ANY(%s)
+              AND NOT EXISTS (SELECT 1 FROM {stage} s WHERE {match} AND s.content_hash = r.content_hash)
+            RETURNING r.{name}
+        """).format(removed=removed, stage=stage, source=source, name=name,
+                    match=sql.SQL("s.{source} = r.{source} AND s.line_key = r.line_key").format(source=source)),
+            (self._sources,))
+
+        updated = self._write(sql.SQL("""
+            UPDATE {table} t
+            SET ({columns}) = ({staged})
+            FROM {stage} s
+            WHERE {match} AND t.content_hash IS DISTINCT FROM s.content_hash
+            RETURNING t.{name}
+        """).format(table=table, stage=stage, match=match, name=name,
+                    columns=sql.SQL(', ').join(sql.Identifier(column) for column in values + ['content_hash']),
+                    staged=sql.SQL(', ').join(sql.SQL('s.') + sql.Identifier(column)
+                                              for column in values + ['content_hash'])))
+        self.updated += updated
+        written += updated
+
+        inserted = self._write(sql.SQL("""
+            INSERT INTO {table} ({columns}, line_key, content_hash)
+            SELECT {columns}, line_key, content_hash FROM {stage} s
+            WHERE NOT EXISTS (SELECT 1 FROM {table} t WHERE {match})
+              AND NOT EXISTS (SELECT 1 FROM {removed} r
+                              WHERE r.{source} = s.{source} AND r.line_key = s.line_key
+                                AND r.content_hash = s.content_hash)
+            RETURNING {name}
+        """).format(table=table, stage=stage, removed=removed, source=source, columns=columns, match=match,
+                    name=name))
+        self.inserted += inserted
+        written += inserted
+
+        self.cursor.execute(sql.SQL("""
+            SELECT COUNT(*) FROM {stage} s
+            JOIN {removed} r ON r.{source} = s.{source} AND r.line_key = s.line_key
+                            AND r.content_hash = s.content_hash
+        """).format(stage=stage, removed=removed, source=source))
+        suppressed = self.cursor.fetchone()[0]
+        self.suppressed += suppressed
+
+        self.unchanged += self._staged - written - suppressed
+        self.cursor.execute(sql.SQL("TRUNCATE {}").format(stage))
+        self._sources = []
+        self._staged = 0
+
+    def _write(self, query, params=None):
+        # Every write returns the names it touched, so dedup can revisit those name groups
+        self.cursor.execute(query, params)
+        names = self.cursor.fetchall()
+        self.changed_names.update(row[0] for row in names)
+        return len(names)
+
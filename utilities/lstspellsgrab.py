@@ -1,8 +1,27 @@
 import os
 import re
+import time
+import argparse
 import psycopg2
 from psycopg2 import sql
 import sys
+from lstcopy import CopyLoader, DEFAULT_BUFFER_SIZE
+from lstrowsync import content_hash
+from lsttokenizer import tokenize_line
+from lstmanifest import prepare_incremental_run, record_files
+from lstmmap import iter_candidate_lines
+from lstwalk import find_lst_files as walk_lst_files
+from lstpipeline import Pipeline, DEFAULT_QUEUE_SIZE
+from lststats import RunStats
+
+CLASS_LEVEL_PATTERN = re.compile(r'=(\d+)')
+
+SPELL_COLUMNS = ('name', 'type', 'school', 'subschool', 'class', 'domain', 'mincasterlevel', 'spelllevel', 'item',
+                 'source', 'content_hash')
+# Written only when the target table has them; database/init.sql has no mincasterlevel
+# and content_hash comes with migration 057
+OPTIONAL_SPELL_COLUMNS = {'mincasterlevel', 'content_hash'}
+DEFAULT_BATCH_SIZE = 5000
 
 def is_relevant_file(filename):
     return 'spells' in filename.lower()
@@ -10,59 +29,268 @@ def is_relevant_file(filename):
 def is_spell_line(line):
     return not line.startswith('#') and '\t' in line
 
+def parse_class_levels(classes):
+    # CLASSES:Bard=2|Cleric,Sorcerer,Wizard=3 -> {'Bard': 2, 'Cleric': 3, 'Sorcerer': 3, 'Wizard': 3}
+    # Groups without a level (.CLEAR) are skipped; a class listed twice keeps its lowest level
+    class_levels = {}
+    for group in classes.split('|'):
+        match = CLASS_LEVEL_PATTERN.search(group)
+        if not match:
+            continue
+        level = int(match.group(1))
+        for class_name in group[:match.start()].split(','):
+            class_name = class_name.strip()
+            if class_name:
+                class_levels[class_name] = min(level, class_levels.get(class_name, level))
+    return class_levels
+
 def extract_spell_info(line, lstsource):
-    parts = line.split('\t')
-    name = parts[0].strip()
+    record = tokenize_line(line)
+    name = record.name
+
+    spell_type = record.get('TYPE') or None
+    school = record.get('SCHOOL') or None
+    subschool = record.get('SUBSCHOOL') or None
+    classes = record.get_list('CLASSES')
+    domain = record.get('DOMAINS') or None
+    mincasterlevel = record.get('CASTERLEVEL') or None
+    items = record.get_list('ITEM')
+    class_levels = parse_class_levels(record.get('CLASSES') or '')
+    spelllevel = min(class_levels.values()) if class_levels else None
+
+    spell_info = (name, spell_type, school, subschool, classes, domain, mincasterlevel, spelllevel, items, lstsource)
+    return spell_info, class_levels
+
+def fetch_table_columns(cursor, table):
+    cursor.execute("""
+        SELECT column_name
+        FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = %s
+    """, (table,))
+    return {row[0] for row in cursor.fetchall()}
+
+def resolve_spell_columns(cursor):
+    """Check the target schema once; return the SPELL_COLUMNS present and whether spell_class_level exists."""
+    existing = fetch_table_columns(cursor, 'spells')
+    missing = [column for column in SPELL_COLUMNS if column not in existing and column not in OPTIONAL_SPELL_COLUMNS]
+    if missing:
+        raise ValueError(f"spells table is missing column(s): {', '.join(missing)}")
+    skipped = [column for column in SPELL_COLUMNS if column not in existing]
+    if skipped:
+        print(f"spells has no {', '.join(skipped)} column; those values are not written")
+
+    with_class_levels = bool(fetch_table_columns(cursor, 'spell_class_level'))
+    if not with_class_levels:
+        print("spell_class_level does not exist (migration 056); class levels are not written")
+    return tuple(column for column in SPELL_COLUMNS if column in existing), with_class_levels
+
+class SpellLoader:
+    """Streams spells into temp staging tables with COPY and upserts them on (name, source).
+
+    spells has no unique constraint on (name, source), so every batch is merged
+    with one UPDATE of the existing rows that changed and one INSERT of the new
+    ones; the spell_class_level rows of those changed or new spells are then
+    replaced. Unchanged spells are not written at all: with the content_hash
+    column a row counts as changed when its hash differs, without it when any
+    value differs. Within a batch the last line for a (name, source) wins.
+
+    finish() also deletes the stored spells of every file passed to
+    start_file() that no longer appear in it, except spells a generated
+    spellbook still references.
+    """
+
+    def __init__(self, cursor, batch_size=DEFAULT_BATCH_SIZE, buffer_size=DEFAULT_BUFFER_SIZE):
+        self.cursor = cursor
+        self.batch_size = batch_size
+        self.columns, self.with_class_levels = resolve_spell_columns(cursor)
+        self.inserted = 0
+        self.updated = 0
+        self.deleted = 0
+        self.batches = 0
+        self.sources = []
+        self._protect_spellbooks = bool(fetch_table_columns(cursor, 'spellbook_spell'))
+        self._positions = [SPELL_COLUMNS.index(column) for column in self.columns]
+        self._seq = 0
+        self._batch_rows = 0
 
-    type_match = re.search(r'TYPE:([^\t]+)', line)
-    spell_type = type_match.group(1) if type_match else None
+        columns = sql.SQL(', ').join(sql.Identifier(column) for column in self.columns)
+        cursor.execute(sql.SQL("""
+            DROP TABLE IF EXISTS spell_stage, spell_class_level_stage, spell_changed, spell_seen;
+            CREATE TEMP TABLE spell_stage AS SELECT 0::BIGINT AS seq, {columns} FROM spells WITH NO DATA;
+            CREATE TEMP TABLE spell_class_level_stage (seq BIGINT, class VARCHAR(63), level SMALLINT);
+            CREATE TEMP TABLE spell_changed (seq BIGINT, spell_id INTEGER);
+            CREATE TEMP TABLE spell_seen AS SELECT name, source FROM spells WITH NO DATA;
+        """).format(columns=columns))
+        self.spells = CopyLoader(cursor, 'spell_stage', ('seq',) + self.columns, buffer_size)
+        self.class_levels = CopyLoader(cursor, 'spell_class_level_stage', ('seq', 'class', 'level'), buffer_size)
+        self._merge_queries = self._build_merge_queries()
 
-    school_match = re.search(r'SCHOOL:([^\t]+)', line)
-    school = school_match.group(1) if school_match else None
+    def _build_merge_queries(self):
+        values = [column for column in self.columns if column not in ('name', 'source')]
+        compared = ['content_hash'] if 'content_hash' in self.columns else values
+        target = sql.SQL(', ').join(sql.SQL('s.') + sql.Identifier(column) for column in compared)
+        compared_staged = sql.SQL(', ').join(sql.SQL('st.') + sql.Identifier(column) for column in compared)
+        staged = sql.SQL(', ').join(sql.SQL('st.') + sql.Identifier(column) for column in values)
+        columns = sql.SQL(', ').join(sql.Identifier(column) for column in self.columns)
 
-    subschool_match = re.search(r'SUBSCHOOL:([^\t]+)', line)
-    subschool = subschool_match.group(1) if subschool_match else None
+        dedupe = sql.SQL("""
+            DELETE FROM spell_stage st
+            USING spell_stage newer
+            WHERE newer.name = st.name AND newer.source = st.source AND newer.seq > st.seq
+        """)
+        # Ids of updated and inserted spells go to spell_changed, so only their
+        # class levels are rewritten. ROW() keeps the SET valid for a single column.
+        update = sql.SQL("""
+            WITH updated AS (
+                UPDATE spells s
+                SET ({values}) = ROW({staged})
+                FROM spell_stage st
+                WHERE s.name = st.name AND s.source = st.source
+                  AND ROW({target}) IS DISTINCT FROM ROW({compared_staged})
+                RETURNING st.seq, s.id
+            )
+            INSERT INTO spell_changed (seq, spell_id) SELECT seq, id FROM updated
+        """).format(values=sql.SQL(', ').join(sql.Identifier(column) for column in values),
+                    target=target, staged=staged, compared_staged=compared_staged)
+        insert = sql.SQL("""
+            WITH inserted AS (
+                INSERT INTO spells ({columns})
+                SELECT {columns} FROM spell_stage st
+                WHERE NOT EXISTS (SELECT 1 FROM spells s WHERE s.name = st.name AND s.source = st.source)
+                ORDER BY st.seq
+                RETURNING id, name, source
+            )
+            INSERT INTO spell_changed (seq, spell_id)
+            SELECT st.seq, i.id FROM inserted i JOIN spell_stage st ON st.name = i.name AND st.source = i.source
+        """).format(columns=columns)
+        return dedupe, update, insert
 
-    classes_match = re.search(r'CLASSES:([^\t]+)', line)
-    classes = classes_match.group(1).split(',') if classes_match else []
+    def start_file(self, source):
+        self.sources.append(source)
 
-    domains_match = re.search(r'DOMAINS:([^\t]+)', line)
-    domain = domains_match.group(1) if domains_match else None
+    def add(self, spell_info, class_levels):
+        self._seq += 1
+        # spell_info ends with source; the hash covers every other value
+        spell_info = spell_info + (content_hash(spell_info[:-1]),)
+        self.spells.add((self._seq,) + tuple(spell_info[position] for position in self._positions))
+        if self.with_class_levels:
+            self.class_levels.add_many((self._seq, class_name, level) for class_name, level in class_levels.items())
+        self._batch_rows += 1
+        if self._batch_rows >= self.batch_size:
+            self.flush()
 
-    casterlevel_match = re.search(r'CASTERLEVEL:([^\t]+)', line)
-    mincasterlevel = casterlevel_match.group(1) if casterlevel_match else None
+    def flush(self):
+        if not self._batch_rows:
+            return
+        self.spells.flush()
+        self.class_levels.flush()
 
-    item_match = re.search(r'ITEM:([^\t]+)', line)
-    items = item_match.group(1).split(',') if item_match else []
+        dedupe, update, insert = self._merge_queries
+        self.cursor.execute(dedupe)
+        self.cursor.execute(update)
+        self.updated += self.cursor.rowcount
+        self.cursor.execute(insert)
+        self.inserted += self.cursor.rowcount
 
-    return (name, spell_type, school, subschool, classes, domain, mincasterlevel, items, lstsource)
+        if self.with_class_levels:
+            self.cursor.execute("""
+                DELETE FROM spell_class_level scl
+                USING spell_changed c
+                WHERE scl.spell_id = c.spell_id
+            """)
+            self.cursor.execute("""
+                INSERT INTO spell_class_level (spell_id, class, level)
+                SELECT c.spell_id, l.class, l.level
+                FROM spell_changed c
+                JOIN spell_class_level_stage l ON l.seq = c.seq
+                ON CONFLICT (spell_id, class) DO UPDATE SET level = EXCLUDED.level
+            """)
 
-def insert_spell(cursor, spell_info):
-    insert_query = sql.SQL("""
-        INSERT INTO spells (name, type, school, subschool, class, domain, mincasterlevel, item, source)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-    """)
-    cursor.execute(insert_query, spell_info)
+        self.cursor.execute("INSERT INTO spell_seen SELECT name, source FROM spell_stage")
+        self.cursor.execute("TRUNCATE spell_stage, spell_class_level_stage, spell_changed")
+        self.batches += 1
+        self._batch_rows = 0
 
-def process_lst_file(file_path, cursor):
-    total_spells = 0
+    def finish(self):
+        self.flush()
+        if not self.sources:
+            return
+        protect = "AND NOT EXISTS (SELECT 1 FROM spellbook_spell b WHERE b.spell_id = s.id)" \
+            if self._protect_spellbooks else ""
+        self.cursor.execute(f"""
+            DELETE FROM spells s
+            WHERE s.source = ANY(%s)
+              AND NOT EXISTS (SELECT 1 FROM spell_seen x WHERE x.name = s.name AND x.source = s.source)
+              {protect}
+        """, (self.sources,))
+        self.deleted += self.cursor.rowcount
+        self.sources = []
+
+def process_lst_file(file_path, loader):
+    return process_spell_lines(file_path, iter_candidate_lines(file_path, ['\t']), loader)
+
+def process_spell_lines(file_path, lines, loader):
+    return load_spells(file_path, extract_spells(file_path, lines), loader)
+
+def extract_spells(file_path, lines):
     lstsource = file_path
+    return [extract_spell_info(line, lstsource) for line in lines if is_spell_line(line)]
 
-    with open(file_path, 'r', encoding='utf-8', errors='ignore') as file:
-        for line in file:
-            line = line.strip()
-            if is_spell_line(line):
-                total_spells += 1
-                spell_info = extract_spell_info(line, lstsource)
-                insert_spell(cursor, spell_info)
+def load_spells(file_path, spells, loader, stats=None):
+    start = time.perf_counter()
+    loader.start_file(file_path)
+    for spell_info, class_levels in spells:
+        loader.add(spell_info, class_levels)
+    if stats:
+        # Includes the upserts of the batches this file completed
+        stats.add_file('write', file_path, time.perf_counter() - start, rows_written=len(spells))
 
     print(f"File: {file_path}")
-    print(f"Total spells processed: {total_spells}")
+    print(f"Total spells processed: {len(spells)}")
     print("--------------------")
 
-    return total_spells
+    return len(spells)
+
+def read_spell_files(file_paths, stats):
+    for file_path in file_paths:
+        start = time.perf_counter()
+        lines = list(iter_candidate_lines(file_path, ['\t']))
+        stats.add_file('read', file_path, time.perf_counter() - start,
+                       bytes_read=os.path.getsize(file_path), lines_scanned=len(lines))
+        yield file_path, lines
+
+def parse_spell_files(files, stats):
+    for file_path, lines in files:
+        start = time.perf_counter()
+        spells = extract_spells(file_path, lines)
+        stats.add_file('parse', file_path, time.perf_counter() - start,
+                       lines_spells=len(spells), lines_rejected=len(lines) - len(spells))
+        yield file_path, spells
+
+def build_spell_pipeline(file_paths, queue_size=DEFAULT_QUEUE_SIZE, stats=None):
+    # walk -> read -> parse (tokenize and classify) on their own threads; batching
+    # and writing stay in SpellLoader on the thread that owns the cursor
+    stats = stats or RunStats('spells')
+    pipeline = Pipeline('walk', file_paths, queue_size)
+    pipeline.add_stage('read', lambda files: read_spell_files(files, stats))
+    return pipeline.add_stage('parse', lambda files: parse_spell_files(files, stats))
+
+def find_lst_files(lst_directory):
+    return walk_lst_files(lst_directory, is_relevant_file)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parse PCGen LST spell files into the spells table")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only parse files that changed since the last run (tracked in lst_manifest)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Spells staged with COPY before each upsert into spells")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="Files each pipeline stage may run ahead of the next")
+    parser.add_argument("--report",
+                        help="Write a JSON report of per-stage timings, counters, throughput and the slowest "
+                             "files to this path")
+    args = parser.parse_args()
+
     lst_directory = "../../itemsnew"  # Replace with your actual directory path
 
     # Database connection parameters
@@ -79,23 +307,53 @@ if __name__ == "__main__":
         sys.exit(1)
 
     # Establish database connection
+    connection = None
     try:
         connection = psycopg2.connect(**db_params)
         print("Connected to the database successfully.")
 
         # Process the directory and insert data
         cursor = connection.cursor()
+        try:
+            loader = SpellLoader(cursor, args.batch_size)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+
+        stats = RunStats('lstspellsgrab')
         total_spells_processed = 0
+        file_paths = list(find_lst_files(lst_directory))
+
+        changes = None
+        if args.incremental:
+            with stats.phase('manifest'):
+                changes = prepare_incremental_run(cursor, 'spells', file_paths)
+            file_paths = [state.path for state in changes.changed]
+            # A deleted file loads no spells, so finish() removes its spells except
+            # the ones a spellbook still references
+            for file_path in changes.deleted:
+                loader.start_file(file_path)
+
+        pipeline = build_spell_pipeline(file_paths, args.queue_size, stats)
+        for file_path, spells in pipeline.run():
+            total_spells_processed += load_spells(file_path, spells, loader, stats)
+        stats.add_pipeline(pipeline, consumer='write')
+        with stats.phase('finish'):
+            loader.finish()
+        stats.count(spells_inserted=loader.inserted, spells_updated=loader.updated, spells_deleted=loader.deleted)
 
-        for root, _, files in os.walk(lst_directory):
-            for file in files:
-                if file.endswith('.lst') and is_relevant_file(file):
-                    file_path = os.path.join(root, file)
-                    spells_processed = process_lst_file(file_path, cursor)
-                    total_spells_processed += spells_processed
+        if changes:
+            with stats.phase('manifest'):
+                record_files(cursor, 'spells', changes.changed)
 
         print("\nProcessing Summary:")
         print(f"Total spells processed: {total_spells_processed}")
+        print(f"Spells inserted: {loader.inserted}, updated: {loader.updated}, deleted: {loader.deleted} "
+              f"({loader.batches} batches)")
+        stats.print_summary()
+        if args.report:
+            stats.write_report(args.report)
+            print(f"Wrote run report to {args.report}")
 
         connection.commit()
         cursor.close()
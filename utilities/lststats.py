@@ -0,0 +1,160 @@
+"""
+Per-stage counters and timers for one LST ingestion run, and its JSON report.
+
+The stage functions of the ingesters add, per file, the seconds they spent and
+what they saw (bytes read, lines scanned, items, rejects, rows written, ...);
+run phases on the main thread (flush, dedup) are timed with phase(). Pipeline
+queue waits come from add_pipeline(). The report then shows per stage how
+long it was busy and how long it waited for its neighbours: the stage with
+the most busy time is the bottleneck, whether that is reading (I/O),
+tokenizing/classifying (parsing) or writing (the database).
+
+    stats = RunStats('lstreaderandinput')
+    ...
+    stats.write_report('ingest-report.json')
+"""
+
+import json
+import time
+import threading
+import contextlib
+from collections import Counter
+from datetime import datetime
+
+DEFAULT_SLOWEST_FILES = 10
+
+
+class StageStats:
+    def __init__(self):
+        self.files = 0
+        self.busy = 0.0
+        self.input_wait = 0.0
+        self.output_wait = 0.0
+
+
+class FileStats:
+    def __init__(self):
+        self.seconds = Counter()
+        self.counts = Counter()
+
+
+class RunStats:
+    """Counters and per-stage, per-file timings of one run; safe to update from pipeline threads."""
+
+    def __init__(self, command):
+        self.command = command
+        self.started = datetime.now()
+        self.counters = Counter()
+        self.stages = {}
+        self.files = {}
+        self._start = time.perf_counter()
+        self._end = None
+        self._lock = threading.Lock()
+
+    def _stage(self, name):
+        if name not in self.stages:
+            self.stages[name] = StageStats()
+        return self.stages[name]
+
+    def count(self, **counts):
+        with self._lock:
+            self.counters.update(counts)
+
+    def add_file(self, stage, file_path, seconds, **counts):
+        """Record that stage spent seconds on file_path; counts also add to the run's counters."""
+        with self._lock:
+            stage_stats = self._stage(stage)
+            stage_stats.files += 1
+            stage_stats.busy += seconds
+            file_stats = self.files.get(file_path)
+            if file_stats is None:
+                file_stats = self.files[file_path] = FileStats()
+            file_stats.seconds[stage] += seconds
+            file_stats.counts.update(counts)
+            self.counters.update(counts)
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Time a step that is not per file, such as the final flush or dedup."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            with self._lock:
+                self._stage(name).busy += seconds
+
+    def add_pipeline(self, pipeline, consumer=None):
+        """Add the queue waits of a finished pipeline; consumer names the stage that read run()."""
+        with self._lock:
+            timed_per_file = {stage for file_stats in self.files.values() for stage in file_stats.seconds}
+            for name, timing in pipeline.timings.items():
+                stage_stats = self._stage(name)
+                stage_stats.input_wait += timing.input_wait
+                stage_stats.output_wait += timing.output_wait
+                if name not in timed_per_file:
+                    # Stages that do not time themselves per file (the walk, a process pool)
+                    stage_stats.busy += timing.busy
+            if consumer:
+                self._stage(consumer).input_wait += pipeline.consumer_wait
+
+    def stop(self):
+        """End the run's wall clock here instead of when the report is made."""
+        self._end = time.perf_counter()
+
+    def report(self, slowest=DEFAULT_SLOWEST_FILES):
+        wall = (self._end or time.perf_counter()) - self._start
+        stages = {
+            name: {
+                'files': stage_stats.files,
+                'busy_seconds': round(stage_stats.busy, 3),
+                'input_wait_seconds': round(stage_stats.input_wait, 3),
+                'output_wait_seconds': round(stage_stats.output_wait, 3),
+            }
+            for name, stage_stats in self.stages.items()
+        }
+        slowest_files = sorted(self.files.items(), key=lambda entry: sum(entry[1].seconds.values()), reverse=True)
+
+        def per_second(count):
+            return round(count / wall, 1) if wall else None
+
+        return {
+            'command': self.command,
+            'started': self.started.isoformat(timespec='seconds'),
+            'wall_seconds': round(wall, 3),
+            'counters': dict(self.counters),
+            'throughput': {
+                'bytes_per_second': per_second(self.counters['bytes_read']),
+                'lines_per_second': per_second(self.counters['lines_scanned']),
+                'rows_per_second': per_second(self.counters['rows_written']),
+            },
+            'stages': stages,
+            'bottleneck': max(stages, key=lambda name: stages[name]['busy_seconds']) if stages else None,
+            'slowest_files': [
+                {
+                    'path': file_path,
+                    'seconds': round(sum(file_stats.seconds.values()), 4),
+                    'stages': {stage: round(seconds, 4) for stage, seconds in file_stats.seconds.items()},
+                    'counts': dict(file_stats.counts),
+                }
+                for file_path, file_stats in slowest_files[:slowest]
+            ],
+        }
+
+    def write_report(self, report_path, slowest=DEFAULT_SLOWEST_FILES):
+        report = self.report(slowest)
+        with open(report_path, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+            file.write('\n')
+        return report
+
+    def print_summary(self, slowest=3):
+        report = self.report(slowest)
+        print("\nStage timings (busy / waiting for input / waiting on output):")
+        for name, stage in report['stages'].items():
+            print(f"  {name:<12} {stage['busy_seconds']:8.3f} s / {stage['input_wait_seconds']:8.3f} s "
+                  f"/ {stage['output_wait_seconds']:8.3f} s")
+        if report['bottleneck']:
+            print(f"Bottleneck: {report['bottleneck']}")
+        for entry in report['slowest_files']:
+            print(f"  slow file: {entry['path']} ({entry['seconds']:.3f} s)")
@@ -0,0 +1,148 @@
+"""
+Single-pass tokenizer for PCGen LST lines shared by the LST scripts.
+
+Each line is split on tabs once into an LstRecord keyed by tag, so the
+extractors read fields by name instead of running one regex per field over
+the whole line.
+"""
+
+import re
+
+# Caster level can appear in several free-text forms. The alternatives are
+# listed in priority order and scanned in one pass over the line; the match
+# from the highest-priority alternative wins, as with separate searches.
+CL_PATTERN = re.compile(
+    r'SPROP:[^|]*\|CL(\d+)'
+    r'|CL=(\d+)'
+    r'|CASTER LEVEL=(\d+)'
+    r'|CASTERLEVEL=(\d+)'
+    r'|\bCL\s+(\d+)',
+    re.IGNORECASE
+)
+SPROP_CASTER_LEVEL = 1
+INTEGER_PATTERN = re.compile(r'\d+')
+DECIMAL_PATTERN = re.compile(r'\d+(?:\.\d+)?')
+
+
+class LstRecord:
+    """One tokenized LST line: the name field plus its TAG:value fields."""
+
+    __slots__ = ('name', 'base_name', 'operation', 'copy_name', 'tags', 'fields', 'line')
+
+    def __init__(self, name, tags, fields, line):
+        self.name = name
+        self.tags = tags
+        self.fields = fields
+        self.line = line
+        self.base_name = name
+        self.operation = None
+        self.copy_name = None
+
+        # Name field forms: "Base.COPY=New Name", "Base.MOD", "Base.FORGET"
+        if '.COPY=' in name:
+            self.base_name, self.copy_name = name.split('.COPY=', 1)
+            self.base_name = self.base_name.strip()
+            self.copy_name = self.copy_name.strip()
+            self.operation = 'COPY'
+        elif name.endswith('.MOD') or name.endswith('.FORGET'):
+            self.base_name, self.operation = name.rsplit('.', 1)
+
+    def get(self, tag, default=None):
+        return self.tags.get(tag, default)
+
+    def get_all(self, tag):
+        prefix = tag + ':'
+        return [field[len(prefix):] for field in self.fields if field.startswith(prefix)]
+
+    def get_list(self, tag, separator=','):
+        value = self.tags.get(tag)
+        return value.split(separator) if value else []
+
+    def get_number(self, tag, decimal=False):
+        value = self.tags.get(tag)
+        if value is None:
+            return None
+        match = (DECIMAL_PATTERN if decimal else INTEGER_PATTERN).match(value)
+        return match.group(0) if match else None
+
+    def __contains__(self, tag):
+        return tag in self.tags
+
+    def __repr__(self):
+        return f"LstRecord({self.name!r}, {self.tags!r})"
+
+
+class IndicatorMatcher:
+    """Reports which 'TAG:' / 'TAG:ValuePrefix' indicators a tokenized record contains.
+
+    A tag contains an indicator when the indicator's tag is a suffix of it
+    (ALTCRITRANGE contains 'CRITRANGE:' and 'RANGE:'), as a substring test on
+    the raw line would find. The answer for plain 'TAG:' indicators depends
+    only on the record's tag names, so it is computed once per distinct tag
+    signature and cached; value-prefix indicators such as 'TYPE:Weapon' then
+    only need a startswith check on the few tags the cached plan names.
+    """
+
+    def __init__(self, indicators):
+        self.indicators = frozenset(indicators)
+        self._parsed = []
+        for indicator in self.indicators:
+            tag, _, value_prefix = indicator.partition(':')
+            self._parsed.append((indicator, tag, value_prefix))
+        self._plans = {}
+
+    def _plan(self, tags):
+        plain = set()
+        value_checks = []
+        for tag in tags:
+            for indicator, indicator_tag, value_prefix in self._parsed:
+                if tag.endswith(indicator_tag):
+                    if value_prefix:
+                        value_checks.append((tag, value_prefix, indicator))
+                    else:
+                        plain.add(indicator)
+        return frozenset(plain), tuple(value_checks)
+
+    def find_all(self, record):
+        tags = record.tags
+        signature = tuple(tags)
+        plan = self._plans.get(signature)
+        if plan is None:
+            plan = self._plans[signature] = self._plan(tags)
+        plain, value_checks = plan
+        if not value_checks:
+            return plain
+        found = set(plain)
+        for tag, value_prefix, indicator in value_checks:
+            if tags[tag].startswith(value_prefix):
+                found.add(indicator)
+        return found
+
+
+def tokenize_line(line):
+    fields = line.split('\t')
+    tags = {}
+    for field in fields[1:]:
+        tag, sep, value = field.partition(':')
+        if sep and tag not in tags:
+            tags[tag] = value
+    return LstRecord(fields[0].strip(), tags, fields, line)
+
+
+def find_caster_level(record):
+    return find_caster_level_match(record)[0]
+
+
+def find_caster_level_match(record):
+    """(caster level, CL_PATTERN alternative it came from); alternative 1 is the SPROP |CL form,
+    the others are free-text fallbacks."""
+    best_priority = None
+    caster_level = None
+    for match in CL_PATTERN.finditer(record.line):
+        priority = match.lastindex
+        if best_priority is None or priority < best_priority:
+            best_priority = priority
+            caster_level = match.group(priority)
+            if priority == SPROP_CASTER_LEVEL:
+                break
+    return caster_level, best_priority
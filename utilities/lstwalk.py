@@ -0,0 +1,84 @@
+"""
+Shared directory walk for the LST scripts.
+
+Every LST script used to run its own os.walk over the same tree with its own
+is_relevant_file filter. find_lst_files is that walk, done in one place, and
+LstWalker lets several consumers share a single traversal: each .lst file is
+matched against every registered consumer's filename predicate and, if any
+of them wants it, read once and handed to all of them.
+"""
+
+import os
+import time
+from collections import namedtuple
+
+from lstmmap import iter_candidate_lines
+from lstpipeline import Pipeline, DEFAULT_QUEUE_SIZE
+from lststats import RunStats
+
+
+def find_lst_files(lst_directory, relevant_file=None):
+    for root, _, files in os.walk(lst_directory):
+        for file in files:
+            if file.endswith('.lst') and (relevant_file is None or relevant_file(file)):
+                yield os.path.join(root, file)
+
+
+LstConsumer = namedtuple('LstConsumer', ['name', 'relevant_file', 'consume', 'finish'])
+
+
+class LstWalker:
+    """One os.walk plus one read per file, dispatched to every interested consumer.
+
+    consume(file_path, lines) is called for each matching file with its
+    stripped, non-comment lines; finish() is called once after the walk.
+    Files are walked and read on pipeline threads, up to queue_size files
+    ahead of the consumers. Reads, each consumer's calls and each finish()
+    are timed into stats under 'read', the consumer's name and
+    '<name>_finish'.
+    """
+
+    def __init__(self, lst_directory, queue_size=DEFAULT_QUEUE_SIZE, stats=None):
+        self.lst_directory = lst_directory
+        self.queue_size = queue_size
+        self.stats = stats or RunStats('walk')
+        self.consumers = []
+        self.file_paths = {}
+        self.files_read = 0
+
+    def register(self, name, relevant_file, consume, finish=None):
+        self.consumers.append(LstConsumer(name, relevant_file, consume, finish))
+        self.file_paths[name] = []
+
+    def _wanted_files(self):
+        for file_path in find_lst_files(self.lst_directory):
+            file_name = os.path.basename(file_path)
+            interested = [consumer for consumer in self.consumers if consumer.relevant_file(file_name)]
+            if interested:
+                yield file_path, interested
+
+    def _read_files(self, files):
+        # Each consumer applies its own line filter to the shared lines
+        for file_path, interested in files:
+            start = time.perf_counter()
+            lines = list(iter_candidate_lines(file_path))
+            self.stats.add_file('read', file_path, time.perf_counter() - start,
+                                bytes_read=os.path.getsize(file_path), lines_scanned=len(lines))
+            yield file_path, interested, lines
+
+    def run(self):
+        pipeline = Pipeline('walk', self._wanted_files(), self.queue_size)
+        pipeline.add_stage('read', self._read_files)
+        for file_path, interested, lines in pipeline.run():
+            self.files_read += 1
+            for consumer in interested:
+                self.file_paths[consumer.name].append(file_path)
+                start = time.perf_counter()
+                consumer.consume(file_path, lines)
+                self.stats.add_file(consumer.name, file_path, time.perf_counter() - start)
+        self.stats.add_pipeline(pipeline)
+
+        for consumer in self.consumers:
+            if consumer.finish:
+                with self.stats.phase(f"{consumer.name}_finish"):
+                    consumer.finish()
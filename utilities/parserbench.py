@@ -0,0 +1,242 @@
+"""
+Micro-benchmarks and golden outputs for the hot pure parsing functions.
+
+golden/parser_golden.json holds, per function, the inputs and the outputs the
+current implementation produces for them: curated edge cases plus lines from
+a fixed-seed lstcorpus.py tree. A run checks every output against the golden
+file, times each function in ns/call, and exits non-zero when an output
+changed or (with --baseline) a function got slower than the threshold allows,
+so a faster parser can be swapped in and checked in one command.
+
+    python parserbench.py                                  # check outputs, report ns/call
+    python parserbench.py --save-baseline baseline.json    # record timings on this machine
+    python parserbench.py --baseline baseline.json --threshold 0.15
+    python parserbench.py --update-golden                  # after an intended output change
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from collections import namedtuple
+
+import lstreaderandinput as items
+import lstcorpus
+from lsttokenizer import tokenize_line
+from scrapetext import clean_number, clean_currency_number, clean_item_name, normalize_name_for_url
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden', 'parser_golden.json')
+GOLDEN_SEED = 18
+GOLDEN_LSTSOURCE = 'data/pathfinder/paizo/roleplaying_game/core_rulebook/cr_equip.lst'
+
+CURATED_LINES = [
+    "Longsword\tTYPE:Weapon.Melee.Martial.Standard.Slashing.Blade\tPROFICIENCY:WEAPON|Longsword\tCOST:15\tWT:4",
+    "Potion of Cure Light Wounds\tTYPE:Magic.Potion\tCOST:50\tWT:0\tSPROP:Heals|CL1",
+    "Cloak of Resistance +1\tTYPE:Magic.Wondrous\tCOST:1000\tWT:1\tOUTPUTNAME:Cloak of \"Resistance\" +1\tSPROP:CL=5",
+    "Chain Shirt\tTYPE:Armor.Light.Standard\tCOST:100\tWT:25\tACCHECK:-2\tMAXDEX:4\tSPELLFAILURE:20",
+    "Heavy Steel Shield\tTYPE:Shield.Heavy.Standard\tCOST:20\tWT:15",
+    "Arrows (20)\tTYPE:Weapon.Ammunition.Ranged\tCOST:1\tWT:3\tOUTPUTNAME:(20)",
+    "Wand of Fireball\tTYPE:Magic.Wand\tCOST:11250\tWT:0\tOUTPUTNAME:[NAME]\tDESC:CASTER LEVEL=5",
+    "Scroll of Haste\tTYPE:Magic.Scroll\tCOST:375\tDESC:caster level CL 5 and CASTERLEVEL=7",
+    "Silk Rope\tTYPE:Goods.General\tCOST:10\tWT:5",
+    "Silver Ingot\tTYPE:Goods.Trade\tCOST:5\tWT:1",
+    "Ruby\tTYPE:Gem\tCOST:1000",
+    "Orb of Dragonkind\tTYPE:Artifact.Major\tCOST:0",
+    "Pistol\tTYPE:Weapon.Ranged.Exotic.Firearm\tCOST:1000\tWT:4",
+    "Greatsword\tTYPE:Weapon.Melee.Martial.TwoHanded\tCOST:50\tWT:8",
+    "Longsword.MOD\tCOST:20",
+    "Longsword.COPY=Masterwork Longsword\tCOST:315",
+    "Longsword.FORGET",
+    "# Comment line\tTYPE:Weapon",
+    "Fireball\tTYPE:Arcane\tSCHOOL:Evocation\tCLASSES:Wizard=3|Sorcerer=3",
+    "Power Attack\tCATEGORY:Special Ability\tTYPE:General",
+    "Ferry Passage\tTYPE:Service\tCOST:1",
+    "Bedroll\tCOST:0.1\tWT:5",
+    "Odd Cost\tTYPE:Goods\tCOST:1,500\tWT:0.5 lb.",
+    "Nameless\tTYPE:",
+]
+
+CURATED_FILENAMES = ['cr_equip.lst', 'apg_equip_armor.lst', 'cr_abilities_equip.lst', 'cr_weapons.lst']
+
+CURATED_TYPES = [
+    'Weapon', 'Melee', 'Ranged.Thrown', 'Weapon.Simple.OneHanded', 'Weapon.Projectile', 'Heavy Weaponry',
+    'GladiatorMelee', 'Armor.Medium', 'Shield', 'Medium', 'Magic.Rod', 'Magic.Staff.Artifact', 'Ring',
+    'Amulet', 'Goods.Trade', 'Trade Good', 'Art', 'Goods', 'Mount', '', 'WEAPON.MELEE.LIGHT',
+]
+
+CURATED_NUMBERS = [
+    '1,500 gp', '4 lbs.', '—', '-', '–', '', '  ', '2 sp', '5 cp', '1/2 lb.', 'varies', '+2,000 gp',
+    '0.5 lbs.', '10 gp/50', '12,345.67', 'GP 30', None,
+]
+
+CURATED_NAMES = [
+    'Sword, Long', 'Cloak of Resistance +1', 'Potion (Cure Light Wounds)', 'Wand (Fireball/CL 5)',
+    'Arrows (20)', 'Armor, Full Plate (Mithral)', '+1 Keen Longsword', 'Ring of Protection +2',
+]
+
+CURATED_URL_NAMES = [
+    'Flaming Burst', 'Ghost Touch', '+1 Keen!', 'Bane (Evil Outsiders)', '  spaces   here ',
+    'Holy-Avenger--x', "Dragon's Breath", 'Ælven Chain', 'Speed/Haste',
+]
+
+Benchmark = namedtuple('Benchmark', ['function', 'prepare'])
+
+BENCHMARKS = {
+    'extract_item_info': Benchmark(items.extract_item_info, None),
+    'get_item_name': Benchmark(items.get_item_name, lambda line: (tokenize_line(line),)),
+    'is_item_line': Benchmark(items.is_item_line, None),
+    'map_item_type': Benchmark(items.map_item_type, None),
+    'map_item_subtype': Benchmark(items.map_item_subtype, None),
+    'clean_number': Benchmark(clean_number, None),
+    'clean_currency_number': Benchmark(clean_currency_number, None),
+    'clean_item_name': Benchmark(clean_item_name, None),
+    'normalize_name_for_url': Benchmark(normalize_name_for_url, None),
+}
+
+
+def corpus_lines():
+    # A small fixed-seed slice of the synthetic tree, on top of the curated cases
+    rng = random.Random(GOLDEN_SEED)
+    names = lstcorpus.NamePool(rng, 0.2)
+    buffer = io.StringIO()
+    lstcorpus.write_equipment_file(buffer, rng, names, 150)
+    lstcorpus.write_profs_file(buffer, rng, names, 10)
+    lstcorpus.write_spell_file(buffer, rng, names, 20)
+    return buffer.getvalue().splitlines()
+
+
+def golden_inputs():
+    lines = CURATED_LINES + corpus_lines()
+    records = [tokenize_line(line) for line in lines]
+    type_strings = list(dict.fromkeys(CURATED_TYPES + [record.get('TYPE', '') for record in records]))
+    names = list(dict.fromkeys(CURATED_NAMES + [record.name for record in records[:60]]))
+
+    return {
+        'extract_item_info': [[line, GOLDEN_LSTSOURCE] for line in lines],
+        'get_item_name': [[line] for line in lines],
+        'is_item_line': [[line, filename] for filename in CURATED_FILENAMES for line in lines[:40]] +
+                        [[line, CURATED_FILENAMES[0]] for line in lines[40:]],
+        'map_item_type': [[type_str] for type_str in type_strings],
+        'map_item_subtype': [[main_type, type_str] for type_str in type_strings
+                             for main_type in dict.fromkeys([items.map_item_type(type_str),
+                                                             'armor', 'weapon', 'magic'])],
+        'clean_number': [[number] for number in CURATED_NUMBERS],
+        'clean_currency_number': [[number] for number in CURATED_NUMBERS],
+        'clean_item_name': [[name] for name in names],
+        'normalize_name_for_url': [[name] for name in CURATED_URL_NAMES + names],
+    }
+
+
+def normalize_output(value):
+    # Tuples become lists and floats keep their repr, exactly as stored in the golden file
+    return json.loads(json.dumps(value))
+
+
+def call_args(benchmark, args):
+    return benchmark.prepare(*args) if benchmark.prepare else tuple(args)
+
+
+def build_golden():
+    golden = {}
+    for name, cases in golden_inputs().items():
+        benchmark = BENCHMARKS[name]
+        golden[name] = [{'args': args, 'expected': normalize_output(benchmark.function(*call_args(benchmark, args)))}
+                        for args in cases]
+    return golden
+
+
+def check_outputs(name, benchmark, cases):
+    mismatches = []
+    for case in cases:
+        actual = normalize_output(benchmark.function(*call_args(benchmark, case['args'])))
+        if actual != case['expected']:
+            mismatches.append((case['args'], case['expected'], actual))
+    return mismatches
+
+
+def run_loops(function, calls, loops):
+    start = time.process_time_ns()
+    for _ in range(loops):
+        for args in calls:
+            function(*args)
+    return time.process_time_ns() - start
+
+
+def time_per_call(function, calls, min_time, repeat):
+    # CPU time of this process, so being descheduled on a busy machine does not
+    # count; the fastest of `repeat` runs is the least disturbed one
+    loops = 1
+    while run_loops(function, calls, loops) < min_time * 1e9:
+        loops *= 2
+    best = min(run_loops(function, calls, loops) for _ in range(repeat))
+    return best / (loops * len(calls))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the parsing functions against the golden corpus "
+                                                 "and report their speed in ns/call")
+    parser.add_argument("--only", action="append", choices=sorted(BENCHMARKS),
+                        help="Benchmark only this function (repeatable)")
+    parser.add_argument("--min-time", type=float, default=0.2,
+                        help="Seconds each timing run should last at least")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing runs per function; the fastest counts")
+    parser.add_argument("--baseline", help="JSON file of ns/call from --save-baseline to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed slowdown against --baseline as a fraction (0.2 = 20%%)")
+    parser.add_argument("--save-baseline", help="Write this run's ns/call to a JSON file")
+    parser.add_argument("--update-golden", action="store_true",
+                        help="Rewrite the golden file from the current implementations")
+    args = parser.parse_args()
+
+    if args.update_golden:
+        golden = build_golden()
+        os.makedirs(os.path.dirname(GOLDEN_PATH), exist_ok=True)
+        with open(GOLDEN_PATH, 'w', encoding='utf-8') as file:
+            json.dump(golden, file, indent=1, ensure_ascii=False)
+            file.write('\n')
+        print(f"Wrote {sum(len(cases) for cases in golden.values())} golden cases to {GOLDEN_PATH}")
+        return
+
+    with open(GOLDEN_PATH, 'r', encoding='utf-8') as file:
+        golden = json.load(file)
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+
+    failed = False
+    timings = {}
+    print(f"{'function':<24} {'cases':>6} {'ns/call':>10} {'baseline':>10}  status")
+    for name in args.only or BENCHMARKS:
+        benchmark = BENCHMARKS[name]
+        cases = golden.get(name, [])
+        mismatches = check_outputs(name, benchmark, cases)
+        calls = [call_args(benchmark, case['args']) for case in cases]
+        timings[name] = time_per_call(benchmark.function, calls, args.min_time, args.repeat) if calls else 0.0
+
+        status = 'ok'
+        if mismatches:
+            status = f"{len(mismatches)} OUTPUT CHANGES"
+        elif name in baseline and timings[name] > baseline[name] * (1 + args.threshold):
+            status = f"REGRESSION (+{timings[name] / baseline[name] - 1:.0%})"
+        failed = failed or status != 'ok'
+
+        reference = f"{baseline[name]:10.0f}" if name in baseline else f"{'-':>10}"
+        print(f"{name:<24} {len(cases):>6} {timings[name]:10.0f} {reference}  {status}")
+        for case_args, expected, actual in mismatches[:5]:
+            print(f"    {case_args!r}\n      expected {expected!r}\n      got      {actual!r}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as file:
+            json.dump(timings, file, indent=1)
+            file.write('\n')
+        print(f"Saved ns/call baseline to {args.save_baseline}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Pure text helpers shared by the AoN and d20pfsrd scrapers.
+
+The scraper scripts validate DB_PASSWORD and build their state at import
+time, so the string cleanup they share lives here where it can be imported
+on its own (by the scripts themselves and by parserbench.py).
+"""
+
+import re
+
+
+def clean_number(number_str):
+    # AoN price/weight cells: "1,500 gp", "4 lbs.", "—"
+    if number_str is None:
+        return None
+    number_str = number_str.strip()
+    if number_str in ['—', '-', '–', '']:
+        return None
+
+    number_str = re.sub(r'\s*(gp|lbs\.)\s*$', '', number_str, flags=re.IGNORECASE)
+    cleaned = re.sub(r'[^\d.,]', '', number_str)
+    cleaned = cleaned.replace(',', '')
+
+    try:
+        return float(cleaned)
+    except ValueError:
+        return None
+
+
+def clean_currency_number(number_str):
+    if number_str is None or number_str.strip() in ['—', '-', '–', '']:
+        return None
+
+    # Handle different currency types
+    currency_multipliers = {'cp': 0.01, 'sp': 0.1, 'gp': 1}
+    for currency, multiplier in currency_multipliers.items():
+        if currency in number_str.lower():
+            cleaned = re.sub(r'[^\d.,]', '', number_str)
+            cleaned = cleaned.replace(',', '')
+            try:
+                return float(cleaned) * multiplier
+            except ValueError:
+                return None
+
+    # If no currency specified, assume gp
+    cleaned = re.sub(r'[^\d.,]', '', number_str)
+    cleaned = cleaned.replace(',', '')
+    try:
+        return float(cleaned)
+    except ValueError:
+        return None
+
+
+def clean_item_name(name):
+    original_name = name
+
+    # Handle reversed names first
+    if ',' in name:
+        parts = name.split(',')
+        name = ' '.join(parts[::-1]).strip()
+
+    # Handle +X at the end of the name
+    name = re.sub(r'\s*\+(\d+)$', r'\1', name)
+
+    # Handle special cases for parentheses
+    if '(' in name:
+        base_name, extra = name.split('(', 1)
+        extra = extra.rstrip(')')
+
+        # Remove everything after '/' if it exists
+        if '/' in extra:
+            extra = extra.split('/', 1)[0]
+
+        # Combine base_name and extra
+        name = f"{base_name.strip()}{extra.strip()}"
+
+    return name, original_name
+
+
+def normalize_name_for_url(name):
+    """Convert mod name to URL-friendly format."""
+    # Remove special characters and convert to lowercase
+    normalized = re.sub(r'[^\w\s-]', '', name.lower())
+    # Replace spaces with hyphens
+    normalized = re.sub(r'\s+', '-', normalized)
+    # Remove multiple hyphens
+    normalized = re.sub(r'-+', '-', normalized)
+    return normalized.strip('-')
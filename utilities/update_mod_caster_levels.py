@@ -7,9 +7,12 @@ and update the mod table in the database.
 import requests
 import re
 import time
+import argparse
 import psycopg2
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin, quote
+from scrapetext import normalize_name_for_url
+from httpcache import add_cache_arguments, cache_from_args
 import logging
 import os
 
@@ -74,17 +77,16 @@ def get_mod_names_from_db():
         logger.error(f"Database error getting mod names: {e}")
         return []
 
-def normalize_name_for_url(name):
-    """Convert mod name to URL-friendly format."""
-    # Remove special characters and convert to lowercase
-    normalized = re.sub(r'[^\w\s-]', '', name.lower())
-    # Replace spaces with hyphens
-    normalized = re.sub(r'\s+', '-', normalized)
-    # Remove multiple hyphens
-    normalized = re.sub(r'-+', '-', normalized)
-    return normalized.strip('-')
+def fetch_page(session, cache, url, headers):
+    """Return (status, text, source) for url, from the HTTP cache when it has a current copy."""
+    if cache:
+        page = cache.get(session, url, headers=headers, timeout=10)
+        return page.status, page.text, page.source
+    response = session.get(url, headers=headers, timeout=10)
+    return response.status_code, response.text, 'network'
 
-def scrape_caster_level(mod_name, target):
+
+def scrape_caster_level(mod_name, target, session, cache=None):
     """Scrape caster level for a specific mod from d20pfsrd."""
     if target not in BASE_URLS:
         logger.warning(f"Unknown target type: {target}")
@@ -97,21 +99,24 @@ def scrape_caster_level(mod_name, target):
     try:
         logger.info(f"Scraping {mod_name} ({target}): {url}")
         
-        # Add delay to be respectful to the server
-        time.sleep(1)
-        
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         }
         
-        response = requests.get(url, headers=headers, timeout=10)
+        status, text, source = fetch_page(session, cache, url, headers)
+        
+        # Add delay to be respectful to the server; pages served from the cache need none
+        if source != 'fresh':
+            time.sleep(1)
         
-        if response.status_code == 404:
+        if status == 404:
             logger.warning(f"Page not found for {mod_name}")
             return None
         
-        response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
+        if status >= 400:
+            logger.error(f"Request error for {mod_name}: HTTP {status}")
+            return None
+        soup = BeautifulSoup(text, 'html.parser')
         
         # Look for caster level patterns
         text = soup.get_text()
@@ -170,6 +175,12 @@ def update_mod_caster_level(mod_name, target, caster_level):
 
 def main():
     """Main execution function."""
+    parser = argparse.ArgumentParser(description="Scrape special ability caster levels from d20pfsrd into the mod table")
+    add_cache_arguments(parser)
+    args = parser.parse_args()
+    cache = cache_from_args(args)
+    session = requests.Session()
+    
     logger.info("Starting caster level scraping process")
     
     # Get mod names that need caster level data
@@ -187,7 +198,7 @@ def main():
     
     for mod_name, target in mod_names:
         try:
-            caster_level = scrape_caster_level(mod_name, target)
+            caster_level = scrape_caster_level(mod_name, target, session, cache)
             
             if caster_level is not None:
                 if update_mod_caster_level(mod_name, target, caster_level):
@@ -208,6 +219,8 @@ def main():
     logger.info(f"  Special abilities successful: {success_count}")
     logger.info(f"  Special abilities failed: {failure_count}")
     logger.info(f"  Total processed: {success_count + failure_count}")
+    if cache:
+        logger.info(f"  {cache.summary()}")
 
 if __name__ == "__main__":
     main()